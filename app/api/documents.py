@@ -1,31 +1,94 @@
-from fastapi import APIRouter, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
-from typing import List
+import asyncio
+import json
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Response, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import List, Optional
 
 from app.services.kyc_service import (
     save_document_from_trade_chain,
-    save_document,
+    save_documents_batch,
+    submit_document,
+    BATCH_MAX_FILES,
     get_all_documents,
     get_document,
     get_document_logs,
+    get_document_log_text,
     review_document,
-    sign_document
+    sign_document,
+    review_documents,
+    sign_documents,
+    get_onchain_statuses
 )
 from app.services.blockchain_service import add_minter, is_minter
-from app.models.document_model import DocumentResponse
+from app.services.job_queue import get_job
+from app.models.document_model import (
+    DocumentResponse,
+    DocumentPage,
+    UploadAccepted,
+    JobResponse,
+    OnchainStatus,
+    OnchainStatusRequest,
+    BulkActionRequest,
+    BulkActionResult
+)
+from app.utils.extraction_pool import ExtractionQueueFull, ExtractionTimeout
+from app.utils.ingest import UploadTooLarge
 
 router = APIRouter()
 
 # ---------------- Upload document ----------------
-@router.post("/", response_model=DocumentResponse)
+@router.post("/", response_model=UploadAccepted, status_code=202)
 async def upload_document(
+    response: Response,
     wallet_address: str = Form(...),
     file: UploadFile = None
 ):
+    """
+    Simpan file lalu return 202 + job_id; ekstraksi dan mint berjalan di job queue.
+    File duplikat langsung return 200 dengan dokumen yang sudah ada.
+    """
     if not file:
         raise HTTPException(status_code=400, detail="File is required")
-    document = await save_document(wallet_address, file)
-    return document
+    try:
+        document, job_id = await submit_document(wallet_address, file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if job_id is None:
+        response.status_code = 200
+    return UploadAccepted(job_id=job_id, document=document)
+
+
+# ---------------- Upload batch ----------------
+@router.post("/batch")
+async def upload_documents_batch(
+    wallet_address: str = Form(...),
+    files: List[UploadFile] = File(...)
+):
+    """
+    Upload banyak file untuk satu wallet. File diproses paralel (ingest, ekstraksi, mint)
+    dan hasil per file dikirim sebagai NDJSON (satu baris JSON per file) segera setelah selesai.
+    """
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_FILES} files per batch")
+
+    results = await save_documents_batch(wallet_address, files)
+
+    async def ndjson():
+        async for item in results:
+            yield json.dumps(jsonable_encoder(item)) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+# ---------------- Upload job status ----------------
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def read_job(job_id: str):
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 # ---------------- Upload document from Trade Chain ----------------
@@ -35,24 +98,86 @@ async def upload_trade_chain_document(
     token_id: int = Form(...),
     file: UploadFile = None
 ):
-    result = await save_document_from_trade_chain(
-        wallet_address=wallet_address,
-        token_id=token_id,
-        file=file
-    )
+    try:
+        result = await save_document_from_trade_chain(
+            wallet_address=wallet_address,
+            token_id=token_id,
+            file=file
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ExtractionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ExtractionTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     return result
 
 
-# ---------------- List all documents ----------------
-@router.get("/", response_model=List[DocumentResponse])
-async def read_all_documents():
-    return get_all_documents()
+# ---------------- List documents (cursor pagination) ----------------
+@router.get("/", response_model=DocumentPage, response_model_exclude_none=True)
+async def read_all_documents(
+    limit: int = Query(50, ge=1, le=200),
+    start_after: Optional[str] = Query(None, description="next_cursor dari halaman sebelumnya"),
+    wallet_address: Optional[str] = None,
+    status: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Daftar field dipisah koma, mis. status,token_id")
+):
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        items, next_cursor = await get_all_documents(
+            limit=limit,
+            start_after=start_after,
+            wallet_address=wallet_address,
+            status=status,
+            fields=field_list
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return DocumentPage(items=items, next_cursor=next_cursor)
+
+
+# ---------------- Status on-chain (bulk) ----------------
+@router.post("/onchain-status", response_model=List[OnchainStatus])
+async def read_onchain_statuses(request: OnchainStatusRequest):
+    """
+    Status on-chain untuk banyak tokenId dalam satu round trip ke node,
+    beserta status Firestore-nya (in_sync = keduanya sama).
+    """
+    try:
+        return await get_onchain_statuses(request.token_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ---------------- Review / sign massal ----------------
+# Didaftarkan sebelum /{document_id}/review supaya "bulk" tidak dianggap document_id
+@router.post("/bulk/review", response_model=List[BulkActionResult], response_model_exclude_none=True)
+async def bulk_review_endpoint(request: BulkActionRequest):
+    """
+    Review banyak dokumen sekaligus. Semua tx dikirim dengan nonce berurutan
+    tanpa menunggu receipt; hasil per dokumen (ok / not_found / skipped / error).
+    """
+    try:
+        return await review_documents(request.document_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/bulk/sign", response_model=List[BulkActionResult], response_model_exclude_none=True)
+async def bulk_sign_endpoint(request: BulkActionRequest):
+    """
+    Sign banyak dokumen (status Reviewed) sekaligus; hasil per dokumen.
+    """
+    try:
+        return await sign_documents(request.document_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # ---------------- Get document by ID ----------------
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def read_document(document_id: str):
-    document = get_document(document_id)
+    document = await get_document(document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     return document
@@ -60,20 +185,35 @@ async def read_document(document_id: str):
 
 # ---------------- Get document logs ----------------
 @router.get("/{document_id}/logs")
-async def read_document_logs(document_id: str):
-    logs = get_document_logs(document_id)
+async def read_document_logs(
+    document_id: str,
+    include_text: bool = Query(False, description="Ikut ambil ocrText lengkap dari blob store")
+):
+    """
+    Ringkasan log OCR (preview + ukuran teks). Teks lengkap lewat include_text=true
+    atau per log di /{document_id}/logs/{log_id}/text.
+    """
+    logs = await get_document_logs(document_id, include_text=include_text)
     if not logs:
         raise HTTPException(status_code=404, detail="No logs found for this document")
     return logs
 
 
+@router.get("/{document_id}/logs/{log_id}/text", response_class=PlainTextResponse)
+async def read_document_log_text(document_id: str, log_id: str):
+    text = await get_document_log_text(document_id, log_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Log text not found")
+    return PlainTextResponse(text)
+
+
 # ---------------- Review document ----------------
 @router.post("/{document_id}/review")
 async def review_document_endpoint(document_id: str):
     """
     Review dokumen → update status di blockchain dan Firestore
     """
-    success = review_document(document_id)
+    success = await review_document(document_id)
     if not success:
         raise HTTPException(status_code=404, detail="Document not found or failed to review")
     return JSONResponse({"status": "Reviewed", "document_id": document_id})
@@ -85,7 +225,7 @@ async def sign_document_endpoint(document_id: str):
     """
     Sign dokumen → update status di blockchain dan Firestore
     """
-    success = sign_document(document_id)
+    success = await sign_document(document_id)
     if not success:
         raise HTTPException(status_code=404, detail="Document not found or failed to sign")
     return JSONResponse({"status": "Signed", "document_id": document_id})
@@ -97,13 +237,14 @@ async def add_minter_endpoint(minter_address: str = Form(...)):
     """
     Menambahkan address ke daftar minter contract.
     Hanya admin yang seharusnya boleh memanggil ini.
+    Return segera setelah tx terkirim (tidak menunggu receipt).
     """
     try:
-        receipt = add_minter(minter_address)
+        pending = await asyncio.to_thread(add_minter, minter_address)
         return JSONResponse({
-            "status": "success",
+            "status": "submitted",
             "minter_address": minter_address,
-            "tx_hash": receipt.transactionHash.hex()
+            "tx_hash": pending.tx_hash
         })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add minter: {str(e)}")
@@ -116,7 +257,7 @@ async def check_is_minter(address: str):
     Mengecek apakah suatu address sudah terdaftar sebagai minter.
     """
     try:
-        result = is_minter(address)
+        result = await asyncio.to_thread(is_minter, address)
         return JSONResponse({
             "address": address,
             "is_minter": result
@@ -1,12 +1,24 @@
 import os
+import asyncio
+import logging
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from app.utils.logging_config import configure_logging
+
+configure_logging()
+
 from fastapi import FastAPI, UploadFile, File, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import documents
+from app.utils.extraction_pool import shutdown_extraction_pool
+from app.services import chain_indexer, job_queue, readiness, tradechain_outbox
+from app.utils.tradechain_client import close_tradechain_client
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="KYC Service")
 app.include_router(documents.router, prefix="/documents", tags=["Documents"])
@@ -19,10 +31,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_warmup_task = None
+
+@app.on_event("startup")
+async def startup():
+    global _warmup_task
+    job_queue.start_workers()
+    tradechain_outbox.start_dispatcher()
+    chain_indexer.start_indexer()
+    # Client Firestore / Web3 dibuat lazy; panaskan di background tanpa menahan startup
+    _warmup_task = asyncio.create_task(readiness.check_readiness(use_cache=False))
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+    await job_queue.stop_workers()
+    await tradechain_outbox.stop_dispatcher()
+    await chain_indexer.stop_indexer()
+    await close_tradechain_client()
+    shutdown_extraction_pool()
+
 @app.get("/")
 async def root():
     return {"message": "KYC Service is running"}
 
+@app.get("/ready")
+async def ready():
+    report = await readiness.check_readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @app.post("/mock-verification")
 async def mock_verification(
     file: UploadFile = File(...),
@@ -30,8 +73,9 @@ async def mock_verification(
 ):
     content = await file.read()
 
-    print(f"[MOCK] Received file: {file.filename}, size: {len(content)} bytes")
-    print(f"[MOCK] Encryption Key: {x_encryption_key}")
+    # Kunci enkripsi tidak ikut di-log
+    logger.info("[MOCK] Received file: %s, size: %d bytes, encryption key: %s",
+                file.filename, len(content), "present" if x_encryption_key else "missing")
 
     # Contoh respons mock
     return JSONResponse({
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class DocumentCreate(BaseModel):
@@ -12,6 +12,7 @@ class DocumentInDB(BaseModel):
     file_hash: str
     status: str
     token_id: Optional[int] = None
+    linked_wallets: List[str] = []
     created_at: datetime
     updated_at: datetime
 
@@ -22,5 +23,72 @@ class DocumentResponse(BaseModel):
     file_hash: str
     status: str
     token_id: Optional[int] = None
+    linked_wallets: List[str] = []
+    processing_status: Optional[str] = None
     created_at: datetime
     updated_at: datetime
+
+class DocumentSummary(BaseModel):
+    """Dokumen di listing; field yang tidak diminta (projection) bernilai None."""
+    id: str
+    wallet_address: Optional[str] = None
+    file_name: Optional[str] = None
+    file_hash: Optional[str] = None
+    status: Optional[str] = None
+    token_id: Optional[int] = None
+    linked_wallets: Optional[List[str]] = None
+    processing_status: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class DocumentPage(BaseModel):
+    items: List[DocumentSummary]
+    next_cursor: Optional[str] = None
+
+class UploadAccepted(BaseModel):
+    job_id: Optional[str] = None
+    document: DocumentResponse
+
+class BatchItemResult(BaseModel):
+    """Satu baris hasil upload batch (NDJSON); status created / duplicate / error."""
+    index: int
+    file_name: Optional[str] = None
+    status: str
+    document: Optional[DocumentResponse] = None
+    error: Optional[str] = None
+
+class OnchainStatusRequest(BaseModel):
+    token_ids: List[int]
+
+class OnchainStatus(BaseModel):
+    """Status token di chain vs status dokumen di Firestore (untuk rekonsiliasi)."""
+    token_id: int
+    chain_status: Optional[str] = None        # None = read gagal / token tidak ada
+    chain_status_code: Optional[int] = None
+    document_id: Optional[str] = None
+    firestore_status: Optional[str] = None
+    in_sync: bool = False
+
+class BulkActionRequest(BaseModel):
+    document_ids: List[str]
+
+class BulkActionResult(BaseModel):
+    """Hasil review/sign massal per dokumen; outcome ok / not_found / skipped / error."""
+    document_id: str
+    outcome: str
+    status: Optional[str] = None          # status dokumen setelah aksi (skipped: status saat ini)
+    token_id: Optional[int] = None
+    tx_hash: Optional[str] = None
+    error: Optional[str] = None
+
+class JobResponse(BaseModel):
+    id: str
+    type: Optional[str] = None
+    status: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    next_attempt_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
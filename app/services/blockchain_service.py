@@ -1,139 +1,472 @@
 # app/services/blockchain_service.py
 from web3 import Web3
 import json
+import logging
 import os
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from eth_utils import event_abi_to_log_topic
+
+from app.services.tx_manager import TransactionManager, PendingTransaction
+from app.utils.cache import LRUCache
+from app.utils.metrics import register_cache, set_state, timed
+
+logger = logging.getLogger(__name__)
 
 # -------------------- Konfigurasi Web3 --------------------
 RPC_URL = os.getenv("ETH_RPC_URL")
 PRIVATE_KEY = os.getenv("ADMIN_PRIVATE_KEY")
 CONTRACT_ADDRESS = os.getenv("KYC_CONTRACT_ADDRESS")
 ABI_PATH = "app/contracts/KYCRegistry.sol/KYCRegistry.json"
-
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
-if not w3.is_connected():
-    raise RuntimeError("❌ Gagal konek ke RPC, cek ETH_RPC_URL.")
-
-# Load ABI dari file artifact
-with open(ABI_PATH) as f:
-    artifact = json.load(f)
-contract_abi = artifact["abi"]
-
-contract = w3.eth.contract(
-    address=Web3.to_checksum_address(CONTRACT_ADDRESS),
-    abi=contract_abi
-)
+RPC_TIMEOUT = float(os.getenv("ETH_RPC_TIMEOUT", "10"))
+
+# -------------------- Konfigurasi read --------------------
+# Hasil view contract (status, isMinter) di-cache sebentar; tx kita sendiri yang
+# sukses langsung meng-invalidate entry terkait. tokenId per hash tidak berubah
+# setelah mint, jadi hasil non-zero di-cache tanpa TTL.
+CHAIN_READ_CACHE_TTL = float(os.getenv("CHAIN_READ_CACHE_TTL", "15"))
+CHAIN_READ_CACHE_SIZE = int(os.getenv("CHAIN_READ_CACHE_SIZE", "10000"))
+# Banyak read sekaligus: multicall = satu eth_call ke Multicall3,
+# rpc = satu JSON-RPC batch, off = satu eth_call per read
+CHAIN_READ_BATCH = os.getenv("CHAIN_READ_BATCH", "multicall")
+CHAIN_READ_BATCH_SIZE = int(os.getenv("CHAIN_READ_BATCH_SIZE", "200"))
+MULTICALL3_ADDRESS = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+
+# Client dibuat saat pertama dipakai (bukan saat import), jadi import app tidak
+# butuh RPC / ABI dan node yang sempat down tidak membuat worker crash.
+# Konektivitas dicek lewat check_connection() (endpoint /ready).
+_w3: Optional[Web3] = None
+_contract = None
+_admin_account = None
+_tx_manager = None
+_multicall = None
+_init_lock = threading.RLock()  # get_contract / get_tx_manager memanggil get_w3 di dalam lock
+
+
+def get_w3() -> Web3:
+    global _w3
+    if _w3 is None:
+        with _init_lock:
+            if _w3 is None:
+                _w3 = Web3(Web3.HTTPProvider(RPC_URL, request_kwargs={"timeout": RPC_TIMEOUT}))
+    return _w3
+
+
+def get_contract():
+    global _contract
+    if _contract is None:
+        with _init_lock:
+            if _contract is None:
+                # Load ABI dari file artifact
+                with open(ABI_PATH) as f:
+                    artifact = json.load(f)
+                _contract = get_w3().eth.contract(
+                    address=Web3.to_checksum_address(CONTRACT_ADDRESS),
+                    abi=artifact["abi"]
+                )
+    return _contract
+
+
+def check_connection() -> dict:
+    """Status RPC + kontrak untuk readiness probe; tidak raise."""
+    try:
+        w3 = get_w3()
+        if not w3.is_connected():
+            return {"ok": False, "error": "RPC not reachable, cek ETH_RPC_URL"}
+        block = w3.eth.block_number
+        get_contract()
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    return {"ok": True, "block": block}
 
 
 # -------------------- Helpers --------------------
 def _get_admin_account():
-    return w3.eth.account.from_key(PRIVATE_KEY)
+    # from_key cukup sekali per proses
+    global _admin_account
+    if _admin_account is None:
+        _admin_account = get_w3().eth.account.from_key(PRIVATE_KEY)
+    return _admin_account
+
+
+def get_tx_manager() -> TransactionManager:
+    """Satu TransactionManager per proses, supaya nonce admin dibagikan secara lokal."""
+    global _tx_manager
+    if _tx_manager is None:
+        with _init_lock:
+            if _tx_manager is None:
+                _tx_manager = TransactionManager(get_w3(), _get_admin_account())
+    return _tx_manager
+
+
+# -------------------- Contract reads (cache + batch) --------------------
+_MULTICALL3_ABI = [{
+    "name": "aggregate3",
+    "type": "function",
+    "stateMutability": "payable",
+    "inputs": [{"name": "calls", "type": "tuple[]", "components": [
+        {"name": "target", "type": "address"},
+        {"name": "allowFailure", "type": "bool"},
+        {"name": "callData", "type": "bytes"},
+    ]}],
+    "outputs": [{"name": "returnData", "type": "tuple[]", "components": [
+        {"name": "success", "type": "bool"},
+        {"name": "returnData", "type": "bytes"},
+    ]}],
+}]
+
+_read_cache = LRUCache(maxsize=CHAIN_READ_CACHE_SIZE, ttl=CHAIN_READ_CACHE_TTL)
+_token_id_cache = LRUCache(maxsize=CHAIN_READ_CACHE_SIZE)
+_batch_mode = CHAIN_READ_BATCH  # turun ke "rpc" / "off" kalau node tidak mendukung
+_BATCH_MODES = ("multicall", "rpc", "off")
+register_cache("chain_status", _read_cache)
+register_cache("chain_token_id", _token_id_cache)
+set_state("chain_read_batch_mode", _batch_mode, _BATCH_MODES)
+
+ReadCall = Tuple[str, tuple]  # (nama fungsi view, args)
+
+
+def _cache_for(name: str) -> LRUCache:
+    return _token_id_cache if name == "getTokenIdByHash" else _read_cache
+
+
+def _remember(name: str, args: tuple, value: Any):
+    # tokenId 0 = belum di-mint; jangan di-cache karena bisa berubah kapan saja
+    if value is None or (name == "getTokenIdByHash" and not value):
+        return
+    _cache_for(name).set((name, *args), value)
+
+
+def invalidate_read(name: str, *args):
+    _cache_for(name).pop((name, *args))
+
+
+def _invalidate_on_done(pending: PendingTransaction, name: str, *args) -> PendingTransaction:
+    # Dipanggil thread tracker sebelum pemanggil yang menunggu receipt dibangunkan
+    pending.add_done_callback(lambda _: invalidate_read(name, *args))
+    return pending
+
+
+def _read(name: str, *args) -> Any:
+    """Satu view call lewat cache; error dari node di-raise seperti biasa."""
+    value = _cache_for(name).get((name, *args))
+    if value is None:
+        with timed("chain", "read"):
+            value = getattr(get_contract().functions, name)(*args).call()
+        _remember(name, args, value)
+    return value
+
+
+def _get_multicall():
+    global _multicall
+    if _multicall is None:
+        _multicall = get_w3().eth.contract(address=Web3.to_checksum_address(MULTICALL3_ADDRESS), abi=_MULTICALL3_ABI)
+    return _multicall
+
+
+def _output_types(contract, name: str) -> List[str]:
+    for entry in contract.abi:
+        if entry.get("type") == "function" and entry.get("name") == name:
+            return [output["type"] for output in entry["outputs"]]
+    raise ValueError(f"Function {name} not in contract ABI")
+
+
+def _read_multicall(calls: List[ReadCall]) -> List[Any]:
+    contract = get_contract()
+    codec = get_w3().codec
+    encoded = [(contract.address, True, contract.encode_abi(name, args=list(args))) for name, args in calls]
+    results = []
+    for (name, _), (success, data) in zip(calls, _get_multicall().functions.aggregate3(encoded).call()):
+        if not success or not data:
+            results.append(None)  # revert (mis. token belum ada)
+            continue
+        values = codec.decode(_output_types(contract, name), data)
+        results.append(values[0] if len(values) == 1 else values)
+    return results
+
+
+def _read_rpc_batch(calls: List[ReadCall]) -> List[Any]:
+    functions = get_contract().functions
+    with get_w3().batch_requests() as batch:
+        for name, args in calls:
+            batch.add(getattr(functions, name)(*args))
+        return list(batch.execute())
+
+
+def _read_sequential(calls: List[ReadCall]) -> List[Any]:
+    functions = get_contract().functions
+    results = []
+    for name, args in calls:
+        try:
+            results.append(getattr(functions, name)(*args).call())
+        except Exception as e:
+            logger.warning("Contract read %s%s failed: %s", name, args, e)
+            results.append(None)
+    return results
+
+
+def _read_uncached(calls: List[ReadCall]) -> List[Any]:
+    global _batch_mode
+    if len(calls) > 1:
+        if _batch_mode == "multicall":
+            try:
+                return _read_multicall(calls)
+            except Exception as e:
+                logger.warning("Multicall3 read failed, falling back to JSON-RPC batch: %s", e)
+                _batch_mode = "rpc"
+                set_state("chain_read_batch_mode", _batch_mode, _BATCH_MODES)
+        if _batch_mode == "rpc":
+            try:
+                return _read_rpc_batch(calls)
+            except Exception as e:
+                logger.warning("JSON-RPC batch read failed, falling back to single calls: %s", e)
+                _batch_mode = "off"
+                set_state("chain_read_batch_mode", _batch_mode, _BATCH_MODES)
+    return _read_sequential(calls)
+
+
+def read_many(calls: Iterable[ReadCall]) -> List[Any]:
+    """
+    Banyak view call sekaligus, urutan hasil = urutan calls.
+    Yang ada di cache tidak dikirim; sisanya dikirim per CHAIN_READ_BATCH_SIZE
+    dalam satu Multicall3 / JSON-RPC batch. Call yang gagal (revert) → None.
+    """
+    calls = [(name, tuple(args)) for name, args in calls]
+    results: List[Any] = [None] * len(calls)
+    missing: Dict[ReadCall, List[int]] = {}
+    for i, (name, args) in enumerate(calls):
+        value = _cache_for(name).get((name, *args))
+        if value is None:
+            missing.setdefault((name, args), []).append(i)
+        else:
+            results[i] = value
+
+    pending = list(missing)
+    for start in range(0, len(pending), CHAIN_READ_BATCH_SIZE):
+        chunk = pending[start:start + CHAIN_READ_BATCH_SIZE]
+        with timed("chain", "read_batch"):
+            values = _read_uncached(chunk)
+        for (name, args), value in zip(chunk, values):
+            _remember(name, args, value)
+            for i in missing[(name, args)]:
+                results[i] = value
+    return results
+
+
+# -------------------- Event KYCRegistry --------------------
+# Nama argumen yang dikenali di event; event dengan tokenId + hash dianggap mint (status Draft)
+TOKEN_ID_ARGS = ("tokenId", "_tokenId", "id")
+FILE_HASH_ARGS = ("fileHash", "_fileHash", "documentHash", "hash")
+# Event perubahan status tanpa argumen status, "Nama:kode" dipisah koma
+STATUS_EVENTS = {
+    name: int(code)
+    for name, code in (
+        item.split(":") for item in os.getenv("CHAIN_STATUS_EVENTS", "DocumentReviewed:1,DocumentSigned:2").split(",") if item
+    )
+}
+
+
+class ChainEvent(NamedTuple):
+    name: str
+    token_id: int
+    file_hash: Optional[str]   # hanya untuk event mint
+    status: Optional[int]
+    tx_hash: str
+    block: int
+    log_index: int
+
+
+_event_decoders: Optional[Dict[bytes, Any]] = None
+
+
+def _get_event_decoders() -> Dict[bytes, Any]:
+    """topic0 -> kelas event contract, dari ABI."""
+    global _event_decoders
+    if _event_decoders is None:
+        contract = get_contract()
+        _event_decoders = {
+            bytes(event_abi_to_log_topic(entry)): getattr(contract.events, entry["name"])
+            for entry in contract.abi if entry.get("type") == "event"
+        }
+    return _event_decoders
+
+
+def _first_arg(args, names: tuple):
+    for name in names:
+        if name in args:
+            return args[name]
+    return None
+
+
+def decode_logs(logs: Iterable[dict]) -> List[ChainEvent]:
+    """
+    Decode log KYCRegistry (dari receipt atau eth_getLogs) menjadi ChainEvent.
+    Log kontrak lain dan event yang tidak menyangkut token dilewati.
+    """
+    logs = list(logs)
+    if not logs:
+        return []
+    decoders = _get_event_decoders()
+    address = get_contract().address.lower()
+    events = []
+    for log in logs:
+        if str(log["address"]).lower() != address or not log["topics"]:
+            continue
+        event_cls = decoders.get(bytes(log["topics"][0]))
+        if event_cls is None:
+            continue
+        decoded = event_cls().process_log(log)
+        args = decoded["args"]
+        token_id = _first_arg(args, TOKEN_ID_ARGS)
+        if token_id is None:
+            continue
+        file_hash = _first_arg(args, FILE_HASH_ARGS)
+        if file_hash is not None:
+            status = 0
+        elif "status" in args:
+            status = int(args["status"])
+        else:
+            status = STATUS_EVENTS.get(decoded["event"])
+        events.append(ChainEvent(
+            name=decoded["event"],
+            token_id=int(token_id),
+            file_hash=file_hash,
+            status=status,
+            tx_hash=Web3.to_hex(log["transactionHash"]),
+            block=int(log["blockNumber"]),
+            log_index=int(log["logIndex"]),
+        ))
+    return events
+
+
+def token_id_from_receipt(receipt, file_hash: str) -> Optional[int]:
+    """tokenId dari event mint di receipt (tanpa eth_call); None kalau tidak ditemukan."""
+    try:
+        events = decode_logs(receipt.get("logs", []))
+    except Exception as e:
+        logger.warning("Failed to decode receipt logs: %s", e)
+        return None
+    for event in events:
+        if event.file_hash == file_hash:
+            _remember("getTokenIdByHash", (file_hash,), event.token_id)
+            return event.token_id
+    return None
 
 
-def _build_and_send(txn):
-    account = _get_admin_account()
-    signed = account.sign_transaction(txn)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-    return receipt
+# -------------------- Blockchain Actions --------------------
 
+def submit_mint(to_address: str, file_hash: str, token_uri: str) -> PendingTransaction:
+    """
+    ✅ Kirim tx verifyAndMint tanpa menunggu receipt.
+    """
+    return get_tx_manager().submit(
+        get_contract().functions.verifyAndMint(
+            Web3.to_checksum_address(to_address),
+            file_hash,
+            token_uri
+        ),
+        gas=350_000
+    )
 
-# -------------------- Blockchain Actions --------------------
 
 def mint_document(to_address: str, file_hash: str, token_uri: str) -> int:
     """
     ✅ Mint dokumen langsung ke blockchain dan ambil tokenId dari mapping hashToTokenId.
+    Menunggu receipt karena tokenId baru ada setelah tx mined.
     """
-    account = _get_admin_account()
-    nonce = w3.eth.get_transaction_count(account.address)
-
-    txn = contract.functions.verifyAndMint(
-        Web3.to_checksum_address(to_address),
-        file_hash,
-        token_uri
-    ).build_transaction({
-        "from": account.address,
-        "nonce": nonce,
-        "gas": 350_000,
-        "gasPrice": w3.to_wei("10", "gwei")
-    })
+    receipt = submit_mint(to_address, file_hash, token_uri).result()
 
-    # Kirim transaksi dan tunggu receipt
-    _build_and_send(txn)
+    # tokenId dari event di receipt; mapping hashToTokenId hanya kalau event tidak ada
+    return token_id_from_receipt(receipt, file_hash) or get_token_id_by_hash(file_hash)
 
-    # Ambil tokenId dari mapping hashToTokenId
-    token_id = contract.functions.getTokenIdByHash(file_hash).call()
-    return token_id
 
-
-def review_document_onchain(token_id: int):
+def review_document_onchain(token_id: int) -> PendingTransaction:
     """
     ✅ Admin melakukan review dokumen (Draft -> Reviewed)
+    Return PendingTransaction tanpa menunggu receipt.
     """
-    account = _get_admin_account()
-    nonce = w3.eth.get_transaction_count(account.address)
-
-    txn = contract.functions.reviewDocument(token_id).build_transaction({
-        "from": account.address,
-        "nonce": nonce,
-        "gas": 200_000,
-        "gasPrice": w3.to_wei("10", "gwei")
-    })
+    pending = get_tx_manager().submit(get_contract().functions.reviewDocument(token_id), gas=200_000)
+    return _invalidate_on_done(pending, "getStatus", token_id)
 
-    return _build_and_send(txn)
 
-
-def sign_document_onchain(token_id: int):
+def sign_document_onchain(token_id: int) -> PendingTransaction:
     """
     ✅ Admin tanda tangan dokumen (Reviewed -> Signed)
+    Return PendingTransaction tanpa menunggu receipt.
     """
-    account = _get_admin_account()
-    nonce = w3.eth.get_transaction_count(account.address)
-
-    txn = contract.functions.signDocument(token_id).build_transaction({
-        "from": account.address,
-        "nonce": nonce,
-        "gas": 200_000,
-        "gasPrice": w3.to_wei("10", "gwei")
-    })
-
-    return _build_and_send(txn)
+    pending = get_tx_manager().submit(get_contract().functions.signDocument(token_id), gas=200_000)
+    return _invalidate_on_done(pending, "getStatus", token_id)
 
 
 def get_token_id_by_hash(file_hash: str) -> int:
     """
-    ✅ Ambil tokenId dari hash dokumen
+    ✅ Ambil tokenId dari hash dokumen (0 = belum di-mint)
     """
-    return contract.functions.getTokenIdByHash(file_hash).call()
+    return _read("getTokenIdByHash", file_hash)
 
 
 def get_document_status(token_id: int) -> int:
     """
     ✅ Ambil status dokumen (0 = Draft, 1 = Reviewed, 2 = Signed)
     """
-    return contract.functions.getStatus(token_id).call()
+    return _read("getStatus", token_id)
 
 
-def add_minter(minter_address: str):
+def get_document_statuses(token_ids: Iterable[int]) -> Dict[int, Optional[int]]:
     """
-    ✅ Tambahkan address ke daftar minter (hanya owner)
+    Status banyak token dalam satu round trip (lihat read_many).
+    Token yang read-nya gagal bernilai None.
     """
-    account = _get_admin_account()
-    nonce = w3.eth.get_transaction_count(account.address)
+    token_ids = list(dict.fromkeys(token_ids))
+    return dict(zip(token_ids, read_many(("getStatus", (token_id,)) for token_id in token_ids)))
 
-    txn = contract.functions.addMinter(
-        Web3.to_checksum_address(minter_address)
-    ).build_transaction({
-        "from": account.address,
-        "nonce": nonce,
-        "gas": 100_000,
-        "gasPrice": w3.to_wei("10", "gwei")
-    })
 
-    return _build_and_send(txn)
+def add_minter(minter_address: str) -> PendingTransaction:
+    """
+    ✅ Tambahkan address ke daftar minter (hanya owner)
+    """
+    address = Web3.to_checksum_address(minter_address)
+    pending = get_tx_manager().submit(get_contract().functions.addMinter(address), gas=100_000)
+    return _invalidate_on_done(pending, "isMinter", address)
 
 
 def is_minter(address: str) -> bool:
     """
     ✅ Cek apakah suatu address sudah jadi minter
     """
-    return contract.functions.isMinter(Web3.to_checksum_address(address)).call()
+    return _read("isMinter", Web3.to_checksum_address(address))
+
+
+# -------------------- Aksi admin massal --------------------
+# Semua tx dikirim dengan nonce berurutan (TransactionManager.submit_many);
+# hasil per item: PendingTransaction atau exception pengirimannya.
+SubmitResult = Union[PendingTransaction, Exception]
+
+
+def submit_mints(items: List[Tuple[str, str]]) -> List[SubmitResult]:
+    """verifyAndMint untuk banyak (to_address, file_hash) tanpa menunggu receipt."""
+    functions = get_contract().functions
+    return get_tx_manager().submit_many([
+        functions.verifyAndMint(Web3.to_checksum_address(to_address), file_hash, f"ipfs://{file_hash}")
+        for to_address, file_hash in items
+    ], gas=350_000)
+
+
+def _submit_status_changes(function_name: str, token_ids: List[int]) -> List[SubmitResult]:
+    contract_fn = getattr(get_contract().functions, function_name)
+    results = get_tx_manager().submit_many([contract_fn(token_id) for token_id in token_ids], gas=200_000)
+    return [
+        _invalidate_on_done(result, "getStatus", token_id) if isinstance(result, PendingTransaction) else result
+        for result, token_id in zip(results, token_ids)
+    ]
+
+
+def submit_reviews(token_ids: List[int]) -> List[SubmitResult]:
+    """reviewDocument untuk banyak token (Draft -> Reviewed)."""
+    return _submit_status_changes("reviewDocument", token_ids)
+
+
+def submit_signs(token_ids: List[int]) -> List[SubmitResult]:
+    """signDocument untuk banyak token (Reviewed -> Signed)."""
+    return _submit_status_changes("signDocument", token_ids)
@@ -0,0 +1,347 @@
+"""
+Indexer event KYCRegistry ke SQLite lokal: fileHash -> tokenId -> status.
+
+- Receipt tx kita sendiri langsung di-decode dan diterapkan (tokenId tanpa eth_call).
+- Follower di background mem-polling eth_getLogs per range block sampai
+  head - INDEXER_CONFIRMATIONS; data + cursor block di-commit dalam satu transaksi,
+  jadi restart melanjutkan dari checkpoint. Perubahan dari luar service ini
+  (mis. admin lain) ikut terindeks.
+- Token yang berubah ditandai (version > synced_version) untuk rekonsiliasi Firestore
+  inkremental oleh hook on_change (lihat kyc_service).
+- Dengan beberapa worker uvicorn hanya satu yang mem-polling (lease di tabel cursor).
+
+    python -m app.services.chain_indexer stats
+    python -m app.services.chain_indexer rewind --block 123456
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.blockchain_service import ChainEvent, decode_logs, get_contract, get_w3
+
+logger = logging.getLogger(__name__)
+
+# -------------------- Konfigurasi --------------------
+INDEXER_ENABLED = os.getenv("INDEXER_ENABLED", "true").lower() in ("1", "true", "yes")
+INDEXER_DB_PATH = os.getenv("INDEXER_DB_PATH", "data/chain_index.sqlite3")
+# Block awal saat belum ada checkpoint (mis. block deploy kontrak); kosong = mulai dari head
+INDEXER_START_BLOCK = os.getenv("INDEXER_START_BLOCK")
+INDEXER_POLL_INTERVAL = float(os.getenv("INDEXER_POLL_INTERVAL", "5"))
+INDEXER_BLOCK_RANGE = int(os.getenv("INDEXER_BLOCK_RANGE", "2000"))
+# Block terbaru yang belum cukup konfirmasi tidak di-scan (perlindungan reorg)
+INDEXER_CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", "2"))
+# Index dianggap live (boleh menggantikan eth_call) kalau tertinggal maksimal segini
+INDEXER_MAX_LAG_BLOCKS = int(os.getenv("INDEXER_MAX_LAG_BLOCKS", "20"))
+INDEXER_LEASE_SECONDS = float(os.getenv("INDEXER_LEASE_SECONDS", "60"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    token_id INTEGER PRIMARY KEY,
+    file_hash TEXT,
+    status INTEGER,
+    mint_tx TEXT,
+    event_block INTEGER NOT NULL DEFAULT -1,
+    event_index INTEGER NOT NULL DEFAULT -1,
+    version INTEGER NOT NULL DEFAULT 0,
+    synced_version INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tokens_hash ON tokens (file_hash);
+CREATE INDEX IF NOT EXISTS idx_tokens_unsynced ON tokens (synced_version, version);
+CREATE TABLE IF NOT EXISTS cursor (
+    name TEXT PRIMARY KEY,
+    block INTEGER NOT NULL,
+    head INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+"""
+CURSOR_NAME = "kyc_registry"
+
+_local = threading.local()
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Satu koneksi SQLite per thread, WAL (sama seperti tradechain_outbox)."""
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(INDEXER_DB_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(INDEXER_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(SCHEMA)
+                _schema_ready = True
+        _local.conn = conn
+    return conn
+
+
+# -------------------- Menerapkan event --------------------
+def _apply_event(conn: sqlite3.Connection, event: ChainEvent, now: float) -> bool:
+    """Idempotent: event yang posisinya (block, logIndex) tidak lebih baru tidak mengubah status."""
+    row = conn.execute(
+        "SELECT file_hash, status, event_block, event_index FROM tokens WHERE token_id = ?", (event.token_id,)
+    ).fetchone()
+    if row is None:
+        conn.execute(
+            "INSERT INTO tokens (token_id, file_hash, status, mint_tx, event_block, event_index, version, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, 1, ?)",
+            (event.token_id, event.file_hash, event.status, event.tx_hash if event.file_hash else None,
+             event.block, event.log_index, now),
+        )
+        return True
+
+    newer = (event.block, event.log_index) > (row["event_block"], row["event_index"])
+    status = event.status if newer and event.status is not None else row["status"]
+    file_hash = row["file_hash"] or event.file_hash
+    if status == row["status"] and file_hash == row["file_hash"] and not newer:
+        return False
+    conn.execute(
+        """
+        UPDATE tokens SET file_hash = ?, status = ?, mint_tx = COALESCE(mint_tx, ?),
+               event_block = MAX(event_block, ?), event_index = CASE WHEN ? THEN ? ELSE event_index END,
+               version = version + CASE WHEN status IS NOT ? THEN 1 ELSE 0 END, updated_at = ?
+        WHERE token_id = ?
+        """,
+        (file_hash, status, event.tx_hash if event.file_hash else None,
+         event.block, newer, event.log_index, status, now, event.token_id),
+    )
+    return True
+
+
+def _apply_sync(events: List[ChainEvent], cursor: Optional[Tuple[int, int]] = None) -> int:
+    """Terapkan events (+ geser cursor ke (block, head)) dalam satu transaksi."""
+    conn = _connect()
+    now = time.time()
+    changed = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for event in sorted(events, key=lambda e: (e.block, e.log_index)):
+            changed += _apply_event(conn, event, now)
+        if cursor is not None:
+            conn.execute(
+                "UPDATE cursor SET block = ?, head = ?, updated_at = ? WHERE name = ?",
+                (cursor[0], cursor[1], now, CURSOR_NAME),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return changed
+
+
+def index_receipt(receipt) -> List[ChainEvent]:
+    """
+    Decode event dari receipt tx kita sendiri dan langsung masukkan ke index
+    (tanpa menunggu follower). Tidak raise; return events yang ter-decode.
+    """
+    try:
+        events = decode_logs(receipt.get("logs", []))
+        if INDEXER_ENABLED and events:
+            _apply_sync(events)
+    except Exception as e:
+        logger.warning("Failed to index receipt: %s", e)
+        return []
+    return events
+
+
+# -------------------- Lookup lokal --------------------
+def lookup_token_id(file_hash: str) -> Optional[int]:
+    if not INDEXER_ENABLED:
+        return None
+    row = _connect().execute("SELECT token_id FROM tokens WHERE file_hash = ?", (file_hash,)).fetchone()
+    return row["token_id"] if row else None
+
+
+def is_live() -> bool:
+    """Cursor dekat dengan head dan follower masih berjalan (di worker mana pun)."""
+    if not INDEXER_ENABLED:
+        return False
+    row = _connect().execute("SELECT block, head, updated_at FROM cursor WHERE name = ?", (CURSOR_NAME,)).fetchone()
+    if row is None:
+        return False
+    fresh = time.time() - row["updated_at"] < max(3 * INDEXER_POLL_INTERVAL, 30)
+    return fresh and row["head"] - row["block"] <= INDEXER_MAX_LAG_BLOCKS + INDEXER_CONFIRMATIONS
+
+
+def lookup_statuses(token_ids: Iterable[int]) -> Dict[int, int]:
+    """Status dari index untuk token yang dikenal; {} kalau index tidak live."""
+    token_ids = list(token_ids)
+    if not token_ids or not is_live():
+        return {}
+    conn = _connect()
+    result = {}
+    for start in range(0, len(token_ids), 500):
+        chunk = token_ids[start:start + 500]
+        rows = conn.execute(
+            f"SELECT token_id, status FROM tokens WHERE status IS NOT NULL "
+            f"AND token_id IN ({','.join('?' * len(chunk))})", chunk
+        )
+        result.update({row["token_id"]: row["status"] for row in rows})
+    return result
+
+
+# -------------------- Rekonsiliasi --------------------
+def pending_changes(limit: int = 300) -> List[sqlite3.Row]:
+    """Token yang status-nya berubah sejak rekonsiliasi terakhir: (token_id, status, version)."""
+    return _connect().execute(
+        "SELECT token_id, status, version FROM tokens "
+        "WHERE version > synced_version AND status IS NOT NULL ORDER BY updated_at LIMIT ?",
+        (limit,),
+    ).fetchall()
+
+
+def mark_synced(rows: List[sqlite3.Row]):
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "UPDATE tokens SET synced_version = ? WHERE token_id = ? AND synced_version < ?",
+            [(row["version"], row["token_id"], row["version"]) for row in rows],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+ChangeHook = Callable[[], Awaitable[None]]
+_change_hooks: List[ChangeHook] = []
+
+
+def on_change(hook: ChangeHook):
+    """Daftarkan coroutine yang dipanggil follower setelah tiap putaran (mis. rekonsiliasi Firestore)."""
+    _change_hooks.append(hook)
+
+
+# -------------------- Follower --------------------
+def _acquire_lease(conn: sqlite3.Connection, owner: str) -> bool:
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE cursor SET lease_owner = ?, lease_until = ? "
+        "WHERE name = ? AND (lease_owner IS NULL OR lease_owner = ? OR lease_until < ?)",
+        (owner, now + INDEXER_LEASE_SECONDS, CURSOR_NAME, owner, now),
+    )
+    return cur.rowcount == 1
+
+
+def _poll_sync(owner: str) -> Tuple[bool, int, bool]:
+    """Satu putaran scan. Return (lease dipegang, jumlah token berubah, sudah sampai head)."""
+    conn = _connect()
+    w3 = get_w3()
+    head = w3.eth.block_number
+    safe = head - INDEXER_CONFIRMATIONS
+
+    if conn.execute("SELECT 1 FROM cursor WHERE name = ?", (CURSOR_NAME,)).fetchone() is None:
+        start = int(INDEXER_START_BLOCK) - 1 if INDEXER_START_BLOCK else safe
+        if not INDEXER_START_BLOCK:
+            logger.info("Chain indexer starting at block %d; set INDEXER_START_BLOCK to index history", safe)
+        conn.execute(
+            "INSERT OR IGNORE INTO cursor (name, block, head, updated_at) VALUES (?, ?, ?, ?)",
+            (CURSOR_NAME, start, head, time.time()),
+        )
+    if not _acquire_lease(conn, owner):
+        return False, 0, True
+
+    cursor = conn.execute("SELECT block FROM cursor WHERE name = ?", (CURSOR_NAME,)).fetchone()["block"]
+    if safe <= cursor:
+        _apply_sync([], cursor=(cursor, head))
+        return True, 0, True
+
+    to_block = min(safe, cursor + INDEXER_BLOCK_RANGE)
+    logs = w3.eth.get_logs({"address": get_contract().address, "fromBlock": cursor + 1, "toBlock": to_block})
+    changed = _apply_sync(decode_logs(logs), cursor=(to_block, head))
+    logger.debug("Indexed blocks %d-%d: %d log(s), %d token(s) changed", cursor + 1, to_block, len(logs), changed)
+    return True, changed, to_block >= safe
+
+
+_indexer: Optional[asyncio.Task] = None
+
+
+async def _run_indexer():
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    while True:
+        caught_up = True
+        try:
+            held, _, caught_up = await asyncio.to_thread(_poll_sync, owner)
+            if held:
+                for hook in _change_hooks:
+                    await hook()
+        except Exception as e:
+            logger.exception("Chain indexer error: %s", e)
+        if caught_up:
+            await asyncio.sleep(INDEXER_POLL_INTERVAL)
+
+
+def start_indexer():
+    global _indexer
+    if INDEXER_ENABLED and _indexer is None:
+        _indexer = asyncio.create_task(_run_indexer(), name="chain-indexer")
+
+
+async def stop_indexer():
+    global _indexer
+    if _indexer is not None:
+        _indexer.cancel()
+        await asyncio.gather(_indexer, return_exceptions=True)
+    _indexer = None
+
+
+# -------------------- Observability --------------------
+def indexer_stats() -> dict:
+    conn = _connect()
+    cursor = conn.execute("SELECT block, head, updated_at, lease_owner FROM cursor WHERE name = ?", (CURSOR_NAME,)).fetchone()
+    counts = conn.execute(
+        "SELECT COUNT(*) AS tokens, SUM(version > synced_version) AS unsynced FROM tokens"
+    ).fetchone()
+    return {
+        "enabled": INDEXER_ENABLED,
+        "block": cursor["block"] if cursor else None,
+        "head": cursor["head"] if cursor else None,
+        "lag_blocks": cursor["head"] - cursor["block"] if cursor else None,
+        "last_poll_age_seconds": time.time() - cursor["updated_at"] if cursor else None,
+        "lease_owner": cursor["lease_owner"] if cursor else None,
+        "live": is_live(),
+        "tokens": counts["tokens"],
+        "unsynced": counts["unsynced"] or 0,
+    }
+
+
+def rewind(block: int) -> None:
+    """Scan ulang mulai block+1 (mis. setelah reorg dalam atau ganti INDEXER_CONFIRMATIONS)."""
+    conn = _connect()
+    conn.execute(
+        "INSERT INTO cursor (name, block, head, updated_at) VALUES (?, ?, ?, 0) "
+        "ON CONFLICT(name) DO UPDATE SET block = excluded.block",
+        (CURSOR_NAME, block, block),
+    )
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="KYCRegistry chain indexer tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Posisi cursor dan jumlah token")
+    rewind_cmd = sub.add_parser("rewind", help="Pindahkan cursor; follower scan ulang dari block+1")
+    rewind_cmd.add_argument("--block", type=int, required=True)
+
+    args = parser.parse_args()
+    if args.command == "rewind":
+        rewind(args.block)
+    print(json.dumps(indexer_stats(), indent=2))
+
+
+if __name__ == "__main__":
+    _main()
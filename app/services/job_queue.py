@@ -0,0 +1,333 @@
+"""
+Job queue in-process dengan status di Firestore (koleksi jobs).
+
+Worker mengambil job dari asyncio.Queue, tapi semua yang perlu untuk
+melanjutkan job tersimpan di dokumen job: status, attempts, nextAttemptAt
+(jadwal retry) dan lease (owner + leaseUntil). Proses yang memegang job
+memperpanjang lease-nya secara berkala; job aktif (queued / retrying /
+running) yang lease-nya habis, karena restart, deploy atau crash, diambil
+alih lewat transaksi saat startup dan sesudahnya tiap JOB_LEASE_SECONDS / 3.
+Job yang input lokalnya sudah tidak ada (lihat register_handler: resumable)
+ditandai failed dan failure hook-nya dipanggil.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from google.cloud import firestore
+
+from app.utils.firestore_client import get_db
+
+# -------------------- Konfigurasi --------------------
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "2"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "60"))
+# Lease job per proses; job aktif tanpa lease yang hidup diambil alih proses lain
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+JOBS_COLLECTION = "jobs"
+ACTIVE_STATUSES = ("queued", "retrying", "running")
+INSTANCE_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+FailureHandler = Callable[[dict, str], Awaitable[None]]
+ResumeCheck = Callable[[dict], Awaitable[bool]]
+
+logger = logging.getLogger(__name__)
+
+_handlers: Dict[str, JobHandler] = {}
+_failure_handlers: Dict[str, FailureHandler] = {}
+_resume_checks: Dict[str, ResumeCheck] = {}
+_queue: Optional[asyncio.Queue] = None
+_workers: list = []
+_maintainer: Optional[asyncio.Task] = None
+# Job yang dipegang proses ini (antre, menunggu retry atau sedang jalan): id -> job
+_held: Dict[str, dict] = {}
+_retry_timers: Dict[str, asyncio.TimerHandle] = {}
+
+
+def register_handler(
+    job_type: str,
+    handler: JobHandler,
+    on_failed: Optional[FailureHandler] = None,
+    resumable: Optional[ResumeCheck] = None
+):
+    """
+    handler(payload) -> dict hasil job; exception = attempt gagal (akan di-retry).
+    on_failed(payload, error) dipanggil sekali setelah semua attempt habis.
+    resumable(payload) -> bool dipanggil sebelum job yang diambil alih setelah
+    restart dijalankan lagi (mis. file lokal masih ada); False = job failed.
+    Handler harus idempotent karena bisa dijalankan lebih dari sekali.
+    """
+    _handlers[job_type] = handler
+    if on_failed:
+        _failure_handlers[job_type] = on_failed
+    if resumable:
+        _resume_checks[job_type] = resumable
+
+
+def _get_queue() -> asyncio.Queue:
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    return _queue
+
+
+async def _update_job(job_id: str, fields: dict):
+    fields["updatedAt"] = datetime.utcnow()
+    await get_db().collection(JOBS_COLLECTION).document(job_id).update(fields)
+
+
+def _lease_until() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+
+def _seconds_until(value: Optional[datetime]) -> float:
+    # Firestore mengembalikan datetime UTC tz-aware; yang ditulis di sini naive (utcnow)
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - datetime.now(timezone.utc)).total_seconds()
+
+
+# -------------------- API --------------------
+def new_job(job_type: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> Tuple[object, dict]:
+    """
+    Siapkan job baru tanpa menulis ke Firestore: return (job_ref, job).
+    Caller menulis job lewat batch bersama data lain, lalu memanggil dispatch().
+    """
+    if job_type not in _handlers:
+        raise ValueError(f"No handler registered for job type '{job_type}'")
+
+    now = datetime.utcnow()
+    job_ref = get_db().collection(JOBS_COLLECTION).document()
+    job = {
+        "type": job_type,
+        "payload": payload,
+        "status": "queued",
+        "attempts": 0,
+        "maxAttempts": max_attempts,
+        "error": None,
+        "result": None,
+        "nextAttemptAt": None,
+        "owner": INSTANCE_ID,
+        "leaseUntil": _lease_until(),
+        "createdAt": now,
+        "updatedAt": now
+    }
+    return job_ref, job
+
+
+def dispatch(job_id: str, job: dict):
+    """Masukkan job yang sudah tersimpan ke antrean worker."""
+    _retry_timers.pop(job_id, None)
+    _held[job_id] = job
+    _get_queue().put_nowait((job_id, job))
+
+
+def _schedule(job_id: str, job: dict, delay: float):
+    """dispatch() setelah delay detik; job tetap dipegang (lease diperpanjang) selama menunggu."""
+    if delay <= 0:
+        dispatch(job_id, job)
+        return
+    _held[job_id] = job
+    _retry_timers[job_id] = asyncio.get_running_loop().call_later(delay, dispatch, job_id, job)
+
+
+async def enqueue(job_type: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> str:
+    """Simpan job (status queued) di Firestore lalu masukkan ke antrean worker. Return job id."""
+    job_ref, job = new_job(job_type, payload, max_attempts)
+    await job_ref.set(job)
+    dispatch(job_ref.id, job)
+    return job_ref.id
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    snapshot = await get_db().collection(JOBS_COLLECTION).document(job_id).get()
+    if not snapshot.exists:
+        return None
+    data = snapshot.to_dict()
+    return {
+        "id": job_id,
+        "type": data.get("type"),
+        "status": data.get("status"),
+        "attempts": data.get("attempts", 0),
+        "max_attempts": data.get("maxAttempts", JOB_MAX_ATTEMPTS),
+        "error": data.get("error"),
+        "result": data.get("result"),
+        "next_attempt_at": data.get("nextAttemptAt"),
+        "created_at": data.get("createdAt"),
+        "updated_at": data.get("updatedAt")
+    }
+
+
+# -------------------- Worker --------------------
+def _retry_delay(attempt: int) -> float:
+    return min(JOB_RETRY_BASE_DELAY * (2 ** (attempt - 1)), JOB_RETRY_MAX_DELAY)
+
+
+async def _fail(job_id: str, job: dict, error: str):
+    _held.pop(job_id, None)
+    await _update_job(job_id, {"status": "failed", "error": error, "nextAttemptAt": None})
+    on_failed = _failure_handlers.get(job["type"])
+    if on_failed:
+        try:
+            await on_failed(job["payload"], error)
+        except Exception as hook_error:
+            logger.warning("on_failed hook for job %s raised: %s", job_id, hook_error)
+
+
+async def _run_job(job_id: str, job: dict):
+    job_type = job["type"]
+    job["attempts"] += 1
+    await _update_job(job_id, {"status": "running", "attempts": job["attempts"], "nextAttemptAt": None})
+
+    try:
+        result = await _handlers[job_type](job["payload"])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if job["attempts"] < job["maxAttempts"]:
+            delay = _retry_delay(job["attempts"])
+            logger.warning("Job %s (%s) attempt %d failed, retry in %.0fs: %s",
+                           job_id, job_type, job["attempts"], delay, error)
+            # Jadwal retry disimpan supaya proses lain bisa melanjutkan setelah restart
+            next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            await _update_job(job_id, {"status": "retrying", "error": error, "nextAttemptAt": next_attempt_at})
+            _schedule(job_id, job, delay)
+            return
+
+        logger.error("Job %s (%s) failed permanently: %s", job_id, job_type, error, exc_info=True)
+        await _fail(job_id, job, error)
+        return
+
+    _held.pop(job_id, None)
+    await _update_job(job_id, {"status": "succeeded", "error": None, "result": result or {}})
+
+
+async def _worker(index: int):
+    queue = _get_queue()
+    while True:
+        job_id, job = await queue.get()
+        try:
+            await _run_job(job_id, job)
+        except Exception as e:
+            # Gagal update status di Firestore dsb.; jangan sampai worker mati.
+            # Job dilepas: setelah lease habis diambil ulang lewat recovery.
+            _held.pop(job_id, None)
+            logger.exception("Job worker %d error on %s: %s", index, job_id, e)
+        finally:
+            queue.task_done()
+
+
+# -------------------- Lease & recovery --------------------
+async def _write_leases(job_ids: list, lease_until: Optional[datetime]):
+    # Batch Firestore maks. 500 operasi
+    for start in range(0, len(job_ids), 500):
+        batch = get_db().batch()
+        for job_id in job_ids[start:start + 500]:
+            batch.update(get_db().collection(JOBS_COLLECTION).document(job_id),
+                         {"owner": INSTANCE_ID, "leaseUntil": lease_until})
+        await batch.commit()
+
+
+async def _claim(job_ref) -> Optional[dict]:
+    """Ambil alih job aktif yang lease-nya habis; None kalau sudah selesai / dipegang proses lain."""
+    @firestore.async_transactional
+    async def apply(transaction) -> Optional[dict]:
+        snapshot = await job_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict() or {}
+        if data.get("status") not in ACTIVE_STATUSES or _seconds_until(data.get("leaseUntil")) > 0:
+            return None
+        transaction.update(job_ref, {"owner": INSTANCE_ID, "leaseUntil": _lease_until()})
+        return data
+
+    return await apply(get_db().transaction())
+
+
+async def _recover(job_ref):
+    job = await _claim(job_ref)
+    if job is None:
+        return
+    job_id = job_ref.id
+    job.setdefault("attempts", 0)
+    job.setdefault("maxAttempts", JOB_MAX_ATTEMPTS)
+
+    resumable = _resume_checks.get(job["type"])
+    if resumable and not await resumable(job["payload"]):
+        logger.warning("Job %s (%s) cannot resume after restart, marking failed", job_id, job["type"])
+        await _fail(job_id, job, "Job input no longer available after restart")
+        return
+
+    delay = _seconds_until(job.get("nextAttemptAt")) if job.get("status") == "retrying" else 0.0
+    logger.info("Recovered job %s (%s, %s, attempt %d)", job_id, job["type"], job.get("status"), job["attempts"])
+    _schedule(job_id, job, delay)
+
+
+async def _recover_jobs():
+    # Satu query "==" per status (tanpa composite index); lease difilter di sini
+    for status in ACTIVE_STATUSES:
+        snapshots = await get_db().collection(JOBS_COLLECTION).where("status", "==", status).get()
+        for snapshot in snapshots:
+            data = snapshot.to_dict() or {}
+            if snapshot.id in _held or data.get("type") not in _handlers:
+                continue
+            if _seconds_until(data.get("leaseUntil")) > 0:
+                continue
+            try:
+                await _recover(snapshot.reference)
+            except Exception as e:
+                logger.warning("Recovering job %s failed: %s", snapshot.id, e)
+
+
+async def _maintain():
+    """Perpanjang lease job yang dipegang proses ini, lalu ambil alih job yatim."""
+    while True:
+        try:
+            if _held:
+                await _write_leases(list(_held), _lease_until())
+            await _recover_jobs()
+        except Exception as e:
+            logger.warning("Job lease maintenance failed: %s", e)
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+
+
+def start_workers(count: int = JOB_WORKERS):
+    global _maintainer
+    if _workers:
+        return
+    for i in range(count):
+        _workers.append(asyncio.create_task(_worker(i), name=f"job-worker-{i}"))
+    _maintainer = asyncio.create_task(_maintain(), name="job-maintainer")
+
+
+async def stop_workers():
+    global _maintainer
+    tasks = _workers + ([_maintainer] if _maintainer else [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _workers.clear()
+    _maintainer = None
+    for timer in _retry_timers.values():
+        timer.cancel()
+    _retry_timers.clear()
+
+    # Lepas lease supaya proses berikutnya langsung melanjutkan job yang belum selesai
+    held = list(_held)
+    _held.clear()
+    if held:
+        try:
+            await _write_leases(held, None)
+        except Exception as e:
+            logger.warning("Releasing %d job lease(s) failed: %s", len(held), e)
+
+
+def workers_running() -> int:
+    return sum(1 for task in _workers if not task.done())
@@ -1,100 +1,422 @@
 import os
-import hashlib
+import asyncio
+import logging
 from datetime import datetime
-from typing import List, Callable, Optional
-import aiofiles
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Dict, List, Callable, Optional, Set, Tuple
+from google.api_core.exceptions import FailedPrecondition
 from google.cloud import firestore
 from eth_account.messages import encode_defunct
 
-from app.services.blockchain_service import _get_admin_account, mint_document, review_document_onchain, sign_document_onchain
+from app.services.blockchain_service import (
+    _get_admin_account,
+    submit_mint,
+    get_token_id_by_hash,
+    get_document_statuses,
+    read_many,
+    review_document_onchain,
+    sign_document_onchain,
+    submit_mints,
+    submit_reviews,
+    submit_signs
+)
+from app.services import chain_indexer, job_queue
+from app.services.tx_manager import PendingTransaction, TransactionFailed
 from app.utils.file_utils import extract_text
 from app.utils.ktp_parser import parse_ktp
 from app.utils.verification import verify_document_advanced
-from app.models.document_model import DocumentResponse
-from app.utils.crypto_utils import encrypt_file
+from app.models.document_model import (
+    BatchItemResult,
+    BulkActionResult,
+    DocumentResponse,
+    DocumentSummary,
+    OnchainStatus
+)
+from app.utils.ingest import ingest_upload, commit_ingest, discard_ingest
 from app.services.openai_service import analyze_document_with_ai
 from app.utils.tradechain_notifier import send_tradechain_notification
-from app.utils.tradechain_kyc import update_kyc_internal
+from app.services import tradechain_outbox
+from app.utils import blob_store
+from app.utils.cache import LRUCache
+from app.utils.firestore_client import get_db
+from app.utils.metrics import register_cache, timed
+from app.utils.stage_timer import stage
 
-db = firestore.Client()
+logger = logging.getLogger(__name__)
 
+TEMP_FOLDER = "temp"
 
-# ---------------- Upload dokumen dari Trade Chain ----------------
-async def save_document_from_trade_chain(
-    wallet_address: str,
-    token_id: int,
-    file,
-    parser_hook: Optional[Callable[[str], dict]] = None,
-    ai_hook: Optional[Callable[[str], dict]] = None
-):
+# fileHash -> document id, supaya retry upload file yang sama cukup satu lookup
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))
+_hash_index = LRUCache(maxsize=DEDUP_CACHE_SIZE)
+_hash_locks: dict[str, list] = {}  # fileHash -> [asyncio.Lock, jumlah pemakai]
+
+# document id -> data Firestore; TTL membatasi data basi dari write di worker lain
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", "5000"))
+DOCUMENT_CACHE_TTL = float(os.getenv("DOCUMENT_CACHE_TTL", "10"))
+_document_cache = LRUCache(maxsize=DOCUMENT_CACHE_SIZE, ttl=DOCUMENT_CACHE_TTL)
+register_cache("document", _document_cache)
+register_cache("dedup", _hash_index)
+
+# Upload batch: jumlah file maksimum per request dan file yang diproses bersamaan
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "20"))
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "4"))
+FIRESTORE_BATCH_LIMIT = 500  # operasi maksimum per batch commit Firestore
+FIRESTORE_IN_LIMIT = 30      # nilai maksimum untuk filter "in"
+
+# Rekonsiliasi status on-chain: jumlah token maksimum per request
+ONCHAIN_STATUS_MAX_IDS = int(os.getenv("ONCHAIN_STATUS_MAX_IDS", "500"))
+CHAIN_STATUS_NAMES = {0: "Draft", 1: "Reviewed", 2: "Signed"}
+
+# Review / sign massal: dokumen per request
+BULK_ADMIN_MAX_IDS = int(os.getenv("BULK_ADMIN_MAX_IDS", "500"))
+
+
+# ---------------- Helpers ----------------
+def _to_response(document_id: str, data: dict) -> DocumentResponse:
+    now = datetime.utcnow()
+    return DocumentResponse(
+        id=document_id,
+        wallet_address=data.get("walletAddress", ""),
+        file_name=data.get("fileName", ""),
+        file_hash=data.get("fileHash", ""),
+        status=data.get("status", "Draft"),
+        token_id=data.get("tokenId"),
+        linked_wallets=data.get("linkedWallets", []),
+        processing_status=data.get("processingStatus"),
+        created_at=data.get("createdAt", now),
+        updated_at=data.get("updatedAt", now)
+    )
+
+
+async def _read_document(document_id: str, fresh: bool = False) -> Optional[dict]:
+    """
+    Read-through cache untuk dokumen. fresh=True selalu baca Firestore
+    (dipakai aksi admin yang mengambil keputusan dari data dokumen).
+    """
+    if not fresh:
+        data = _document_cache.get(document_id)
+        if data is not None:
+            return dict(data)
+
+    with timed("firestore", "get"):
+        doc_snapshot = await get_db().collection("documents").document(document_id).get()
+    if not doc_snapshot.exists:
+        return None
+    data = doc_snapshot.to_dict()
+    _document_cache.set(document_id, data)
+    return dict(data)
+
+
+async def _update_document(doc_ref, fields: dict):
+    """Write-through: update Firestore lalu buang entry cache dokumen tsb."""
+    with timed("firestore", "update"):
+        await doc_ref.update(fields)
+    _document_cache.pop(doc_ref.id)
+
+
+async def _transition_status(
+    doc_ref,
+    allowed_from: tuple,
+    fields: dict,
+    tx_hashes: Optional[List[str]] = None
+) -> bool:
+    """
+    Update status secara atomik: dalam satu transaksi baca status terkini dan
+    hanya tulis kalau masih salah satu dari allowed_from (mis. dua admin
+    me-review dokumen yang sama bersamaan, atau status sudah maju).
+    tx_hashes: hanya tulis kalau txHash dokumen salah satu dari ini.
+    """
+    @firestore.async_transactional
+    async def apply(transaction) -> bool:
+        snapshot = await doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return False
+        data = snapshot.to_dict() or {}
+        if data.get("status", "Draft") not in allowed_from:
+            return False
+        if tx_hashes is not None and data.get("txHash") not in tx_hashes:
+            return False
+        transaction.update(doc_ref, fields)
+        return True
+
+    try:
+        with timed("firestore", "transaction"):
+            return await apply(get_db().transaction())
+    finally:
+        _document_cache.pop(doc_ref.id)
+
+
+async def _find_document_by_hash(file_hash: str) -> Optional[tuple]:
     """
-    Simpan dokumen dari TradeChain dan langsung update internal KYC dengan txHash + signature admin
+    Cari dokumen dengan fileHash yang sama: cache lokal dulu, lalu query Firestore
+    (single-field index fileHash dibuat otomatis oleh Firestore).
+    Return (doc_ref, data) atau None.
     """
-    from eth_account.messages import encode_defunct
-    from app.services.blockchain_service import _get_admin_account
+    doc_id = _hash_index.get(file_hash)
+    if doc_id:
+        data = await _read_document(doc_id)
+        if data is not None:
+            return get_db().collection("documents").document(doc_id), data
+        _hash_index.pop(file_hash)
+
+    with timed("firestore", "query"):
+        snapshots = await get_db().collection("documents") \
+                            .where("fileHash", "==", file_hash) \
+                            .limit(1) \
+                            .get()
+    for snapshot in snapshots:
+        _hash_index.set(file_hash, snapshot.id)
+        _document_cache.set(snapshot.id, snapshot.to_dict())
+        return snapshot.reference, snapshot.to_dict()
+    return None
+
+
+async def _attach_wallet(doc_ref, data: dict, wallet_address: str) -> dict:
+    """Tambahkan wallet baru ke dokumen yang sudah ada (tanpa membuat dokumen baru)."""
+    if wallet_address == data.get("walletAddress") or wallet_address in data.get("linkedWallets", []):
+        return data
 
-    TEMP_FOLDER = "temp"
-    os.makedirs(TEMP_FOLDER, exist_ok=True)
+    now = datetime.utcnow()
+    await _update_document(doc_ref, {
+        "linkedWallets": firestore.ArrayUnion([wallet_address]),
+        "updatedAt": now
+    })
+    data["linkedWallets"] = data.get("linkedWallets", []) + [wallet_address]
+    data["updatedAt"] = now
+    return data
 
-    # --- Simpan file sementara ---
-    content = await file.read()
-    file_hash = hashlib.sha256(content).hexdigest()
-    file_name = f"{file_hash}_{file.filename}"
-    file_path = f"{TEMP_FOLDER}/{file_name}"
 
-    async with aiofiles.open(file_path, "wb") as f:
-        await f.write(content)
+@asynccontextmanager
+async def _hash_guard(file_hash: str):
+    """
+    Serialkan upload paralel dengan hash yang sama (mis. retry saat request pertama
+    belum selesai), sehingga yang kedua menemukan dokumen hasil yang pertama.
+    """
+    entry = _hash_locks.setdefault(file_hash, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _hash_locks[file_hash]
+
 
+# ---------------- Tahapan upload ----------------
+def _stage_draft(
+    batch,
+    wallet_address: str,
+    file_name: str,
+    ingest,
+    token_id: Optional[int] = None,
+    prepare: Optional[Callable] = None
+):
+    """
+    Finalisasi file hasil ingest dan tambahkan metadata Draft ke batch (belum di-commit).
+    Return (doc_ref, metadata, ingest).
+    """
+    ingest = commit_ingest(ingest)
     now = datetime.utcnow()
 
-    # --- Simpan metadata awal ---
-    doc_ref = db.collection("documents").document()
+    doc_ref = get_db().collection("documents").document()
     metadata = {
         "walletAddress": wallet_address,
-        "fileName": file.filename,
-        "fileHash": file_hash,
+        "fileName": file_name,
+        "fileHash": ingest.file_hash,
         "status": "Draft",
         "tokenId": token_id,
         "createdAt": now,
         "updatedAt": now
     }
-    doc_ref.set(metadata)
+    if prepare:
+        prepare(batch, doc_ref, metadata, ingest)
+    batch.set(doc_ref, metadata)
+    return doc_ref, metadata, ingest
 
-    # --- 🔐 Enkripsi file ---
-    encrypted_path, encryption_key = encrypt_file(file_path)
 
-    # --- 📝 Ekstraksi teks ---
-    text = await extract_text(file_path)
+def _remember_draft(doc_ref, metadata: dict):
+    _hash_index.set(metadata["fileHash"], doc_ref.id)
+    _document_cache.set(doc_ref.id, dict(metadata))
 
-    # --- Hapus file plaintext ---
-    os.remove(file_path)
+
+async def _create_draft(
+    wallet_address: str,
+    file,
+    token_id: Optional[int] = None,
+    prepare: Optional[Callable] = None
+):
+    """
+    Stream upload (hash + enkripsi + simpan sementara dalam satu pass), dedup,
+    lalu simpan metadata awal (Draft).
+    prepare(batch, doc_ref, metadata, ingest) boleh menambah field / write lain
+    yang ikut di-commit dalam batch yang sama.
+    Return (doc_ref, data, ingest); ingest None berarti file sudah pernah diupload
+    dan data adalah dokumen lama.
+    """
+    with stage("ingest"):
+        ingest = await ingest_upload(file, TEMP_FOLDER)
+    file_hash = ingest.file_hash
+
+    async with _hash_guard(file_hash):
+        # --- Dedup: file yang sama sudah pernah diupload ---
+        with stage("dedup"):
+            found = await _find_document_by_hash(file_hash)
+        if found:
+            discard_ingest(ingest)
+            doc_ref, data = found
+            logger.info("Duplicate upload: fileHash %s… already stored as %s", file_hash[:12], doc_ref.id)
+            return doc_ref, await _attach_wallet(doc_ref, data, wallet_address), None
+
+        batch = get_db().batch()
+        try:
+            doc_ref, metadata, ingest = _stage_draft(batch, wallet_address, file.filename, ingest, token_id, prepare)
+            with stage("draft_write"), timed("firestore", "batch_commit"):
+                await batch.commit()
+        except Exception:
+            discard_ingest(ingest)
+            raise
+        _remember_draft(doc_ref, metadata)
+
+    return doc_ref, metadata, ingest
+
+
+async def _extract(
+    file_path: str,
+    parser_hook: Optional[Callable[[str], dict]] = None,
+    ai_hook: Optional[Callable[[str], dict]] = None
+) -> Tuple[blob_store.StoredText, dict, dict]:
+    # --- 📝 Ekstraksi teks ---
+    with stage("extract"):
+        text = await extract_text(file_path)
 
     # --- Parsing optional ---
-    parsed_fields = parser_hook(text) if parser_hook else {}
-    ai_fields = ai_hook(text) if ai_hook else {}
+    with stage("parse"):
+        parsed_fields = parser_hook(text) if parser_hook else {}
+        ai_fields = ai_hook(text) if ai_hook else {}
 
-    # --- Simpan log OCR + hasil parsing ---
-    log_ref = db.collection("document_logs").document()
-    log_ref.set({
+    # --- Teks lengkap ke blob store (gzip); log Firestore hanya menyimpan referensi ---
+    with stage("text_store"):
+        stored = await asyncio.to_thread(blob_store.put_text, text)
+    return stored, parsed_fields, ai_fields
+
+
+def _stage_log(
+    batch,
+    doc_ref,
+    stored: blob_store.StoredText,
+    parsed_fields: dict,
+    ai_fields: dict,
+    doc_fields: Optional[dict] = None
+) -> dict:
+    """Tambahkan log OCR baru + update dokumen (ocrLogId + doc_fields) ke batch. Return field dokumen."""
+    log_ref = get_db().collection("document_logs").document()
+    fields = {"ocrLogId": log_ref.id, "updatedAt": datetime.utcnow(), **(doc_fields or {})}
+    batch.set(log_ref, {
         "documentId": doc_ref.id,
-        "ocrText": text,
+        "ocrTextRef": stored.ref,
+        "ocrTextSize": stored.size,
+        "ocrTextBytes": stored.stored_bytes,
+        "ocrTextPreview": stored.preview,
         "parsedFieldsLocal": parsed_fields,
         "parsedFieldsAI": ai_fields,
         "createdAt": datetime.utcnow()
     })
+    batch.update(doc_ref, fields)
+    return fields
 
-    # Ambil snapshot terakhir
-    doc_snapshot = doc_ref.get().to_dict()
-    return DocumentResponse(
-        id=doc_ref.id,
-        wallet_address=doc_snapshot.get("walletAddress", ""),
-        file_name=doc_snapshot.get("fileName", ""),
-        file_hash=doc_snapshot.get("fileHash", ""),
-        status=doc_snapshot.get("status", "Draft"),
-        token_id=doc_snapshot.get("tokenId"),
-        created_at=doc_snapshot.get("createdAt", now),
-        updated_at=doc_snapshot.get("updatedAt", now)
-    )
+
+async def _extract_and_log(
+    doc_ref,
+    file_path: str,
+    parser_hook: Optional[Callable[[str], dict]] = None,
+    ai_hook: Optional[Callable[[str], dict]] = None,
+    doc_fields: Optional[dict] = None
+) -> dict:
+    """
+    Ekstraksi + simpan log OCR. Log baru dan update dokumen (ocrLogId + doc_fields)
+    di-commit dalam satu batch. Return field dokumen yang ditulis.
+    """
+    stored, parsed_fields, ai_fields = await _extract(file_path, parser_hook, ai_hook)
+
+    # --- Simpan log OCR + hasil parsing ---
+    batch = get_db().batch()
+    fields = _stage_log(batch, doc_ref, stored, parsed_fields, ai_fields, doc_fields)
+    with stage("log_write"), timed("firestore", "batch_commit"):
+        await batch.commit()
+    _document_cache.pop(doc_ref.id)
+    return fields
+
+
+def _lookup_token_id(file_hash: str) -> int:
+    # Index event lokal dulu; eth_call hanya kalau hash belum terindeks
+    return chain_indexer.lookup_token_id(file_hash) or get_token_id_by_hash(file_hash)
+
+
+async def _mint_token(wallet_address: str, file_hash: str) -> int:
+    # Retry setelah tx sukses tapi update Firestore gagal: jangan mint dua kali
+    token_id = await asyncio.to_thread(_lookup_token_id, file_hash)
+    if not token_id:
+        with stage("mint_submit"):
+            pending = await asyncio.to_thread(
+                submit_mint,
+                to_address=wallet_address,
+                file_hash=file_hash,
+                token_uri=f"ipfs://{file_hash}"
+            )
+        with stage("mint_confirm"):
+            receipt = await pending.wait()
+        # tokenId dari event mint di receipt (sekaligus masuk index)
+        events = await asyncio.to_thread(chain_indexer.index_receipt, receipt)
+        token_id = next((e.token_id for e in events if e.file_hash == file_hash), None)
+        if not token_id:
+            token_id = await asyncio.to_thread(get_token_id_by_hash, file_hash)
+    return token_id
+
+
+async def _mint_for_document(
+    doc_ref,
+    wallet_address: str,
+    file_hash: str,
+    doc_fields: Optional[dict] = None
+) -> int:
+    token_id = await _mint_token(wallet_address, file_hash)
+    with stage("token_write"):
+        await _update_document(doc_ref, {"tokenId": token_id, "updatedAt": datetime.utcnow(), **(doc_fields or {})})
+    return token_id
+
+
+def _remove_plaintext(file_path: str):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+# ---------------- Upload dokumen dari Trade Chain ----------------
+async def save_document_from_trade_chain(
+    wallet_address: str,
+    token_id: int,
+    file,
+    parser_hook: Optional[Callable[[str], dict]] = None,
+    ai_hook: Optional[Callable[[str], dict]] = None
+):
+    """
+    Simpan dokumen dari TradeChain dan langsung update internal KYC dengan txHash + signature admin.
+    File yang hash-nya sudah tersimpan tidak diproses ulang.
+    """
+    doc_ref, data, ingest = await _create_draft(wallet_address, file, token_id=token_id)
+    if ingest is None:
+        return _to_response(doc_ref.id, data)
+
+    try:
+        data.update(await _extract_and_log(doc_ref, ingest.file_path, parser_hook, ai_hook))
+    finally:
+        # --- Hapus file plaintext ---
+        _remove_plaintext(ingest.file_path)
+
+    return _to_response(doc_ref.id, data)
 
 
 # ---------------- Upload dan buat dokumen status Draft ----------------
@@ -105,121 +427,372 @@ async def save_document(
     ai_hook: Optional[Callable[[str], dict]] = None
 ) -> DocumentResponse:
     """
+    Upload + ekstraksi + mint dalam satu request (lihat submit_document untuk versi async).
+
     parser_hook: callable yang menerima teks dan mengembalikan dict parsed fields
     ai_hook: callable yang menerima teks dan mengembalikan dict hasil AI
+
+    Kalau fileHash sudah ada, dokumen lama dikembalikan (wallet baru ditautkan)
+    tanpa OCR, log, maupun mint ulang.
     """
+    doc_ref, data, ingest = await _create_draft(wallet_address, file)
+    if ingest is None:
+        return _to_response(doc_ref.id, data)
 
-    TEMP_FOLDER = "temp"
-    os.makedirs(TEMP_FOLDER, exist_ok=True)
+    try:
+        data.update(await _extract_and_log(doc_ref, ingest.file_path, parser_hook, ai_hook))
+    finally:
+        # --- Hapus file plaintext ---
+        _remove_plaintext(ingest.file_path)
 
-    # --- Simpan file sementara ---
-    content = await file.read()
-    file_hash = hashlib.sha256(content).hexdigest()
-    file_name = f"{file_hash}_{file.filename}"
-    file_path = f"{TEMP_FOLDER}/{file_name}"
+    # ---------------- Mint dokumen di blockchain ----------------
+    try:
+        data["tokenId"] = await _mint_for_document(doc_ref, wallet_address, ingest.file_hash)
+    except Exception as e:
+        logger.warning("Mint failed for %s: %s", doc_ref.id, e)
 
-    async with aiofiles.open(file_path, "wb") as f:
-        await f.write(content)
+    return _to_response(doc_ref.id, data)
 
-    now = datetime.utcnow()
 
-    # --- Simpan metadata awal (Draft) ---
-    doc_ref = db.collection("documents").document()
-    metadata = {
-        "walletAddress": wallet_address,
-        "fileName": file.filename,
-        "fileHash": file_hash,
-        "status": "Draft",
-        "tokenId": None,
-        "createdAt": now,
-        "updatedAt": now
-    }
-    doc_ref.set(metadata)
+# ---------------- Upload batch (banyak file, satu wallet) ----------------
+class _WriteCoalescer:
+    """
+    Gabungkan write Firestore dari banyak coroutine ke satu batch commit.
+    Write yang masuk selama commit berjalan ikut commit berikutnya.
+    """
 
-    # --- 🔐 Enkripsi file ---
-    encrypted_path, encryption_key = encrypt_file(file_path)
+    def __init__(self, max_ops: int = FIRESTORE_BATCH_LIMIT):
+        self.max_ops = max_ops
+        self._pending: list = []  # (stage(batch), jumlah operasi, future)
+        self._flusher: Optional[asyncio.Task] = None
 
-    # --- 📝 Ekstraksi teks ---
-    text = await extract_text(file_path)
+    async def write(self, stage: Callable, ops: int = 1):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((stage, ops, future))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush())
+        return await future
 
-    # --- Hapus file plaintext ---
-    os.remove(file_path)
+    async def _flush(self):
+        await asyncio.sleep(0)  # beri kesempatan write lain yang sudah siap untuk ikut
+        while self._pending:
+            items, total = [], 0
+            while self._pending and (not items or total + self._pending[0][1] <= self.max_ops):
+                item = self._pending.pop(0)
+                items.append(item)
+                total += item[1]
 
-    # --- Parsing optional ---
-    parsed_fields = parser_hook(text) if parser_hook else {}
-    ai_fields = ai_hook(text) if ai_hook else {}
+            batch = get_db().batch()
+            staged = [stage(batch) for stage, _, _ in items]
+            try:
+                with timed("firestore", "batch_commit"):
+                    await batch.commit()
+            except Exception as e:
+                for _, _, future in items:
+                    future.set_exception(e)
+            else:
+                for (_, _, future), result in zip(items, staged):
+                    future.set_result(result)
+        self._flusher = None
 
-    # --- Simpan log OCR + hasil parsing ---
-    log_ref = db.collection("document_logs").document()
-    log_ref.set({
-        "documentId": doc_ref.id,
-        "ocrText": text,
-        "parsedFieldsLocal": parsed_fields,
-        "parsedFieldsAI": ai_fields,
-        "createdAt": datetime.utcnow()
-    })
 
-    # ---------------- Mint dokumen di blockchain ----------------
-    try:
-        token_id = mint_document(
-            to_address=wallet_address,
-            file_hash=file_hash,
-            token_uri=f"ipfs://{file_hash}"
-        )
-        doc_ref.update({"tokenId": token_id})
-    except Exception as e:
-        print(f"⚠️ Mint failed: {e}")
+async def _create_drafts(wallet_address: str, files: list, ingests: list) -> list:
+    """
+    Dedup + metadata Draft untuk banyak file sekaligus; semua dokumen baru
+    ditulis dalam satu batch commit. File dengan hash sama di dalam satu batch
+    hanya dibuat sekali. Return per file: (doc_ref, data, ingest|None) atau exception.
+    """
+    hashes = sorted({i.file_hash for i in ingests if not isinstance(i, BaseException)})
+    results: list = list(ingests)
 
-    # Ambil snapshot terakhir
-    doc_snapshot = doc_ref.get().to_dict()
-    return DocumentResponse(
-        id=doc_ref.id,
-        wallet_address=doc_snapshot.get("walletAddress", ""),
-        file_name=doc_snapshot.get("fileName", ""),
-        file_hash=doc_snapshot.get("fileHash", ""),
-        status=doc_snapshot.get("status", "Draft"),
-        token_id=doc_snapshot.get("tokenId"),
-        created_at=doc_snapshot.get("createdAt", now),
-        updated_at=doc_snapshot.get("updatedAt", now)
-    )
+    async with AsyncExitStack() as stack:
+        # Urutan lock selalu sama (sorted) supaya dua batch paralel tidak deadlock
+        for file_hash in hashes:
+            await stack.enter_async_context(_hash_guard(file_hash))
 
+        existing = dict(zip(hashes, await asyncio.gather(*(_find_document_by_hash(h) for h in hashes))))
+        batch = get_db().batch()
+        created: dict = {}
 
-# ---------------- Review Dokumen (Admin) ----------------
-def review_document(document_id: str) -> bool:
-    doc_ref = db.collection("documents").document(document_id)
-    doc_snapshot = doc_ref.get()
-    if not doc_snapshot.exists:
-        return False
+        for i, (file, ingest) in enumerate(zip(files, ingests)):
+            if isinstance(ingest, BaseException):
+                continue
+            file_hash = ingest.file_hash
+            if existing.get(file_hash):
+                discard_ingest(ingest)
+                doc_ref, data = existing[file_hash]
+                data = await _attach_wallet(doc_ref, data, wallet_address)
+                existing[file_hash] = (doc_ref, data)
+                results[i] = (doc_ref, data, None)
+            elif file_hash in created:
+                discard_ingest(ingest)
+                doc_ref, data, _ = created[file_hash]
+                results[i] = (doc_ref, data, None)
+            else:
+                created[file_hash] = _stage_draft(batch, wallet_address, file.filename, ingest)
+                results[i] = created[file_hash]
 
-    data = doc_snapshot.to_dict()
+        if created:
+            try:
+                with timed("firestore", "batch_commit"):
+                    await batch.commit()
+            except Exception:
+                for _, _, ingest in created.values():
+                    discard_ingest(ingest)
+                raise
+            for doc_ref, metadata, _ in created.values():
+                _remember_draft(doc_ref, metadata)
 
-    # Mint token jika belum pernah di-mint
-    if not data.get("tokenId"):
-        token_id = mint_document(
-            to_address=data["walletAddress"],
-            file_hash=data["fileHash"],
-            token_uri=f"ipfs://{data['fileHash']}"
+    return results
+
+
+async def save_documents_batch(
+    wallet_address: str,
+    files: list,
+    parser_hook: Optional[Callable[[str], dict]] = None,
+    ai_hook: Optional[Callable[[str], dict]] = None
+) -> AsyncIterator[BatchItemResult]:
+    """
+    Versi batch dari save_document untuk banyak file milik satu wallet.
+
+    Semua file di-ingest (hash + enkripsi) paralel dan semua Draft baru ditulis
+    dalam satu batch commit sebelum fungsi ini return, jadi isi UploadFile
+    sudah selesai dibaca. Sisanya (ekstraksi + mint) berjalan paralel dengan
+    batas BATCH_UPLOAD_CONCURRENCY; log OCR dan update tokenId dari file yang
+    selesai bersamaan digabung ke batch commit yang sama.
+
+    Return async iterator BatchItemResult, urut sesuai file yang selesai duluan.
+    """
+    slots = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+    async def ingest(file):
+        async with slots:
+            return await ingest_upload(file, TEMP_FOLDER)
+
+    ingests = await asyncio.gather(*(ingest(f) for f in files), return_exceptions=True)
+    drafts = await _create_drafts(wallet_address, files, ingests)
+    writer = _WriteCoalescer()
+
+    async def process(index: int, file, draft) -> BatchItemResult:
+        if isinstance(draft, BaseException):
+            return BatchItemResult(index=index, file_name=file.filename, status="error", error=f"{type(draft).__name__}: {draft}")
+        doc_ref, data, ingest = draft
+        if ingest is None:
+            return BatchItemResult(index=index, file_name=file.filename, status="duplicate", document=_to_response(doc_ref.id, data))
+
+        try:
+            async with slots:
+                extracted = await _extract(ingest.file_path, parser_hook, ai_hook)
+            data.update(await writer.write(lambda batch: _stage_log(batch, doc_ref, *extracted), ops=2))
+        except Exception as e:
+            return BatchItemResult(
+                index=index,
+                file_name=file.filename,
+                status="error",
+                document=_to_response(doc_ref.id, data),
+                error=f"{type(e).__name__}: {e}"
+            )
+        finally:
+            _remove_plaintext(ingest.file_path)
+            _document_cache.pop(doc_ref.id)
+
+        # ---------------- Mint dokumen di blockchain ----------------
+        try:
+            token_id = await _mint_token(wallet_address, ingest.file_hash)
+            fields = {"tokenId": token_id, "updatedAt": datetime.utcnow()}
+            await writer.write(lambda batch: batch.update(doc_ref, fields))
+            _document_cache.pop(doc_ref.id)
+            data.update(fields)
+        except Exception as e:
+            logger.warning("Mint failed for %s: %s", doc_ref.id, e)
+
+        return BatchItemResult(index=index, file_name=file.filename, status="created", document=_to_response(doc_ref.id, data))
+
+    async def results():
+        for finished in asyncio.as_completed([process(i, f, d) for i, (f, d) in enumerate(zip(files, drafts))]):
+            yield await finished
+
+    return results()
+
+
+# ---------------- Upload async: ekstraksi + mint di job queue ----------------
+async def submit_document(wallet_address: str, file) -> Tuple[DocumentResponse, Optional[str]]:
+    """
+    Simpan file + metadata Draft, lalu antrekan ekstraksi dan mint ke job queue.
+    Dokumen dan job-nya ditulis dalam satu batch.
+    Return (dokumen, job_id); job_id None kalau file duplikat (tidak ada yang perlu diproses).
+    """
+    jobs = []
+
+    def add_job(batch, doc_ref, metadata, ingest):
+        job_ref, job = job_queue.new_job(PROCESS_DOCUMENT_JOB, {
+            "documentId": doc_ref.id,
+            "walletAddress": wallet_address,
+            "fileHash": ingest.file_hash,
+            "filePath": ingest.file_path
+        })
+        batch.set(job_ref, job)
+        metadata.update({"processingJobId": job_ref.id, "processingStatus": "queued"})
+        jobs.append((job_ref.id, job))
+
+    doc_ref, data, ingest = await _create_draft(wallet_address, file, prepare=add_job)
+    if ingest is None:
+        return _to_response(doc_ref.id, data), None
+
+    job_id, job = jobs[0]
+    job_queue.dispatch(job_id, job)
+    return _to_response(doc_ref.id, data), job_id
+
+
+async def _process_document_job(payload: dict) -> dict:
+    """Job handler: ekstraksi + log OCR, lalu mint. Tahap yang sudah selesai dilewati saat retry."""
+    doc_ref = get_db().collection("documents").document(payload["documentId"])
+    data = await _read_document(doc_ref.id, fresh=True) or {}
+
+    token_id = data.get("tokenId")
+    if not data.get("ocrLogId"):
+        fields = {"processingStatus": "extracted"} if token_id is None else {"processingStatus": "done"}
+        await _extract_and_log(doc_ref, payload["filePath"], doc_fields=fields)
+        _remove_plaintext(payload["filePath"])
+
+    if token_id is None:
+        token_id = await _mint_for_document(
+            doc_ref,
+            payload["walletAddress"],
+            payload["fileHash"],
+            doc_fields={"processingStatus": "done"}
         )
-        doc_ref.update({"tokenId": token_id})
-        data["tokenId"] = token_id
 
-    # Panggil fungsi review di blockchain
-    receipt = review_document_onchain(data["tokenId"])
-    tx_hash = receipt.transactionHash.hex()
+    return {"documentId": doc_ref.id, "tokenId": token_id}
+
+
+async def _process_document_failed(payload: dict, error: str):
+    _remove_plaintext(payload["filePath"])
+    await _update_document(get_db().collection("documents").document(payload["documentId"]), {
+        "processingStatus": "failed",
+        "processingError": error,
+        "updatedAt": datetime.utcnow()
+    })
+
+
+async def _process_document_resumable(payload: dict) -> bool:
+    # Spool plaintext hanya ada di node yang menerima upload; setelah ekstraksi
+    # (ocrLogId ada) yang tersisa cuma mint, jadi spool tidak diperlukan lagi
+    if os.path.exists(payload["filePath"]):
+        return True
+    data = await _read_document(payload["documentId"], fresh=True) or {}
+    return bool(data.get("ocrLogId"))
+
+
+PROCESS_DOCUMENT_JOB = "process_document"
+job_queue.register_handler(
+    PROCESS_DOCUMENT_JOB,
+    _process_document_job,
+    on_failed=_process_document_failed,
+    resumable=_process_document_resumable
+)
+
+
+# ---------------- Status transaksi on-chain ----------------
+def _track_chain_tx(
+    doc_ref,
+    pending: PendingTransaction,
+    transition: Optional[Tuple[str, str]] = None,
+    token_id: Optional[int] = None
+):
+    """
+    Update txStatus dokumen (confirmed / failed) saat tracker menerima receipt.
+    transition = (status asal, status baru) yang sudah ditulis saat submit; kalau
+    tx revert, status dikembalikan ke status asal (juga di TradeChain lewat outbox),
+    karena chain tidak pernah mencapai status baru itu.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def rollback(error: TransactionFailed, tx_hashes: List[str]):
+        from_status, to_status = transition
+        # Hanya kalau dokumen belum berubah lagi (status + txHash masih milik tx ini)
+        rolled_back = await _transition_status(doc_ref, (to_status,), {
+            "status": from_status,
+            "txStatus": "failed",
+            "txHash": error.tx_hash,
+            "updatedAt": datetime.utcnow()
+        }, tx_hashes=tx_hashes)
+        if not rolled_back:
+            logger.warning("Document %s changed after reverted tx %s; status not rolled back", doc_ref.id, error.tx_hash)
+            return
+        logger.warning("Document %s rolled back to %s: tx %s reverted", doc_ref.id, from_status, error.tx_hash)
+        if token_id is not None:
+            await tradechain_outbox.enqueue_status_update(
+                token_id=str(token_id),
+                status=from_status,
+                tx_hash=error.tx_hash,
+                remarks=f"{to_status} transaction reverted on-chain"
+            )
+
+    async def record(error, tx_hash: str, tx_hashes: List[str]):
+        if isinstance(error, TransactionFailed) and transition is not None:
+            try:
+                await rollback(error, tx_hashes)
+            except Exception as e:
+                logger.warning("Failed to roll back status for %s: %s", doc_ref.id, e)
+            return
+        updates = {"txStatus": "failed" if error else "confirmed", "updatedAt": datetime.utcnow()}
+        if not error:
+            # Tx yang di-replace (fee bump) mined dengan hash berbeda dari yang dicatat saat submit
+            updates["txHash"] = tx_hash
+        try:
+            await _update_document(doc_ref, updates)
+        except Exception as e:
+            logger.warning("Failed to record txStatus for %s: %s", doc_ref.id, e)
+
+    def on_done(tx: PendingTransaction):
+        # Dipanggil dari thread tracker; client Firestore async hidup di event loop
+        error = tx.future.exception()
+        if error:
+            logger.warning("Transaction %s for %s failed: %s", tx.tx_hash, doc_ref.id, error)
+        else:
+            chain_indexer.index_receipt(tx.receipt)
+        asyncio.run_coroutine_threadsafe(record(error, tx.tx_hash, list(tx.hashes)), loop)
+
+    pending.add_done_callback(on_done)
 
+
+def _admin_signature(message: str) -> str:
     # Buat ECDSA signature admin
     account = _get_admin_account()
-    msg = encode_defunct(text=f"Review KYC document {data['tokenId']}")
-    signature = account.sign_message(msg).signature.hex()
+    return account.sign_message(encode_defunct(text=message)).signature.hex()
+
+
+# ---------------- Review Dokumen (Admin) ----------------
+async def review_document(document_id: str) -> bool:
+    doc_ref = get_db().collection("documents").document(document_id)
+    data = await _read_document(document_id, fresh=True)
+    if data is None or data.get("status", "Draft") != "Draft":
+        return False
 
-    # ✅ Update status Firestore
-    doc_ref.update({
+    # Mint token jika belum pernah di-mint
+    if not data.get("tokenId"):
+        data["tokenId"] = await _mint_for_document(doc_ref, data["walletAddress"], data["fileHash"])
+
+    # Panggil fungsi review di blockchain (tidak menunggu receipt)
+    pending = await asyncio.to_thread(review_document_onchain, data["tokenId"])
+    tx_hash = pending.tx_hash
+    signature = _admin_signature(f"Review KYC document {data['tokenId']}")
+
+    # ✅ Update status Firestore secara atomik; txStatus diperbarui saat receipt masuk
+    updated = await _transition_status(doc_ref, ("Draft",), {
         "status": "Reviewed",
+        "txHash": tx_hash,
+        "txStatus": "pending",
         "updatedAt": datetime.utcnow()
     })
+    if not updated:
+        logger.warning("Document %s changed while reviewing; tx %s not recorded", document_id, tx_hash)
+        return False
+    _track_chain_tx(doc_ref, pending, ("Draft", "Reviewed"), data["tokenId"])
 
-    # 🛠 Update KYC internal di backend TradeChain
-    update_kyc_internal(
+    # 🛠 Update KYC internal di backend TradeChain (via outbox, dikirim dispatcher)
+    await tradechain_outbox.enqueue_status_update(
         token_id=str(data["tokenId"]),
         status="Reviewed",
         reviewed_by="system",
@@ -231,34 +804,34 @@ def review_document(document_id: str) -> bool:
 
 
 # ---------------- Sign Dokumen (Admin) ----------------
-def sign_document(document_id: str) -> bool:
-    doc_ref = db.collection("documents").document(document_id)
-    doc_snapshot = doc_ref.get()
-    if not doc_snapshot.exists:
+async def sign_document(document_id: str) -> bool:
+    doc_ref = get_db().collection("documents").document(document_id)
+    data = await _read_document(document_id, fresh=True)
+    if data is None or data.get("status") != "Reviewed":
         return False
-
-    data = doc_snapshot.to_dict()
     token_id = data.get("tokenId")
     if not token_id:
         return False
 
-    # Panggil blockchain untuk sign
-    receipt = sign_document_onchain(token_id)
-    tx_hash = receipt.transactionHash.hex()
+    # Panggil blockchain untuk sign (tidak menunggu receipt)
+    pending = await asyncio.to_thread(sign_document_onchain, token_id)
+    tx_hash = pending.tx_hash
+    signature = _admin_signature(f"Sign KYC document {token_id}")
 
-    # Buat ECDSA signature admin
-    account = _get_admin_account()
-    msg = encode_defunct(text=f"Sign KYC document {token_id}")
-    signature = account.sign_message(msg).signature.hex()
-
-    # ✅ Update status Firestore
-    doc_ref.update({
+    # ✅ Update status Firestore secara atomik; txStatus diperbarui saat receipt masuk
+    updated = await _transition_status(doc_ref, ("Reviewed",), {
         "status": "Signed",
+        "txHash": tx_hash,
+        "txStatus": "pending",
         "updatedAt": datetime.utcnow()
     })
+    if not updated:
+        logger.warning("Document %s changed while signing; tx %s not recorded", document_id, tx_hash)
+        return False
+    _track_chain_tx(doc_ref, pending, ("Reviewed", "Signed"), token_id)
 
-    # 🛠 Update KYC internal di backend TradeChain
-    update_kyc_internal(
+    # 🛠 Update KYC internal di backend TradeChain (via outbox, dikirim dispatcher)
+    await tradechain_outbox.enqueue_status_update(
         token_id=str(token_id),
         status="Signed",
         signature=signature,
@@ -269,60 +842,479 @@ def sign_document(document_id: str) -> bool:
     return True
 
 
+# ---------------- Review / Sign massal (Admin) ----------------
+async def _get_documents(document_ids: List[str]) -> dict:
+    """Prefetch banyak dokumen dengan get_all (satu BatchGet per FIRESTORE_BATCH_LIMIT)."""
+    db = get_db()
+    refs = [db.collection("documents").document(document_id) for document_id in document_ids]
+    snapshots = {}
+    for start in range(0, len(refs), FIRESTORE_BATCH_LIMIT):
+        with timed("firestore", "get_all"):
+            async for snapshot in db.get_all(refs[start:start + FIRESTORE_BATCH_LIMIT]):
+                snapshots[snapshot.id] = snapshot
+    return snapshots
+
+
+def _lookup_token_ids(file_hashes: List[str]) -> Dict[str, int]:
+    # Index event lokal dulu; sisanya satu Multicall (0 = belum di-mint)
+    token_ids = {file_hash: chain_indexer.lookup_token_id(file_hash) for file_hash in file_hashes}
+    missing = [file_hash for file_hash, token_id in token_ids.items() if not token_id]
+    if missing:
+        values = read_many(("getTokenIdByHash", (file_hash,)) for file_hash in missing)
+        token_ids.update((file_hash, value or 0) for file_hash, value in zip(missing, values))
+    return token_ids
+
+
+async def _wait_all(submitted: list) -> list:
+    """Tunggu receipt semua PendingTransaction; exception pengiriman diteruskan apa adanya."""
+    async def wait(item):
+        if isinstance(item, BaseException):
+            raise item
+        return await item.wait()
+
+    return await asyncio.gather(*(wait(item) for item in submitted), return_exceptions=True)
+
+
+async def _mint_many(wallet_by_hash: Dict[str, str]) -> Dict[str, object]:
+    """
+    tokenId per fileHash; yang belum di-mint dikirim sekaligus (nonce berurutan)
+    lalu receipt-nya ditunggu bersamaan. Nilai = tokenId atau exception.
+    """
+    token_ids: Dict[str, object] = dict(await asyncio.to_thread(_lookup_token_ids, list(wallet_by_hash)))
+    to_mint = [(wallet_by_hash[file_hash], file_hash) for file_hash, token_id in token_ids.items() if not token_id]
+    if not to_mint:
+        return token_ids
+
+    with stage("mint_submit"):
+        submitted = await asyncio.to_thread(submit_mints, to_mint)
+    with stage("mint_confirm"):
+        receipts = await _wait_all(submitted)
+
+    def token_ids_from_receipts() -> Dict[str, object]:
+        found = {}
+        for (_, file_hash), receipt in zip(to_mint, receipts):
+            if isinstance(receipt, BaseException):
+                found[file_hash] = receipt
+                continue
+            events = chain_indexer.index_receipt(receipt)
+            found[file_hash] = next((e.token_id for e in events if e.file_hash == file_hash), None) \
+                or get_token_id_by_hash(file_hash)
+        return found
+
+    token_ids.update(await asyncio.to_thread(token_ids_from_receipts))
+    return token_ids
+
+
+async def _transition_many(entries: list, allowed_from: tuple) -> Set[str]:
+    """
+    Versi batch dari _transition_status untuk [(snapshot, fields)]. Tiap update
+    diberi precondition update_time dari snapshot prefetch; kalau ada dokumen
+    yang berubah sejak dibaca, batch itu batal dan diulang per dokumen secara
+    transaksional. Return id dokumen yang berhasil di-update.
+    """
+    db = get_db()
+    updated: Set[str] = set()
+    # Precondition hanya menjamin dokumen tidak berubah sejak snapshot; status
+    # snapshot itu sendiri juga harus masih allowed_from (seperti _transition_status)
+    entries = [
+        (snapshot, fields) for snapshot, fields in entries
+        if snapshot.exists and (snapshot.to_dict() or {}).get("status", "Draft") in allowed_from
+    ]
+    for start in range(0, len(entries), FIRESTORE_BATCH_LIMIT):
+        chunk = entries[start:start + FIRESTORE_BATCH_LIMIT]
+        batch = db.batch()
+        for snapshot, fields in chunk:
+            batch.update(snapshot.reference, fields, option=db.write_option(last_update_time=snapshot.update_time))
+        try:
+            with timed("firestore", "batch_commit"):
+                await batch.commit()
+            updated.update(snapshot.id for snapshot, _ in chunk)
+        except FailedPrecondition:
+            flags = await asyncio.gather(
+                *(_transition_status(snapshot.reference, allowed_from, fields) for snapshot, fields in chunk),
+                return_exceptions=True
+            )
+            updated.update(snapshot.id for (snapshot, _), ok in zip(chunk, flags) if ok is True)
+        except Exception as e:
+            logger.warning("Bulk status update failed for %d document(s): %s", len(chunk), e)
+        finally:
+            for snapshot, _ in chunk:
+                _document_cache.pop(snapshot.id)
+    return updated
+
+
+def _admin_signatures(messages: List[str]) -> List[str]:
+    account = _get_admin_account()
+    return [account.sign_message(encode_defunct(text=message)).signature.hex() for message in messages]
+
+
+async def _bulk_admin_action(
+    document_ids: List[str],
+    from_status: str,
+    to_status: str,
+    verb: str,
+    submit: Callable[[List[int]], list]
+) -> List[BulkActionResult]:
+    """
+    Review / sign banyak dokumen: prefetch (get_all), mint yang belum punya
+    tokenId, kirim semua tx dengan nonce berurutan tanpa menunggu receipt,
+    tanda tangan pesan sekaligus, update Firestore per batch dan satu commit
+    outbox TradeChain. txStatus tiap dokumen diperbarui saat receipt masuk.
+    """
+    document_ids = list(dict.fromkeys(document_ids))
+    if len(document_ids) > BULK_ADMIN_MAX_IDS:
+        raise ValueError(f"At most {BULK_ADMIN_MAX_IDS} documents per request")
+
+    results: Dict[str, BulkActionResult] = {}
+    snapshots = await _get_documents(document_ids)
+    ready = []
+    for document_id in document_ids:
+        snapshot = snapshots.get(document_id)
+        if snapshot is None or not snapshot.exists:
+            results[document_id] = BulkActionResult(document_id=document_id, outcome="not_found")
+            continue
+        data = snapshot.to_dict() or {}
+        status = data.get("status", "Draft")
+        if status != from_status:
+            results[document_id] = BulkActionResult(
+                document_id=document_id, outcome="skipped", status=status, token_id=data.get("tokenId"),
+                error=f"Document is {status}, expected {from_status}"
+            )
+            continue
+        if not data.get("tokenId") and from_status != "Draft":
+            results[document_id] = BulkActionResult(
+                document_id=document_id, outcome="skipped", status=status, error="Document has no tokenId"
+            )
+            continue
+        ready.append((snapshot, data))
+
+    # Mint token untuk dokumen Draft yang belum pernah di-mint
+    unminted = {snapshot.id: data for snapshot, data in ready if not data.get("tokenId")}
+    if unminted:
+        minted = await _mint_many({data["fileHash"]: data["walletAddress"] for data in unminted.values()})
+        token_writes = []
+        for snapshot, data in ready:
+            if snapshot.id not in unminted:
+                continue
+            token_id = minted.get(data["fileHash"])
+            if isinstance(token_id, BaseException) or not token_id:
+                results[snapshot.id] = BulkActionResult(
+                    document_id=snapshot.id, outcome="error", status=from_status,
+                    error=f"Mint failed: {type(token_id).__name__}: {token_id}" if token_id else "Mint failed"
+                )
+            else:
+                token_writes.append((snapshot.reference, token_id))
+        now = datetime.utcnow()
+        with stage("token_write"):
+            for start in range(0, len(token_writes), FIRESTORE_BATCH_LIMIT):
+                batch = get_db().batch()
+                for doc_ref, token_id in token_writes[start:start + FIRESTORE_BATCH_LIMIT]:
+                    batch.update(doc_ref, {"tokenId": token_id, "updatedAt": now})
+                with timed("firestore", "batch_commit"):
+                    await batch.commit()
+        # Snapshot baru: precondition update_time di bawah harus setelah write tokenId.
+        # Selama mint dokumen bisa saja diproses request lain, jadi status dicek ulang
+        # sebelum tx dikirim (snapshot baru sudah memuat perubahan itu).
+        refreshed = await _get_documents([doc_ref.id for doc_ref, _ in token_writes])
+        current = []
+        for snapshot, data in ready:
+            if snapshot.id in results:
+                continue
+            if snapshot.id in refreshed:
+                snapshot = refreshed[snapshot.id]
+                data = snapshot.to_dict() or {}
+            status = data.get("status", "Draft")
+            if status != from_status:
+                results[snapshot.id] = BulkActionResult(
+                    document_id=snapshot.id, outcome="skipped", status=status, token_id=data.get("tokenId"),
+                    error=f"Document is {status}, expected {from_status}"
+                )
+                continue
+            current.append((snapshot, data))
+        ready = current
+
+    if not ready:
+        return [results[document_id] for document_id in document_ids]
+
+    token_ids = [data["tokenId"] for _, data in ready]
+    submitted = await asyncio.to_thread(submit, token_ids)
+    signatures = await asyncio.to_thread(_admin_signatures, [f"{verb} KYC document {t}" for t in token_ids])
+
+    sent = []
+    for (snapshot, _), token_id, pending, signature in zip(ready, token_ids, submitted, signatures):
+        if isinstance(pending, BaseException):
+            results[snapshot.id] = BulkActionResult(
+                document_id=snapshot.id, outcome="error", status=from_status, token_id=token_id,
+                error=f"{type(pending).__name__}: {pending}"
+            )
+        else:
+            sent.append((snapshot, token_id, pending, signature))
+
+    now = datetime.utcnow()
+    updated = await _transition_many([
+        (snapshot, {"status": to_status, "txHash": pending.tx_hash, "txStatus": "pending", "updatedAt": now})
+        for snapshot, _, pending, _ in sent
+    ], (from_status,))
+
+    outbox_items = []
+    for snapshot, token_id, pending, signature in sent:
+        if snapshot.id not in updated:
+            logger.warning("Document %s changed while bulk %s; tx %s not recorded", snapshot.id, verb.lower(), pending.tx_hash)
+            results[snapshot.id] = BulkActionResult(
+                document_id=snapshot.id, outcome="error", token_id=token_id, tx_hash=pending.tx_hash,
+                error="Document changed concurrently; status not recorded"
+            )
+            continue
+        _track_chain_tx(snapshot.reference, pending, (from_status, to_status), token_id)
+        outbox_items.append({
+            "token_id": str(token_id),
+            "status": to_status,
+            "signature": signature,
+            "reviewed_by": "system",
+            "tx_hash": pending.tx_hash
+        })
+        results[snapshot.id] = BulkActionResult(
+            document_id=snapshot.id, outcome="ok", status=to_status, token_id=token_id, tx_hash=pending.tx_hash
+        )
+
+    # 🛠 Update KYC internal di backend TradeChain (via outbox, satu commit)
+    if outbox_items:
+        await tradechain_outbox.enqueue_status_updates(outbox_items)
+    return [results[document_id] for document_id in document_ids]
+
+
+async def review_documents(document_ids: List[str]) -> List[BulkActionResult]:
+    """Review massal (Draft → Reviewed); lihat _bulk_admin_action."""
+    return await _bulk_admin_action(document_ids, "Draft", "Reviewed", "Review", submit_reviews)
+
+
+async def sign_documents(document_ids: List[str]) -> List[BulkActionResult]:
+    """Sign massal (Reviewed → Signed); lihat _bulk_admin_action."""
+    return await _bulk_admin_action(document_ids, "Reviewed", "Signed", "Sign", submit_signs)
+
+
+# ---------------- Rekonsiliasi status on-chain ----------------
+async def get_onchain_statuses(token_ids: List[int]) -> List[OnchainStatus]:
+    """
+    Status on-chain banyak token (satu Multicall / batch RPC) dibandingkan dengan
+    status dokumen di Firestore (query tokenId "in", paralel per 30 token).
+    """
+    token_ids = list(dict.fromkeys(token_ids))
+    if len(token_ids) > ONCHAIN_STATUS_MAX_IDS:
+        raise ValueError(f"At most {ONCHAIN_STATUS_MAX_IDS} token ids per request")
+
+    async def lookup(chunk: List[int]):
+        with timed("firestore", "query"):
+            return await get_db().collection("documents").where("tokenId", "in", chunk).get()
+
+    def read_chain() -> dict:
+        # Index lokal kalau live, eth_call (Multicall) hanya untuk token yang belum terindeks
+        statuses = chain_indexer.lookup_statuses(token_ids)
+        missing = [token_id for token_id in token_ids if token_id not in statuses]
+        if missing:
+            statuses.update(get_document_statuses(missing))
+        return statuses
+
+    chunks = [token_ids[i:i + FIRESTORE_IN_LIMIT] for i in range(0, len(token_ids), FIRESTORE_IN_LIMIT)]
+    chain, *snapshot_lists = await asyncio.gather(
+        asyncio.to_thread(read_chain),
+        *(lookup(chunk) for chunk in chunks)
+    )
+
+    documents: dict = {}
+    for snapshots in snapshot_lists:
+        for snapshot in snapshots:
+            data = snapshot.to_dict() or {}
+            documents.setdefault(data.get("tokenId"), (snapshot.id, data.get("status", "Draft")))
+
+    items = []
+    for token_id in token_ids:
+        code = chain.get(token_id)
+        chain_status = CHAIN_STATUS_NAMES.get(code) if code is not None else None
+        document_id, firestore_status = documents.get(token_id, (None, None))
+        items.append(OnchainStatus(
+            token_id=token_id,
+            chain_status=chain_status,
+            chain_status_code=code,
+            document_id=document_id,
+            firestore_status=firestore_status,
+            in_sync=chain_status is not None and chain_status == firestore_status
+        ))
+    return items
+
+
+async def reconcile_from_index(limit: int = 300) -> int:
+    """
+    Rekonsiliasi inkremental: token yang status on-chain-nya berubah (menurut
+    chain_indexer) disalin ke dokumen Firestore. Status hanya maju
+    (Draft → Reviewed → Signed); Firestore yang sudah lebih maju (tx masih
+    pending) tidak diturunkan. Return jumlah dokumen yang di-update.
+    """
+    rows = await asyncio.to_thread(chain_indexer.pending_changes, limit)
+    if not rows:
+        return 0
+    chain_status = {row["token_id"]: CHAIN_STATUS_NAMES.get(row["status"]) for row in rows}
+    rank = {name: code for code, name in CHAIN_STATUS_NAMES.items()}
+
+    async def lookup(chunk: List[int]):
+        with timed("firestore", "query"):
+            return await get_db().collection("documents").where("tokenId", "in", chunk).get()
+
+    token_ids = list(chain_status)
+    chunks = [token_ids[i:i + FIRESTORE_IN_LIMIT] for i in range(0, len(token_ids), FIRESTORE_IN_LIMIT)]
+    snapshot_lists = await asyncio.gather(*(lookup(chunk) for chunk in chunks))
+
+    updates = []
+    for snapshot in (s for snapshots in snapshot_lists for s in snapshots):
+        data = snapshot.to_dict() or {}
+        target = chain_status.get(data.get("tokenId"))
+        if target and rank[target] > rank.get(data.get("status", "Draft"), 0):
+            updates.append((snapshot.reference, target))
+
+    now = datetime.utcnow()
+    for start in range(0, len(updates), FIRESTORE_BATCH_LIMIT):
+        batch = get_db().batch()
+        for doc_ref, status in updates[start:start + FIRESTORE_BATCH_LIMIT]:
+            batch.update(doc_ref, {"status": status, "statusSource": "chain", "updatedAt": now})
+        with timed("firestore", "batch_commit"):
+            await batch.commit()
+        for doc_ref, _ in updates[start:start + FIRESTORE_BATCH_LIMIT]:
+            _document_cache.pop(doc_ref.id)
+
+    await asyncio.to_thread(chain_indexer.mark_synced, rows)
+    if updates:
+        logger.info("Reconciled %d document status(es) from chain events", len(updates))
+    return len(updates)
+
+
+chain_indexer.on_change(reconcile_from_index)
+
+
 # ---------------- Getter ----------------
-def get_document(document_id: str) -> Optional[DocumentResponse]:
-    doc_ref = db.collection("documents").document(document_id)
-    doc_snapshot = doc_ref.get()
-    if not doc_snapshot.exists:
+async def get_document(document_id: str) -> Optional[DocumentResponse]:
+    data = await _read_document(document_id)
+    if data is None:
         return None
-    data = doc_snapshot.to_dict()
-    return DocumentResponse(
-        id=document_id,
-        wallet_address=data.get("walletAddress", ""),
-        file_name=data.get("fileName", ""),
-        file_hash=data.get("fileHash", ""),
-        status=data.get("status", "Draft"),
-        token_id=data.get("tokenId"),
-        created_at=data.get("createdAt", datetime.utcnow()),
-        updated_at=data.get("updatedAt", datetime.utcnow())
-    )
+    return _to_response(document_id, data)
+
+
+# Nama field API -> nama field Firestore (untuk projection)
+DOCUMENT_FIELDS = {
+    "wallet_address": "walletAddress",
+    "file_name": "fileName",
+    "file_hash": "fileHash",
+    "status": "status",
+    "token_id": "tokenId",
+    "linked_wallets": "linkedWallets",
+    "processing_status": "processingStatus",
+    "created_at": "createdAt",
+    "updated_at": "updatedAt",
+}
+MAX_PAGE_SIZE = 200
 
 
-def get_all_documents() -> List[DocumentResponse]:
-    snapshots = db.collection("documents").stream()
-    documents = []
+async def get_all_documents(
+    limit: int = 50,
+    start_after: Optional[str] = None,
+    wallet_address: Optional[str] = None,
+    status: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[List[DocumentSummary], Optional[str]]:
+    """
+    Satu halaman dokumen, terbaru dulu (createdAt desc).
+
+    start_after: id dokumen terakhir dari halaman sebelumnya (next_cursor).
+    fields: nama field API yang diambil (projection); None = semua field.
+    Filter walletAddress/status butuh composite index dengan createdAt (lihat README).
+    Return (items, next_cursor); next_cursor None kalau sudah halaman terakhir.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = get_db().collection("documents")
+    if wallet_address:
+        query = query.where("walletAddress", "==", wallet_address)
+    if status:
+        query = query.where("status", "==", status)
+    query = query.order_by("createdAt", direction=firestore.Query.DESCENDING)
+
+    if fields:
+        unknown = [f for f in fields if f not in DOCUMENT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        query = query.select([DOCUMENT_FIELDS[f] for f in fields])
+
+    with timed("firestore", "list"):
+        if start_after:
+            cursor = await get_db().collection("documents").document(start_after).get()
+            if not cursor.exists:
+                raise ValueError("Invalid cursor")
+            query = query.start_after(cursor)
+
+        # Ambil satu ekstra untuk tahu apakah masih ada halaman berikutnya
+        snapshots = [doc async for doc in query.limit(limit + 1).stream()]
+    has_more = len(snapshots) > limit
+    snapshots = snapshots[:limit]
+
+    wanted = fields or list(DOCUMENT_FIELDS)
+    items = []
     for doc in snapshots:
-        data = doc.to_dict()
-        documents.append(
-            DocumentResponse(
-                id=doc.id,
-                wallet_address=data.get("walletAddress", ""),
-                file_name=data.get("fileName", ""),
-                file_hash=data.get("fileHash", ""),
-                status=data.get("status", "Draft"),
-                token_id=data.get("tokenId"),
-                created_at=data.get("createdAt", datetime.utcnow()),
-                updated_at=data.get("updatedAt", datetime.utcnow())
-            )
-        )
-    return documents
+        data = doc.to_dict() or {}
+        items.append(DocumentSummary(id=doc.id, **{f: data.get(DOCUMENT_FIELDS[f]) for f in wanted}))
+
+    next_cursor = snapshots[-1].id if has_more and snapshots else None
+    return items, next_cursor
 
 
-def get_document_logs(document_id: str) -> List[dict]:
-    snapshots = db.collection("document_logs") \
+def _log_text(data: dict) -> Optional[str]:
+    # Log lama menyimpan ocrText inline; log baru lewat blob store (preview = teks lengkap kalau pendek)
+    if "ocrText" in data:
+        return data["ocrText"]
+    preview = data.get("ocrTextPreview", "")
+    if data.get("ocrTextSize", 0) <= len(preview):
+        return preview
+    return blob_store.get_text_or_none(data.get("ocrTextRef"))
+
+
+async def get_document_logs(document_id: str, include_text: bool = False) -> List[dict]:
+    """
+    Log OCR dokumen, urut createdAt. Default hanya ringkasan (preview + ukuran);
+    include_text=True ikut mengambil teks lengkap dari blob store.
+    """
+    snapshots = get_db().collection("document_logs") \
                   .where("documentId", "==", document_id) \
                   .order_by("createdAt") \
                   .stream()
     logs = []
-    for log in snapshots:
+    records = []
+    async for log in snapshots:
         data = log.to_dict()
+        inline = data.get("ocrText")
         logs.append({
             "id": log.id,
-            "ocrText": data.get("ocrText", ""),
+            "ocrTextPreview": data.get("ocrTextPreview", (inline or "")[:blob_store.OCR_TEXT_PREVIEW_CHARS]),
+            "ocrTextSize": data.get("ocrTextSize", len(inline or "")),
+            "ocrTextRef": data.get("ocrTextRef"),
             "parsedFieldsLocal": data.get("parsedFieldsLocal", {}),
             "parsedFieldsAI": data.get("parsedFieldsAI", {}),
             "verificationLocal": data.get("verificationLocal", ""),
             "verificationAI": data.get("verificationAI", ""),
             "createdAt": data.get("createdAt", datetime.utcnow())
         })
+        records.append(data)
+
+    if include_text:
+        full = await asyncio.gather(*(asyncio.to_thread(_log_text, data) for data in records))
+        for log, text in zip(logs, full):
+            log["ocrText"] = text
     return logs
+
+
+async def get_document_log_text(document_id: str, log_id: str) -> Optional[str]:
+    """Teks OCR lengkap satu log (None kalau log tidak ada / bukan milik dokumen ini)."""
+    with timed("firestore", "get"):
+        snapshot = await get_db().collection("document_logs").document(log_id).get()
+    if not snapshot.exists:
+        return None
+    data = snapshot.to_dict() or {}
+    if data.get("documentId") != document_id:
+        return None
+    return await asyncio.to_thread(_log_text, data)
@@ -3,7 +3,16 @@ import os
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-client = OpenAI()
+_client = None
+
+
+def get_openai_client() -> OpenAI:
+    # Dibuat saat pertama dipakai; OpenAI() raise kalau OPENAI_API_KEY tidak diset
+    global _client
+    if _client is None:
+        _client = OpenAI()
+    return _client
+
 
 async def analyze_document_with_ai(text: str) -> dict:
     prompt = f"""
@@ -13,7 +22,7 @@ async def analyze_document_with_ai(text: str) -> dict:
     {{ "status": "...", "parsedFields": {{...}} }}
     Teks dokumen: {text[:8000]}
     """
-    response = client.chat.completions.create(
+    response = get_openai_client().chat.completions.create(
         model="gpt-4",
         messages=[{"role": "user", "content": prompt}]
     )
@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+from app.services import blockchain_service, chain_indexer, job_queue, tradechain_outbox
+from app.services.openai_service import OPENAI_API_KEY
+from app.utils import firestore_client
+from app.utils.cache import LRUCache
+from app.utils.tradechain_client import get_tradechain_client
+
+# -------------------- Konfigurasi --------------------
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", "3"))
+# Probe dipanggil tiap beberapa detik per worker; hasil di-cache supaya tidak membebani RPC/Firestore
+READY_CACHE_TTL = float(os.getenv("READY_CACHE_TTL", "5"))
+
+# Dependency yang wajib sehat; sisanya hanya dilaporkan
+REQUIRED_CHECKS = ("firestore", "chain", "job_workers", "outbox_dispatcher")
+
+_cache = LRUCache(maxsize=1, ttl=READY_CACHE_TTL)
+
+
+async def _check_chain(timeout: float) -> dict:
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(blockchain_service.check_connection), timeout=timeout)
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": f"timeout after {timeout:.0f}s"}
+
+
+async def check_readiness(use_cache: bool = True) -> dict:
+    """
+    Status tiap dependency untuk GET /ready:
+    {"ready": bool, "checks": {nama: {"ok": bool, ...}}}.
+    Pemanggilan pertama sekaligus membuat client Firestore / Web3 (lazy).
+    """
+    if use_cache:
+        cached = _cache.get("report")
+        if cached is not None:
+            return cached
+
+    firestore_status, chain_status = await asyncio.gather(
+        firestore_client.check_connection(READY_CHECK_TIMEOUT),
+        _check_chain(READY_CHECK_TIMEOUT),
+    )
+    workers = job_queue.workers_running()
+    checks = {
+        "firestore": firestore_status,
+        "chain": chain_status,
+        "job_workers": {"ok": workers > 0, "running": workers},
+        "outbox_dispatcher": {"ok": tradechain_outbox.dispatcher_running()},
+        # Opsional: fitur terkait dimatikan kalau belum dikonfigurasi
+        "tradechain": {"ok": True, "configured": get_tradechain_client() is not None},
+        "openai": {"ok": True, "configured": bool(OPENAI_API_KEY)},
+        # Index tertinggal hanya berarti lookup jatuh ke eth_call
+        "chain_indexer": {"ok": True, "enabled": chain_indexer.INDEXER_ENABLED,
+                          "live": await asyncio.to_thread(chain_indexer.is_live)},
+    }
+    report = {"ready": all(checks[name]["ok"] for name in REQUIRED_CHECKS), "checks": checks}
+    _cache.set("report", report)
+    return report
@@ -0,0 +1,388 @@
+"""
+Durable outbox untuk update status KYC ke TradeChain.
+
+Endpoint admin cukup menulis baris outbox (SQLite lokal, commit sinkron) lalu return.
+Dispatcher di background mengirim isi outbox per batch:
+- coalescing: per token hanya status terbaru yang dikirim, baris lama ditandai superseded
+- retry dengan backoff per baris, lease supaya beberapa worker uvicorn tidak mengirim dobel
+
+Replay manual:
+    python -m app.services.tradechain_outbox replay [--token-id 12] [--status failed]
+    python -m app.services.tradechain_outbox stats
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app.utils import metrics as prom
+from app.utils.tradechain_client import close_tradechain_client
+from app.utils.tradechain_kyc import update_kyc_internal
+
+logger = logging.getLogger(__name__)
+
+# -------------------- Konfigurasi --------------------
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", "data/tradechain_outbox.sqlite3")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_RETRY_BASE_DELAY = float(os.getenv("OUTBOX_RETRY_BASE_DELAY", "5"))
+OUTBOX_RETRY_MAX_DELAY = float(os.getenv("OUTBOX_RETRY_MAX_DELAY", "600"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+
+# pending -> delivered | superseded | failed (setelah OUTBOX_MAX_ATTEMPTS)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (state, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_outbox_token ON outbox (token_id, state);
+"""
+
+_local = threading.local()
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+# Metrics in-process (per worker); juga diekspor ke /metrics sebagai kyc_outbox_events_total
+metrics: Dict[str, int] = {
+    "enqueued": 0,
+    "delivered": 0,
+    "coalesced": 0,
+    "retried": 0,
+    "failed": 0,
+    "batches": 0,
+}
+
+
+def _count(event: str, amount: int = 1):
+    metrics[event] += amount
+    prom.inc("outbox", amount, event)
+
+
+def _connect() -> sqlite3.Connection:
+    """Satu koneksi SQLite per thread; WAL supaya writer dan dispatcher tidak saling blok."""
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(OUTBOX_DB_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(OUTBOX_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(SCHEMA)
+                _schema_ready = True
+        _local.conn = conn
+    return conn
+
+
+# -------------------- Producer --------------------
+def _enqueue_many_sync(items: List[tuple]) -> List[int]:
+    conn = _connect()
+    now = time.time()
+    ids = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for token_id, payload in items:
+            cur = conn.execute(
+                "INSERT INTO outbox (token_id, payload, created_at) VALUES (?, ?, ?)",
+                (str(token_id), json.dumps(payload), now),
+            )
+            ids.append(cur.lastrowid)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _count("enqueued", len(ids))
+    return ids
+
+
+async def enqueue_status_update(
+    token_id: str,
+    status: Optional[str] = None,
+    signature: Optional[str] = None,
+    reviewed_by: Optional[str] = None,
+    tx_hash: Optional[str] = None,
+    remarks: Optional[str] = None,
+) -> int:
+    """Catat update status (argumen sama dengan update_kyc_internal). Return id baris outbox."""
+    payload = {
+        "status": status,
+        "signature": signature,
+        "reviewed_by": reviewed_by,
+        "tx_hash": tx_hash,
+        "remarks": remarks,
+    }
+    ids = await asyncio.to_thread(_enqueue_many_sync, [(token_id, payload)])
+    notify()
+    return ids[0]
+
+
+async def enqueue_status_updates(items: List[dict]) -> List[int]:
+    """Versi batch: items berisi dict dengan key token_id + argumen update_kyc_internal. Satu commit."""
+    rows = []
+    for item in items:
+        item = dict(item)
+        token_id = item.pop("token_id")
+        rows.append((token_id, item))
+    ids = await asyncio.to_thread(_enqueue_many_sync, rows)
+    notify()
+    return ids
+
+
+# -------------------- Dispatcher --------------------
+def _claim_batch_sync(owner: str, limit: int) -> List[sqlite3.Row]:
+    """
+    Coalesce lalu ambil lease atas baris pending yang jatuh tempo.
+    - Per token hanya baris pending terbaru yang dikirim; yang lebih lama jadi superseded.
+    - Token yang masih punya baris in-flight (lease worker lain) dilewati,
+      supaya urutan update per token tetap terjaga.
+    """
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        superseded = conn.execute(
+            """
+            UPDATE outbox SET state = 'superseded', lease_owner = NULL
+            WHERE state = 'pending' AND lease_until < ?
+              AND id < (SELECT MAX(o2.id) FROM outbox o2
+                        WHERE o2.token_id = outbox.token_id AND o2.state = 'pending')
+            """,
+            (now,),
+        ).rowcount
+        conn.execute(
+            """
+            UPDATE outbox SET lease_owner = ?, lease_until = ?
+            WHERE id IN (
+                SELECT id FROM outbox
+                WHERE state = 'pending' AND next_attempt_at <= ? AND lease_until < ?
+                  AND token_id NOT IN (
+                      SELECT token_id FROM outbox WHERE state = 'pending' AND lease_until >= ?
+                  )
+                ORDER BY id LIMIT ?
+            )
+            """,
+            (owner, now + OUTBOX_LEASE_SECONDS, now, now, now, limit),
+        )
+        rows = conn.execute(
+            "SELECT * FROM outbox WHERE lease_owner = ? AND state = 'pending' AND lease_until >= ? ORDER BY id",
+            (owner, now),
+        ).fetchall()
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    _count("coalesced", superseded)
+    return rows
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(OUTBOX_RETRY_BASE_DELAY * (2 ** (attempts - 1)), OUTBOX_RETRY_MAX_DELAY)
+
+
+def _record_results_sync(results: List[tuple]):
+    """results: (row, delivered: bool, error: Optional[str])"""
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for row, delivered, error in results:
+            if delivered:
+                conn.execute(
+                    "UPDATE outbox SET state = 'delivered', delivered_at = ?, lease_owner = NULL, last_error = NULL WHERE id = ?",
+                    (now, row["id"]),
+                )
+                continue
+            attempts = row["attempts"] + 1
+            state = "failed" if attempts >= OUTBOX_MAX_ATTEMPTS else "pending"
+            conn.execute(
+                """
+                UPDATE outbox SET state = ?, attempts = ?, last_error = ?, next_attempt_at = ?,
+                                  lease_owner = NULL, lease_until = 0
+                WHERE id = ?
+                """,
+                (state, attempts, error, now + _retry_delay(attempts), row["id"]),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+async def _deliver(row: sqlite3.Row) -> tuple:
+    payload = json.loads(row["payload"])
+    try:
+        ok = await update_kyc_internal(token_id=row["token_id"], **payload)
+    except Exception as e:
+        return row, False, f"{type(e).__name__}: {e}"
+    return row, ok, None if ok else "TradeChain rejected update"
+
+
+async def dispatch_once(owner: str, limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Kirim satu batch. Return jumlah baris yang diproses."""
+    rows = await asyncio.to_thread(_claim_batch_sync, owner, limit)
+    if not rows:
+        return 0
+
+    # Concurrency dibatasi oleh TradeChainClient (semaphore + connection pool)
+    results = await asyncio.gather(*(_deliver(row) for row in rows))
+    await asyncio.to_thread(_record_results_sync, results)
+
+    _count("batches")
+    for row, delivered, _ in results:
+        if delivered:
+            _count("delivered")
+        elif row["attempts"] + 1 >= OUTBOX_MAX_ATTEMPTS:
+            _count("failed")
+        else:
+            _count("retried")
+    return len(rows)
+
+
+_dispatcher: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+
+
+async def _run_dispatcher():
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    while True:
+        try:
+            processed = await dispatch_once(owner)
+        except Exception as e:
+            logger.exception("Outbox dispatcher error: %s", e)
+            processed = 0
+        if processed < OUTBOX_BATCH_SIZE:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+
+
+def notify():
+    """Bangunkan dispatcher setelah enqueue, tanpa menunggu OUTBOX_POLL_INTERVAL."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def start_dispatcher():
+    global _dispatcher, _wakeup
+    if _dispatcher is None:
+        _wakeup = asyncio.Event()
+        _dispatcher = asyncio.create_task(_run_dispatcher(), name="tradechain-outbox")
+
+
+async def stop_dispatcher():
+    global _dispatcher
+    if _dispatcher is not None:
+        _dispatcher.cancel()
+        await asyncio.gather(_dispatcher, return_exceptions=True)
+    _dispatcher = None
+
+
+def dispatcher_running() -> bool:
+    return _dispatcher is not None and not _dispatcher.done()
+
+
+# -------------------- Observability & replay --------------------
+def outbox_stats() -> dict:
+    conn = _connect()
+    counts = {row["state"]: row["n"] for row in conn.execute("SELECT state, COUNT(*) AS n FROM outbox GROUP BY state")}
+    oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE state = 'pending'").fetchone()[0]
+    return {
+        "rows": counts,
+        "oldest_pending_age_seconds": time.time() - oldest if oldest else 0.0,
+        "worker": dict(metrics),
+    }
+
+
+def replay(token_id: Optional[str] = None, states: tuple = ("failed",), since: Optional[float] = None) -> int:
+    """
+    Jadwalkan ulang baris outbox (default: yang failed) untuk dikirim lagi.
+    Untuk tiap token hanya baris terbaru (di semua state) yang di-replay, dan hanya
+    kalau baris itu ada di states: update lama yang gagal tidak boleh menimpa
+    status lebih baru yang sudah terkirim. Return jumlah baris.
+    """
+    conn = _connect()
+    where = [f"state IN ({','.join('?' * len(states))})"]
+    params: list = list(states)
+    if token_id:
+        where.append("token_id = ?")
+        params.append(str(token_id))
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.execute(
+            f"""
+            UPDATE outbox SET state = 'pending', attempts = 0, next_attempt_at = 0,
+                              lease_owner = NULL, lease_until = 0, last_error = NULL
+            WHERE id IN (
+                SELECT MAX(id) FROM outbox WHERE {" AND ".join(where)} GROUP BY token_id
+            )
+              AND id = (SELECT MAX(o2.id) FROM outbox o2 WHERE o2.token_id = outbox.token_id)
+            """,
+            params,
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return cur.rowcount
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="TradeChain outbox tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    replay_cmd = sub.add_parser("replay", help="Kirim ulang update yang gagal / sudah terkirim")
+    replay_cmd.add_argument("--token-id")
+    replay_cmd.add_argument("--status", action="append", choices=["failed", "delivered", "superseded"],
+                            help="State yang di-replay (default: failed)")
+    replay_cmd.add_argument("--since", type=float, help="Unix timestamp minimum created_at")
+    replay_cmd.add_argument("--send", action="store_true", help="Langsung kirim, tanpa menunggu dispatcher")
+
+    sub.add_parser("stats", help="Jumlah baris per state")
+
+    args = parser.parse_args()
+    if args.command == "stats":
+        print(json.dumps(outbox_stats(), indent=2))
+        return
+
+    count = replay(token_id=args.token_id, states=tuple(args.status or ["failed"]), since=args.since)
+    print(f"Rescheduled {count} outbox row(s)")
+    if args.send and count:
+        async def drain():
+            owner = f"replay-{uuid.uuid4().hex[:8]}"
+            try:
+                while await dispatch_once(owner):
+                    pass
+            finally:
+                await close_tradechain_client()
+        asyncio.run(drain())
+        print(json.dumps(metrics, indent=2))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,464 @@
+# app/services/tx_manager.py
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Union
+
+from web3.exceptions import ContractLogicError, TransactionNotFound
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# -------------------- Konfigurasi --------------------
+RECEIPT_POLL_INTERVAL = 1.0   # detik antar polling receipt
+RECEIPT_TIMEOUT = float(os.getenv("TX_RECEIPT_TIMEOUT", "300"))  # tx yang belum mined setelah ini dianggap gagal
+
+# -------------------- Konfigurasi fee --------------------
+# EIP-1559: maxFeePerGas = baseFee * TX_BASE_FEE_MULTIPLIER + tip. Chain tanpa
+# baseFeePerGas (legacy) otomatis memakai gasPrice dari node.
+TX_BASE_FEE_MULTIPLIER = float(os.getenv("TX_BASE_FEE_MULTIPLIER", "2"))
+TX_PRIORITY_FEE_GWEI = float(os.getenv("TX_PRIORITY_FEE_GWEI", "1.5"))  # tip minimum
+TX_MAX_FEE_GWEI = float(os.getenv("TX_MAX_FEE_GWEI", "200"))            # batas atas, termasuk setelah bump
+TX_FEE_CACHE_SECONDS = float(os.getenv("TX_FEE_CACHE_SECONDS", "2"))
+# Gas limit = estimate_gas * multiplier; gas yang diberikan caller hanya dipakai kalau estimasi gagal
+TX_GAS_MULTIPLIER = float(os.getenv("TX_GAS_MULTIPLIER", "1.2"))
+
+# -------------------- Konfigurasi replacement --------------------
+# Tx tanpa receipt setelah TX_STUCK_SECONDS dikirim ulang (nonce sama) dengan fee
+# naik TX_FEE_BUMP_PERCENT (node menolak replacement di bawah +10%).
+TX_STUCK_SECONDS = float(os.getenv("TX_STUCK_SECONDS", "45"))
+TX_FEE_BUMP_PERCENT = float(os.getenv("TX_FEE_BUMP_PERCENT", "15"))
+TX_MAX_REPLACEMENTS = int(os.getenv("TX_MAX_REPLACEMENTS", "5"))
+
+
+class TransactionFailed(Exception):
+    """Transaksi mined tapi revert (receipt.status == 0)."""
+
+    def __init__(self, tx_hash: str, receipt=None):
+        super().__init__(f"Transaction {tx_hash} reverted")
+        self.tx_hash = tx_hash
+        self.receipt = receipt
+
+
+class FeeStrategy:
+    """
+    Hitung field fee untuk build_transaction dan fee pengganti untuk tx yang nyangkut.
+    Harga pasar di-cache sebentar supaya submit beruntun tidak menambah RPC per tx.
+    """
+
+    def __init__(
+        self,
+        w3,
+        base_fee_multiplier: float = TX_BASE_FEE_MULTIPLIER,
+        priority_fee_gwei: float = TX_PRIORITY_FEE_GWEI,
+        max_fee_gwei: float = TX_MAX_FEE_GWEI,
+        bump_percent: float = TX_FEE_BUMP_PERCENT,
+        cache_seconds: float = TX_FEE_CACHE_SECONDS,
+    ):
+        self.w3 = w3
+        self.base_fee_multiplier = base_fee_multiplier
+        self.min_priority_fee = w3.to_wei(priority_fee_gwei, "gwei")
+        self.max_fee = w3.to_wei(max_fee_gwei, "gwei")
+        self.bump_percent = bump_percent
+        self.cache_seconds = cache_seconds
+        self._lock = threading.Lock()
+        self._cached: Optional[dict] = None
+        self._cached_at = 0.0
+
+    def _priority_fee(self) -> int:
+        try:
+            suggested = self.w3.eth.max_priority_fee
+        except Exception:
+            # eth_maxPriorityFeePerGas tidak didukung semua node
+            suggested = 0
+        return max(int(suggested), self.min_priority_fee)
+
+    def _market_fees(self) -> dict:
+        base_fee = self.w3.eth.get_block("latest").get("baseFeePerGas")
+        if base_fee is None:
+            return {"gasPrice": min(int(self.w3.eth.gas_price), self.max_fee)}
+        priority = min(self._priority_fee(), self.max_fee)
+        max_fee = min(int(base_fee * self.base_fee_multiplier) + priority, self.max_fee)
+        return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": priority}
+
+    def fees(self, fresh: bool = False) -> dict:
+        """Field fee untuk tx baru: {maxFeePerGas, maxPriorityFeePerGas} atau {gasPrice}."""
+        with self._lock:
+            now = time.monotonic()
+            if fresh or self._cached is None or now - self._cached_at > self.cache_seconds:
+                self._cached = self._market_fees()
+                self._cached_at = now
+            return dict(self._cached)
+
+    def bump(self, previous: dict) -> Optional[dict]:
+        """
+        Fee untuk replacement: semua field naik minimal bump_percent dan tidak
+        di bawah harga pasar sekarang. None kalau sudah mentok max_fee.
+        """
+        market = self.fees(fresh=True)
+        bumped = {}
+        for field, old in previous.items():
+            minimum = old * (100 + self.bump_percent) // 100 + 1
+            bumped[field] = max(minimum, market.get(field, 0))
+        if any(value > self.max_fee for value in bumped.values()):
+            return None
+        if "maxPriorityFeePerGas" in bumped:
+            bumped["maxPriorityFeePerGas"] = min(bumped["maxPriorityFeePerGas"], bumped["maxFeePerGas"])
+        return bumped
+
+    def below_market(self, current: dict) -> bool:
+        """True kalau fee tx lebih rendah dari harga pasar yang sedang berlaku."""
+        market = self.fees()
+        return any(current.get(field, 0) < value for field, value in market.items())
+
+
+class PendingTransaction:
+    """
+    Handle untuk transaksi yang sudah dikirim tapi belum tentu mined.
+    tx_hash langsung tersedia; receipt diisi oleh tracker di background.
+    Kalau tx di-replace (fee di-bump), tx_hash menunjuk ke kiriman terakhir
+    dan setelah mined ke hash yang benar-benar masuk block.
+    """
+
+    def __init__(self, tx_hash: str, nonce: int, txn: Optional[dict] = None):
+        self.tx_hash = tx_hash
+        self.nonce = nonce
+        self.txn = txn                   # tx unsigned terakhir, untuk dikirim ulang dengan fee baru
+        self.hashes: List[str] = [tx_hash]
+        self.replacements = 0
+        self.sent_at = time.monotonic()
+        self.last_sent_at = self.sent_at
+        self.future: Future = Future()
+
+    def result(self, timeout: Optional[float] = None):
+        """Blokir sampai receipt tersedia (untuk kode sync)."""
+        return self.future.result(timeout=timeout)
+
+    async def wait(self, timeout: Optional[float] = None):
+        """Tunggu receipt tanpa memblokir event loop."""
+        return await asyncio.wait_for(asyncio.wrap_future(self.future), timeout=timeout)
+
+    def add_done_callback(self, fn: Callable[["PendingTransaction"], None]):
+        """fn(pending) dipanggil dari thread tracker saat tx mined / gagal."""
+        self.future.add_done_callback(lambda _: fn(self))
+
+    @property
+    def receipt(self):
+        if self.future.done() and not self.future.exception():
+            return self.future.result()
+        return None
+
+
+class TransactionManager:
+    """
+    Kirim transaksi dari satu akun (admin) tanpa tabrakan nonce.
+
+    - Nonce dibagikan secara lokal (di-sync dari node sekali, lalu increment).
+      Kalau pengiriman gagal, nonce di-resync dari node supaya tidak ada gap.
+    - submit() tidak menunggu receipt; thread tracker mem-polling receipt
+      semua tx pending, jadi banyak tx admin bisa in-flight bersamaan.
+    - Fee EIP-1559 dari FeeStrategy, gas limit dari estimate_gas.
+    - Tx tanpa receipt setelah stuck_after detik dikirim ulang dengan nonce sama
+      dan fee lebih tinggi (maks. max_replacements kali). Yang di-replace adalah
+      nonce pending terendah (semua tx berikutnya antre di belakangnya) dan tx
+      yang fee-nya sudah di bawah harga pasar.
+
+    w3 dan account di-inject sehingga bisa diuji dengan dev chain lokal
+    (anvil / hardhat) atau provider in-process (EthereumTesterProvider).
+    """
+
+    def __init__(
+        self,
+        w3,
+        account,
+        poll_interval: float = RECEIPT_POLL_INTERVAL,
+        receipt_timeout: float = RECEIPT_TIMEOUT,
+        fee_strategy: Optional[FeeStrategy] = None,
+        stuck_after: float = TX_STUCK_SECONDS,
+        max_replacements: int = TX_MAX_REPLACEMENTS,
+        gas_multiplier: float = TX_GAS_MULTIPLIER,
+    ):
+        self.w3 = w3
+        self.account = account
+        self.poll_interval = poll_interval
+        self.receipt_timeout = receipt_timeout
+        self.fees = fee_strategy or FeeStrategy(w3)
+        self.stuck_after = stuck_after
+        self.max_replacements = max_replacements
+        self.gas_multiplier = gas_multiplier
+
+        self._nonce_lock = threading.Lock()
+        self._next_nonce: Optional[int] = None
+
+        self._pending: Dict[str, PendingTransaction] = {}
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._tracker: Optional[threading.Thread] = None
+        self._stopped = False
+
+    # -------------------- Nonce --------------------
+    def _allocate_nonce(self) -> int:
+        with self._nonce_lock:
+            if self._next_nonce is None:
+                self._next_nonce = self.w3.eth.get_transaction_count(self.account.address, "pending")
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    def resync(self):
+        """Lupakan nonce lokal; nonce berikutnya diambil ulang dari node."""
+        with self._nonce_lock:
+            self._next_nonce = None
+
+    # -------------------- Submit --------------------
+    def _estimate_gas(self, contract_fn, fallback: int) -> int:
+        # Estimasi di state "pending": sign bisa dikirim sebelum tx review-nya mined
+        try:
+            estimate = contract_fn.estimate_gas({"from": self.account.address}, block_identifier="pending")
+            return int(estimate * self.gas_multiplier)
+        except ContractLogicError as e:
+            # Tetap dikirim dengan limit cadangan; revert dilaporkan lewat receipt seperti biasa
+            logger.warning("Gas estimation reverted, using fallback limit %d: %s", fallback, e)
+        except Exception as e:
+            logger.warning("Gas estimation failed, using fallback limit %d: %s", fallback, e)
+        return fallback
+
+    def _send(self, txn: dict) -> str:
+        signed = self.account.sign_transaction(txn)
+        return self.w3.to_hex(self.w3.eth.send_raw_transaction(signed.raw_transaction))
+
+    def submit(self, contract_fn, gas: int) -> PendingTransaction:
+        """
+        Build, sign dan kirim contract_fn; return tanpa menunggu receipt.
+        gas = limit cadangan kalau estimate_gas gagal (bukan karena revert).
+        """
+        start = time.perf_counter()
+        gas_limit = self._estimate_gas(contract_fn, gas)
+        fees = self.fees.fees()
+        nonce = self._allocate_nonce()
+        try:
+            txn = contract_fn.build_transaction({
+                "from": self.account.address,
+                "nonce": nonce,
+                "gas": gas_limit,
+                **fees,
+            })
+            tx_hash = self._send(txn)
+        except Exception:
+            # Nonce ini tidak terpakai; tanpa resync tx berikutnya nyangkut di belakang gap
+            self.resync()
+            raise
+        metrics.observe("chain", time.perf_counter() - start, "submit")
+
+        pending = PendingTransaction(tx_hash, nonce, txn)
+        with self._pending_lock:
+            self._pending[pending.tx_hash] = pending
+        self._ensure_tracker()
+        return pending
+
+    def submit_many(self, contract_fns: list, gas: int) -> List[Union[PendingTransaction, Exception]]:
+        """
+        Kirim banyak tx dengan nonce berurutan tanpa menunggu receipt (untuk aksi
+        admin massal). Gas diestimasi sekali per fungsi kontrak dan fee diambil
+        sekali untuk seluruh batch. Nonce lock dipegang selama pengiriman supaya
+        submit() lain tidak menyelip di tengah. Hasil per tx: PendingTransaction
+        atau exception kalau pengiriman tx itu gagal (tx lain tetap dikirim).
+        """
+        estimates: Dict[str, int] = {}
+        limits = []
+        for contract_fn in contract_fns:
+            name = getattr(contract_fn, "fn_name", None)
+            if name is None:
+                limits.append(self._estimate_gas(contract_fn, gas))
+                continue
+            if name not in estimates:
+                estimates[name] = self._estimate_gas(contract_fn, gas)
+            limits.append(estimates[name])
+        fees = self.fees.fees()
+
+        results: List[Union[PendingTransaction, Exception]] = []
+        with self._nonce_lock:
+            for contract_fn, gas_limit in zip(contract_fns, limits):
+                start = time.perf_counter()
+                try:
+                    if self._next_nonce is None:
+                        self._next_nonce = self.w3.eth.get_transaction_count(self.account.address, "pending")
+                    nonce = self._next_nonce
+                    txn = contract_fn.build_transaction({
+                        "from": self.account.address,
+                        "nonce": nonce,
+                        "gas": gas_limit,
+                        **fees,
+                    })
+                    tx_hash = self._send(txn)
+                except Exception as e:
+                    # Nonce diambil ulang dari node untuk tx berikutnya, jadi tidak ada gap
+                    self._next_nonce = None
+                    results.append(e)
+                    continue
+                self._next_nonce = nonce + 1
+                metrics.observe("chain", time.perf_counter() - start, "submit")
+                results.append(PendingTransaction(tx_hash, nonce, txn))
+
+        sent = [r for r in results if isinstance(r, PendingTransaction)]
+        with self._pending_lock:
+            for pending in sent:
+                self._pending[pending.tx_hash] = pending
+        if sent:
+            self._ensure_tracker()
+        return results
+
+    def pending_count(self) -> int:
+        with self._pending_lock:
+            return len(self._pending)
+
+    # -------------------- Receipt tracker --------------------
+    def _ensure_tracker(self):
+        if self._tracker is None or not self._tracker.is_alive():
+            self._stopped = False
+            # stop() men-set wakeup; tanpa clear, tracker baru tidak pernah menunggu
+            self._wakeup.clear()
+            self._tracker = threading.Thread(target=self._track_receipts, name="tx-receipt-tracker", daemon=True)
+            self._tracker.start()
+
+    def _track_receipts(self):
+        last_block = None
+        while not self._stopped:
+            self._wakeup.wait(self.poll_interval)
+            if self._stopped:
+                break
+            with self._pending_lock:
+                pending = list(self._pending.values())
+            if not pending:
+                continue
+
+            # Receipt hanya bisa berubah kalau ada block baru
+            try:
+                block = self.w3.eth.block_number
+            except Exception as e:
+                logger.warning("Block number poll failed: %s", e)
+                continue
+            if block == last_block and not self._has_overdue(pending):
+                continue
+            last_block = block
+
+            still_pending = [tx for tx in pending if not self._check(tx)]
+            self._replace_stuck(still_pending)
+
+    def _is_stuck(self, tx: PendingTransaction, now: float) -> bool:
+        return (tx.txn is not None and tx.replacements < self.max_replacements
+                and now - tx.last_sent_at > self.stuck_after)
+
+    def _has_overdue(self, pending) -> bool:
+        now = time.monotonic()
+        return any(now - tx.sent_at > self.receipt_timeout or self._is_stuck(tx, now) for tx in pending)
+
+    def _get_receipt(self, tx: PendingTransaction):
+        # Kiriman lama bisa saja yang mined walaupun replacement sudah dikirim
+        for tx_hash in reversed(tx.hashes):
+            try:
+                return self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    def _check(self, tx: PendingTransaction) -> bool:
+        """Cek receipt tx; True kalau tx sudah selesai (mined, revert atau timeout)."""
+        try:
+            receipt = self._get_receipt(tx)
+        except Exception as e:
+            # RPC error sementara: coba lagi di putaran berikutnya
+            logger.warning("Receipt poll failed for %s: %s", tx.tx_hash, e)
+            return False
+
+        if receipt is None:
+            if time.monotonic() - tx.sent_at > self.receipt_timeout:
+                self._finish(tx, exception=TimeoutError(f"Transaction {tx.tx_hash} not mined in {self.receipt_timeout:.0f}s"))
+                # Tx mungkin di-drop node; ambil ulang nonce dari node
+                self.resync()
+                return True
+            return False
+
+        tx.tx_hash = self.w3.to_hex(receipt["transactionHash"])
+        if receipt.get("status", 1) == 0:
+            self._finish(tx, exception=TransactionFailed(tx.tx_hash, receipt))
+        else:
+            self._finish(tx, receipt=receipt)
+        return True
+
+    # -------------------- Replacement --------------------
+    def _replace_stuck(self, pending: List[PendingTransaction]):
+        now = time.monotonic()
+        stuck = sorted((tx for tx in pending if self._is_stuck(tx, now)), key=lambda tx: tx.nonce)
+        if not stuck:
+            return
+        lowest_nonce = min(tx.nonce for tx in pending)
+        for tx in stuck:
+            try:
+                # Nonce di atas yang nyangkut menunggu giliran; bump hanya kalau fee-nya sendiri kalah pasar
+                if tx.nonce != lowest_nonce and not self.fees.below_market(self._fee_fields(tx.txn)):
+                    # Dicek lagi setelah stuck_after berikutnya; kalau tidak, _has_overdue
+                    # selalu True dan semua receipt di-poll ulang tiap poll_interval
+                    tx.last_sent_at = now
+                    continue
+                self.replace(tx)
+            except Exception as e:
+                logger.warning("Replacing %s (nonce %d) failed: %s", tx.tx_hash, tx.nonce, e)
+                # Coba lagi setelah stuck_after berikutnya, bukan tiap putaran polling
+                tx.last_sent_at = time.monotonic()
+
+    @staticmethod
+    def _fee_fields(txn: dict) -> dict:
+        return {k: txn[k] for k in ("maxFeePerGas", "maxPriorityFeePerGas", "gasPrice") if k in txn}
+
+    def replace(self, tx: PendingTransaction) -> Optional[str]:
+        """
+        Kirim ulang tx (nonce sama) dengan fee di-bump. Return hash baru, atau
+        None kalau fee sudah mentok TX_MAX_FEE_GWEI / tx keburu mined.
+        """
+        fees = self.fees.bump(self._fee_fields(tx.txn))
+        if fees is None:
+            logger.warning("Transaction %s (nonce %d) stuck at max fee", tx.tx_hash, tx.nonce)
+            tx.replacements = self.max_replacements
+            return None
+        txn = {**tx.txn, **fees}
+        try:
+            tx_hash = self._send(txn)
+        except Exception as e:
+            # web3 v6 raise ValueError, v7 Web3RPCError; isi pesan dari node sama
+            message = str(e).lower()
+            if "nonce too low" in message or "already known" in message:
+                # Salah satu kiriman sebelumnya sudah mined / sudah ada di mempool
+                tx.last_sent_at = time.monotonic()
+                return None
+            raise
+
+        tx.txn = txn
+        tx.hashes.append(tx_hash)
+        tx.tx_hash = tx_hash
+        tx.replacements += 1
+        tx.last_sent_at = time.monotonic()
+        metrics.observe("chain", time.monotonic() - tx.sent_at, "replace")
+        logger.info("Replaced stuck tx nonce %d (attempt %d): %s -> %s",
+                    tx.nonce, tx.replacements, tx.hashes[-2], tx_hash)
+        return tx_hash
+
+    def _finish(self, tx: PendingTransaction, receipt=None, exception: Optional[BaseException] = None):
+        with self._pending_lock:
+            for tx_hash in tx.hashes:
+                self._pending.pop(tx_hash, None)
+        if tx.future.done():
+            return
+        metrics.observe("chain", time.monotonic() - tx.sent_at, "failed" if exception is not None else "confirm")
+        if exception is not None:
+            tx.future.set_exception(exception)
+        else:
+            tx.future.set_result(receipt)
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
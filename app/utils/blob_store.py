@@ -0,0 +1,193 @@
+"""
+Blob store content-addressed untuk teks OCR.
+
+Teks OCR berisi PII (NIK, nama, alamat), jadi teks dikompres gzip lalu
+dienkripsi AES-256-GCM dengan BLOB_STORE_KEY (hex 32 byte). Key blob adalah
+HMAC-SHA256 teks dengan key yang sama (bukan sha256 polos, supaya isi teks
+tidak bisa ditebak dari nama blob) dan ikut diautentikasi sebagai associated
+data. Dokumen yang sama (upload ulang, reprocessing) tidak menambah blob baru.
+Tanpa BLOB_STORE_KEY put_text menolak menulis; tidak ada fallback plaintext.
+Log di Firestore hanya menyimpan referensi ("hmac-sha256:<hex>"), ukuran dan preview.
+
+Backend:
+- local (default): file di BLOB_STORE_DIR, pengganti GCS untuk dev / single node
+- gcs: bucket BLOB_GCS_BUCKET (butuh paket google-cloud-storage)
+
+Fungsi di sini blocking (disk / HTTP); dari kode async panggil lewat asyncio.to_thread.
+"""
+import gzip
+import hashlib
+import hmac
+import logging
+import os
+import uuid
+from typing import NamedTuple, Optional
+
+from cryptography.exceptions import InvalidTag
+
+from app.utils.crypto_utils import decrypt_bytes, encrypt_bytes
+
+logger = logging.getLogger(__name__)
+
+# -------------------- Konfigurasi --------------------
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "data/blobs")
+BLOB_GCS_BUCKET = os.getenv("BLOB_GCS_BUCKET")
+BLOB_GCS_PREFIX = os.getenv("BLOB_GCS_PREFIX", "kyc-blobs")
+BLOB_STORE_KEY = os.getenv("BLOB_STORE_KEY")
+BLOB_COMPRESS_LEVEL = int(os.getenv("BLOB_COMPRESS_LEVEL", "6"))
+# Karakter awal teks yang ikut disimpan di dokumen log (untuk listing)
+OCR_TEXT_PREVIEW_CHARS = int(os.getenv("OCR_TEXT_PREVIEW_CHARS", "500"))
+
+_REF_PREFIX = "hmac-sha256:"
+_cipher_key: Optional[bytes] = None
+
+
+class StoredText(NamedTuple):
+    ref: str            # "hmac-sha256:<hex>"
+    size: int           # jumlah karakter teks asli
+    stored_bytes: int   # ukuran blob terkompresi + terenkripsi
+    preview: str
+
+
+class BlobNotFound(Exception):
+    """Referensi blob tidak ada di backend."""
+
+
+# ---------------- Backend ----------------
+class LocalBlobBackend:
+    """Blob sebagai file di disk: <root>/<ab>/<cd>/<hex>.enc, ditulis atomik."""
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.enc")
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def write(self, digest: str, data: bytes):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def read(self, digest: str) -> bytes:
+        try:
+            with open(self._path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise BlobNotFound(f"{_REF_PREFIX}{digest}")
+
+
+class GCSBlobBackend:
+    """Blob sebagai object <prefix>/<hex>.enc di bucket GCS."""
+
+    def __init__(self, bucket: str, prefix: str = BLOB_GCS_PREFIX):
+        from google.cloud import storage  # opsional, hanya untuk backend gcs
+
+        self.bucket = storage.Client().bucket(bucket)
+        self.prefix = prefix
+
+    def _blob(self, digest: str):
+        return self.bucket.blob(f"{self.prefix}/{digest}.enc")
+
+    def exists(self, digest: str) -> bool:
+        return self._blob(digest).exists()
+
+    def write(self, digest: str, data: bytes):
+        self._blob(digest).upload_from_string(data, content_type="application/octet-stream")
+
+    def read(self, digest: str) -> bytes:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self._blob(digest).download_as_bytes()
+        except NotFound:
+            raise BlobNotFound(f"{_REF_PREFIX}{digest}")
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if BLOB_STORE_BACKEND == "gcs":
+            if not BLOB_GCS_BUCKET:
+                raise RuntimeError("BLOB_GCS_BUCKET is required for BLOB_STORE_BACKEND=gcs")
+            _backend = GCSBlobBackend(BLOB_GCS_BUCKET)
+        else:
+            _backend = LocalBlobBackend()
+    return _backend
+
+
+def _key() -> bytes:
+    """Key AES / HMAC dari BLOB_STORE_KEY; raise kalau tidak diset atau tidak valid."""
+    global _cipher_key
+    if _cipher_key is None:
+        if not BLOB_STORE_KEY:
+            raise RuntimeError("BLOB_STORE_KEY is required to store OCR text")
+        try:
+            key = bytes.fromhex(BLOB_STORE_KEY)
+        except ValueError as e:
+            raise RuntimeError(f"Invalid BLOB_STORE_KEY: {e}")
+        if len(key) != 32:
+            raise RuntimeError("Invalid BLOB_STORE_KEY: expected 32 bytes")
+        _cipher_key = key
+    return _cipher_key
+
+
+def _digest(key: bytes, raw: bytes) -> str:
+    return hmac.new(key, raw, hashlib.sha256).hexdigest()
+
+
+# ---------------- Teks ----------------
+def put_text(text: str) -> StoredText:
+    """Simpan teks terenkripsi (kalau belum ada) dan return referensinya."""
+    key = _key()
+    raw = text.encode("utf-8")
+    digest = _digest(key, raw)
+    data = encrypt_bytes(
+        key,
+        gzip.compress(raw, compresslevel=BLOB_COMPRESS_LEVEL, mtime=0),
+        digest.encode()
+    )
+    backend = get_backend()
+    if not backend.exists(digest):
+        backend.write(digest, data)
+    return StoredText(f"{_REF_PREFIX}{digest}", len(text), len(data), text[:OCR_TEXT_PREVIEW_CHARS])
+
+
+def get_text(ref: str) -> str:
+    """Ambil teks dari referensi put_text; isi diverifikasi terhadap HMAC-nya."""
+    if not ref.startswith(_REF_PREFIX):
+        raise ValueError(f"Unsupported blob ref: {ref}")
+    key = _key()
+    digest = ref[len(_REF_PREFIX):]
+    try:
+        compressed = decrypt_bytes(key, get_backend().read(digest), digest.encode())
+    except InvalidTag:
+        # Rusak, atau ditulis dengan BLOB_STORE_KEY lain
+        raise ValueError(f"Blob {ref} is corrupted or encrypted with another key")
+    raw = gzip.decompress(compressed)
+    if not hmac.compare_digest(_digest(key, raw), digest):
+        raise ValueError(f"Blob {ref} is corrupted")
+    return raw.decode("utf-8")
+
+
+def get_text_or_none(ref: Optional[str]) -> Optional[str]:
+    if not ref:
+        return None
+    try:
+        return get_text(ref)
+    except BlobNotFound:
+        logger.warning("OCR text blob %s not found", ref)
+        return None
+    except (ValueError, OSError, EOFError, RuntimeError) as e:
+        # Blob rusak / terpotong / ref tidak dikenal / key tidak ada: satu log saja yang kosong
+        logger.warning("OCR text blob %s unreadable: %s", ref, e)
+        return None
@@ -0,0 +1,211 @@
+"""
+Ekstraksi bundle ZIP (mis. KTP + NPWP + rekening dalam satu upload).
+
+Daftar member dibaca dari central directory dan divalidasi dulu: jumlah entry
+dan member, total ukuran hasil dekompresi, ukuran per member dan rasio kompresi
+(zip bomb). Member yang lolos dikirim ke extractor format masing-masing
+(PDF/gambar lewat OCR, office/CSV lewat app.utils.text_extractors), paralel
+di process pool ekstraksi. Tiap worker membuka ZIP sendiri dan hanya
+mendekompresi satu member ke file sementara dengan nama aman (nama di
+dalam ZIP tidak pernah dipakai sebagai path). ZIP di dalam ZIP tidak dibuka.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import List, NamedTuple, Optional, Tuple
+from zipfile import BadZipFile, ZipFile
+
+from app.utils import file_utils, metrics, ocr_cache, text_extractors
+from app.utils.extraction_pool import EXTRACTION_WORKERS, ExtractionTimeout, run_extraction
+
+logger = logging.getLogger(__name__)
+
+# -------------------- Konfigurasi --------------------
+ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", "50"))
+# Semua entry di central directory (termasuk folder / file yang dilewati)
+ZIP_MAX_ENTRIES = int(os.getenv("ZIP_MAX_ENTRIES", "500"))
+# Member yang dilewati yang dicantumkan satu per satu di teks hasil
+ZIP_MAX_SKIPPED_LISTED = int(os.getenv("ZIP_MAX_SKIPPED_LISTED", "50"))
+ZIP_MAX_TOTAL_BYTES = int(os.getenv("ZIP_MAX_TOTAL_BYTES", str(200 * 1024 * 1024)))
+ZIP_MAX_MEMBER_BYTES = int(os.getenv("ZIP_MAX_MEMBER_BYTES", str(50 * 1024 * 1024)))
+# Ukuran asli / ukuran terkompresi; dokumen KYC (scan, PDF) jarang di atas 10x
+ZIP_MAX_RATIO = float(os.getenv("ZIP_MAX_RATIO", "100"))
+# Member yang diekstraksi bersamaan per bundle (sisa slot pool untuk upload lain)
+ZIP_PARALLEL = int(os.getenv("ZIP_PARALLEL", str(max(1, min(EXTRACTION_WORKERS, 4)))))
+
+_COPY_CHUNK = 1024 * 1024
+_MEMBER_FORMATS = {".pdf", ".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".webp",
+                   ".docx", ".xlsx", ".xls", ".csv", ".json", ".txt"}
+
+
+class ZipMember(NamedTuple):
+    index: int           # posisi di infolist(); nama bisa dobel
+    name: str
+    ext: str
+    size: int            # ukuran setelah dekompresi (menurut header)
+    compressed_size: int
+
+
+class BundleRejected(ValueError):
+    """ZIP ditolak utuh sebelum ada member yang diekstraksi."""
+
+
+class MemberResult(NamedTuple):
+    name: str
+    status: str          # ok / skipped / error / rejected (seluruh bundle)
+    text: str = ""
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+# ---------------- Validasi ----------------
+def plan_members(zip_path: str) -> Tuple[List[ZipMember], List[MemberResult]]:
+    """Pisahkan member yang akan diekstraksi dari yang dilewati (beserta alasannya)."""
+    members: List[ZipMember] = []
+    skipped: List[MemberResult] = []
+    total = 0
+    with ZipFile(zip_path) as archive:
+        infos = archive.infolist()
+    # Central directory raksasa (mis. jutaan entry kosong) lolos cek ukuran tapi
+    # tetap mahal untuk di-loop dan dicantumkan; tolak sebelum diproses
+    if len(infos) > ZIP_MAX_ENTRIES:
+        raise BundleRejected(f"bundle has {len(infos)} entries (max {ZIP_MAX_ENTRIES})")
+
+    hidden = 0
+    for index, info in enumerate(infos):
+        name = info.filename
+        base = os.path.basename(name.rstrip("/"))
+        ext = os.path.splitext(base)[1].lower()
+
+        if info.is_dir() or name.startswith("__MACOSX/") or base.startswith("."):
+            continue
+        reason = None
+        if info.flag_bits & 0x1:
+            reason = "encrypted"
+        elif ext == ".zip":
+            reason = "nested archive"
+        elif ext not in _MEMBER_FORMATS:
+            reason = "unsupported type"
+        elif info.file_size > ZIP_MAX_MEMBER_BYTES:
+            reason = f"larger than {ZIP_MAX_MEMBER_BYTES} bytes"
+        elif info.file_size > ZIP_MAX_RATIO * max(info.compress_size, 1):
+            reason = f"compression ratio above {ZIP_MAX_RATIO:.0f}"
+        elif len(members) >= ZIP_MAX_MEMBERS:
+            reason = f"bundle has more than {ZIP_MAX_MEMBERS} members"
+        elif total + info.file_size > ZIP_MAX_TOTAL_BYTES:
+            reason = f"bundle larger than {ZIP_MAX_TOTAL_BYTES} bytes"
+
+        if reason:
+            if len(skipped) < ZIP_MAX_SKIPPED_LISTED:
+                skipped.append(MemberResult(name=name, status="skipped", error=reason))
+            else:
+                hidden += 1
+            continue
+        total += info.file_size
+        members.append(ZipMember(index, name, ext, info.file_size, info.compress_size))
+    if hidden:
+        skipped.append(MemberResult(name=f"... {hidden} more", status="skipped", error="not listed"))
+    return members, skipped
+
+
+def _plan(zip_path: str) -> Tuple[List[ZipMember], List[MemberResult]]:
+    """
+    plan_members, tapi ZIP rusak / ditolak menjadi satu baris "rejected" di teks
+    hasil (seperti member yang dilewati), bukan exception: gagalnya deterministik,
+    jadi tidak ada gunanya di-retry job queue.
+    """
+    try:
+        return plan_members(zip_path)
+    except (BadZipFile, BundleRejected) as e:
+        logger.warning("ZIP bundle %s rejected: %s", zip_path, e)
+        return [], [MemberResult(name="(bundle)", status="rejected", error=str(e))]
+
+
+# ---------------- Per member (di worker) ----------------
+def _unpack(zip_path: str, member: ZipMember, dest: str):
+    # Dibatasi ukuran header; header yang bohong (data lebih besar) dihentikan di sini
+    limit = min(member.size, ZIP_MAX_MEMBER_BYTES)
+    written = 0
+    with ZipFile(zip_path) as archive, archive.open(archive.infolist()[member.index]) as src, open(dest, "wb") as out:
+        while True:
+            chunk = src.read(_COPY_CHUNK)
+            if not chunk:
+                return
+            written += len(chunk)
+            if written > limit:
+                raise ValueError(f"member decompresses beyond {limit} bytes")
+            out.write(chunk)
+
+
+def extract_member(zip_path: str, member: ZipMember) -> MemberResult:
+    start = time.perf_counter()
+    workdir = tempfile.mkdtemp(prefix="kyc-zip-")
+    try:
+        path = os.path.join(workdir, f"member{member.ext}")
+        _unpack(zip_path, member, path)
+        text = file_utils.extract_text_sync(path)
+        return MemberResult(member.name, "ok", text, time.perf_counter() - start)
+    except Exception as e:
+        logger.warning("Failed to extract %s from zip: %s", member.name, e)
+        return MemberResult(member.name, "error", "", time.perf_counter() - start, f"{type(e).__name__}: {e}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _extract_member_counted(zip_path: str, member: ZipMember) -> tuple:
+    """Versi worker pool: ikut kirim balik counter OCR cache dan sampel metric."""
+    ocr_cache.take_counters()
+    with metrics.collect_samples() as samples:
+        result = extract_member(zip_path, member)
+    return result, ocr_cache.take_counters(), samples
+
+
+# ---------------- Bundle ----------------
+def render(results: List[MemberResult]) -> str:
+    """Teks gabungan untuk ocrText: daftar member lalu isi per member."""
+    parts = ["--- ZIP Contents ---\n"]
+    parts.extend(f"{r.name}{'' if r.status == 'ok' else f' ({r.status}: {r.error})'}\n" for r in results)
+    for r in results:
+        if r.status == "ok":
+            parts.append(f"\n--- File: {r.name} ---\n{r.text}\n")
+    return text_extractors.cap_text("".join(parts), "zip")
+
+
+def _log_timings(results: List[MemberResult]):
+    for r in results:
+        logger.debug("ZIP member %s: %s in %.2fs (%d chars)", r.name, r.status, r.seconds, len(r.text))
+
+
+def extract_bundle_sync(zip_path: str) -> List[MemberResult]:
+    """Member diproses berurutan di proses ini (dipakai dari worker, mis. extract_text_sync)."""
+    members, skipped = _plan(zip_path)
+    results = [extract_member(zip_path, member) for member in members] + skipped
+    _log_timings(results)
+    return results
+
+
+async def extract_bundle(zip_path: str) -> List[MemberResult]:
+    """
+    Member diproses paralel di process pool ekstraksi (maks. ZIP_PARALLEL per
+    bundle). Urutan hasil = urutan di ZIP, member yang dilewati di akhir.
+    """
+    members, skipped = await asyncio.to_thread(_plan, zip_path)
+    slots = asyncio.Semaphore(ZIP_PARALLEL)
+
+    async def run(member: ZipMember) -> MemberResult:
+        async with slots:
+            try:
+                result, cache_counters, samples = await run_extraction(_extract_member_counted, zip_path, member)
+            except ExtractionTimeout as e:
+                # Satu member lambat tidak menggagalkan bundle; ExtractionQueueFull tetap naik
+                return MemberResult(member.name, "error", error=str(e))
+        ocr_cache.merge_counters(cache_counters)
+        metrics.merge_samples(samples)
+        return result
+
+    results = list(await asyncio.gather(*(run(member) for member in members))) + skipped
+    _log_timings(results)
+    return results
@@ -1,21 +1,43 @@
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 import os
 
-def encrypt_file(file_path: str) -> tuple[str, bytes]:
+
+def new_encryptor():
+    """
+    Buat AES-256-CFB encryptor baru.
+    Return (key, iv, encryptor); IV ditulis di awal file terenkripsi.
+    """
     key = os.urandom(32)  # 256-bit key
     iv = os.urandom(16)
 
-    encrypted_path = f"{file_path}.enc"
-    backend = default_backend()
+    cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=default_backend())
+    return key, iv, cipher.encryptor()
 
-    cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=backend)
-    encryptor = cipher.encryptor()
+
+def encrypt_file(file_path: str) -> tuple[str, bytes]:
+    key, iv, encryptor = new_encryptor()
+    encrypted_path = f"{file_path}.enc"
 
     with open(file_path, "rb") as infile, open(encrypted_path, "wb") as outfile:
         outfile.write(iv)  # simpan IV di awal file
-        while chunk := infile.read(1024):
+        while chunk := infile.read(1024 * 1024):
             outfile.write(encryptor.update(chunk))
         outfile.write(encryptor.finalize())
 
     return encrypted_path, key
+
+
+def encrypt_bytes(key: bytes, data: bytes, associated_data: bytes = b"") -> bytes:
+    """
+    AES-256-GCM untuk data kecil yang disimpan di disk (mis. cache OCR).
+    Return nonce (12 byte) + ciphertext + tag; associated_data ikut diautentikasi.
+    """
+    nonce = os.urandom(12)
+    return nonce + AESGCM(key).encrypt(nonce, data, associated_data)
+
+
+def decrypt_bytes(key: bytes, blob: bytes, associated_data: bytes = b"") -> bytes:
+    """Kebalikan encrypt_bytes; raise cryptography.exceptions.InvalidTag kalau isi / key tidak cocok."""
+    return AESGCM(key).decrypt(blob[:12], blob[12:], associated_data)
@@ -0,0 +1,89 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.utils.logging_config import configure_logging
+
+# -------------------- Konfigurasi --------------------
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+# Jumlah job yang boleh antre di luar job yang sedang berjalan
+EXTRACTION_QUEUE_SIZE = int(os.getenv("EXTRACTION_QUEUE_SIZE", "32"))
+# Batas waktu satu job ekstraksi (detik)
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "120"))
+# Berapa lama request menunggu slot antrean sebelum ditolak (detik)
+EXTRACTION_QUEUE_WAIT = float(os.getenv("EXTRACTION_QUEUE_WAIT", "5"))
+# Worker di-recycle setelah N job supaya memory leak dari poppler/PIL tidak menumpuk
+EXTRACTION_MAX_TASKS_PER_CHILD = int(os.getenv("EXTRACTION_MAX_TASKS_PER_CHILD", "50"))
+# "spawn" aman dipakai bersama gRPC (Firestore); fork dari proses yang punya thread bisa hang
+EXTRACTION_START_METHOD = os.getenv("EXTRACTION_START_METHOD", "spawn")
+
+
+class ExtractionQueueFull(Exception):
+    """Antrean ekstraksi penuh, request sebaiknya dicoba lagi nanti."""
+
+
+class ExtractionTimeout(Exception):
+    """Job ekstraksi melewati EXTRACTION_TIMEOUT."""
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context(EXTRACTION_START_METHOD),
+            max_tasks_per_child=EXTRACTION_MAX_TASKS_PER_CHILD or None,
+            initializer=configure_logging,  # worker spawn tidak mewarisi handler logging
+        )
+    return _executor
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(EXTRACTION_WORKERS + EXTRACTION_QUEUE_SIZE)
+    return _slots
+
+
+async def run_extraction(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Jalankan fn(*args) di process pool ekstraksi tanpa memblokir event loop.
+
+    - Jumlah job in-flight dibatasi EXTRACTION_WORKERS + EXTRACTION_QUEUE_SIZE.
+      Kalau slot tidak didapat dalam EXTRACTION_QUEUE_WAIT detik → ExtractionQueueFull.
+    - Job yang lebih lama dari EXTRACTION_TIMEOUT → ExtractionTimeout.
+      Slot baru dilepas saat proses worker benar-benar selesai, jadi job yang
+      timeout tetap dihitung sampai berhenti dan antrean tidak overcommit.
+    """
+    slots = _get_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=EXTRACTION_QUEUE_WAIT)
+    except asyncio.TimeoutError:
+        raise ExtractionQueueFull("Extraction queue is full")
+
+    loop = asyncio.get_running_loop()
+    try:
+        cf_future = _get_executor().submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    cf_future.add_done_callback(lambda _: loop.call_soon_threadsafe(slots.release))
+
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(cf_future), timeout=EXTRACTION_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ExtractionTimeout(f"Extraction exceeded {EXTRACTION_TIMEOUT:.0f}s")
+
+
+def shutdown_extraction_pool():
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _slots = None
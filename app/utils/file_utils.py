@@ -1,140 +1,247 @@
 import os
-import json
+import logging
 import pytesseract
 from PyPDF2 import PdfReader
 from pdf2image import convert_from_path
 from PIL import Image, ImageOps
-from docx import Document
-import csv
-from io import StringIO
-from zipfile import ZipFile
-from openpyxl import load_workbook
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils import bundle_extractor, image_preprocess, metrics, ocr_cache, text_extractors
+from app.utils.extraction_pool import run_extraction
+
+logger = logging.getLogger(__name__)
+
+# Batas waktu satu panggilan tesseract (detik); prosesnya di-kill kalau lewat
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "60"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+# Argumen tambahan tesseract, mis. "--psm 6"
+OCR_TESSERACT_CONFIG = os.getenv("OCR_TESSERACT_CONFIG", "")
+# Preprocessing halaman PDF hasil render (gambar/foto memakai app.utils.image_preprocess)
+PDF_OCR_PREPROCESS = "grayscale+invert"
+
+# --------------- PDF OCR settings ---------------
+# auto   = native text, OCR hanya untuk halaman yang teksnya kosong/terlalu pendek
+# always = OCR semua halaman (PDF hasil scan yang punya text layer jelek)
+# never  = native text saja
+PDF_OCR_MODE = os.getenv("PDF_OCR_MODE", "auto")
+PDF_OCR_DPI = int(os.getenv("PDF_OCR_DPI", "200"))
+# Jumlah halaman yang di-render / di-OCR bersamaan dalam satu job ekstraksi
+PDF_OCR_THREADS = int(os.getenv("PDF_OCR_THREADS", "2"))
+PDF_MIN_TEXT_CHARS = 20
+
+# Tesseract default memakai semua core per proses; karena halaman sudah
+# di-OCR paralel, batasi satu thread per proses supaya tidak oversubscribe.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
 
 async def extract_text(file_path: str) -> str:
+    """
+    Extract text in the extraction process pool so OCR never blocks the event loop.
+    Raises ExtractionQueueFull / ExtractionTimeout from app.utils.extraction_pool.
+    ZIP bundles are split here so their members run on the pool in parallel.
+    """
+    if os.path.splitext(file_path)[1].lower() == ".zip":
+        start = time.perf_counter()
+        text = bundle_extractor.render(await bundle_extractor.extract_bundle(file_path))
+        metrics.observe("extract", time.perf_counter() - start, "zip")
+        return text
+
+    text, cache_counters, samples = await run_extraction(_extract_text_counted, file_path)
+    ocr_cache.merge_counters(cache_counters)
+    metrics.merge_samples(samples)
+    return text
+
+
+def _extract_text_counted(file_path: str) -> tuple[str, dict, list]:
+    """
+    Runs in a pool worker; returns the OCR cache counters and metric samples
+    so the main process can aggregate them.
+    """
+    ocr_cache.take_counters()
+    with metrics.collect_samples() as samples:
+        text = extract_text_sync(file_path)
+    return text, ocr_cache.take_counters(), samples
+
+
+# --------------- OCR + cache ---------------
+_tesseract_version = None
+
+
+def _ocr_settings(preprocess: str) -> dict:
+    global _tesseract_version
+    if _tesseract_version is None:
+        try:
+            _tesseract_version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            _tesseract_version = "unknown"
+    return {
+        "engine": f"tesseract-{_tesseract_version}",
+        "lang": OCR_LANG,
+        "config": OCR_TESSERACT_CONFIG,
+        "preprocess": preprocess,
+    }
+
+
+def _tesseract(img: Image.Image, source: str) -> str:
+    with metrics.timed("ocr_page", source):
+        return pytesseract.image_to_string(img, lang=OCR_LANG, config=OCR_TESSERACT_CONFIG, timeout=OCR_TIMEOUT)
+
+
+def _ocr_image_file(file_path: str) -> str:
+    steps = image_preprocess.parse_steps()
+    key = ocr_cache.make_key(ocr_cache.file_digest(file_path), **_ocr_settings(image_preprocess.describe(steps)))
+    text = ocr_cache.get(key)
+    if text is None:
+        img, timings = image_preprocess.preprocess_image(file_path, steps)
+        start = time.perf_counter()
+        text = _tesseract(img, "image")
+        timings["ocr"] = time.perf_counter() - start
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Image OCR %dx%d, timings(ms): %s", img.width, img.height,
+                         ", ".join(f"{k}={v * 1000:.0f}" for k, v in timings.items()))
+        ocr_cache.put(key, text)
+    return text
+
+
+def _page_runs(pages: list[int]) -> list[tuple[int, int]]:
+    """Group sorted page indexes into contiguous (first, last) runs."""
+    runs = []
+    for i in pages:
+        if runs and runs[-1][1] == i - 1:
+            runs[-1] = (runs[-1][0], i)
+        else:
+            runs.append((i, i))
+    return runs
+
+
+def _ocr_rendered_page(image_path: str) -> str:
+    with Image.open(image_path) as img:
+        img = ImageOps.invert(img.convert("L"))
+        return _tesseract(img, "pdf")
+
+
+def _page_cache_key(file_hash: str, page: int) -> str:
+    # Render halaman deterministik terhadap (bytes PDF, index halaman, dpi),
+    # jadi key ini setara dengan hash piksel halaman tanpa perlu me-render dulu.
+    return ocr_cache.make_key(file_hash, page=page, dpi=PDF_OCR_DPI, **_ocr_settings(PDF_OCR_PREPROCESS))
+
+
+def _rendered_page_number(path: str) -> int:
+    # pdf2image: <output_file>-<nomor halaman 1-based>.<ext>, mis. run00003-07.ppm
+    return int(os.path.splitext(os.path.basename(path))[0].rsplit("-", 1)[1])
+
+
+def _ocr_pdf_pages(file_path: str, pages: list[int]) -> dict[int, str]:
+    """
+    Render all pages that need OCR with one pdftoppm call per contiguous run
+    (instead of one call per page), then OCR them concurrently.
+    Pages already in the OCR cache are neither rendered nor OCR'd.
+    Returns {page_index: ocr_text}.
+    """
+    file_hash = ocr_cache.file_digest(file_path)
+    results: dict[int, str] = {}
+    for page in pages:
+        cached = ocr_cache.get(_page_cache_key(file_hash, page))
+        if cached is not None:
+            results[page] = cached
+    pages = [page for page in pages if page not in results]
+    if not pages:
+        return results
+
+    with tempfile.TemporaryDirectory(prefix="pdf_ocr_") as tmp:
+        rendered: list[tuple[int, str]] = []
+        for first, last in _page_runs(pages):
+            paths = convert_from_path(
+                file_path,
+                dpi=PDF_OCR_DPI,
+                first_page=first + 1,
+                last_page=last + 1,
+                output_folder=tmp,
+                output_file=f"run{first:05d}",
+                paths_only=True,
+                grayscale=True,
+                thread_count=PDF_OCR_THREADS,
+            )
+            # Nomor halaman diambil dari nama file (padding-nya tidak dijamin); halaman
+            # yang gagal di-render tidak boleh menggeser teks ke halaman lain
+            run = sorted((_rendered_page_number(path) - 1, path) for path in paths)
+            if [page for page, _ in run] != list(range(first, last + 1)):
+                raise RuntimeError(
+                    f"pdftoppm rendered {len(paths)} of {last - first + 1} pages ({first + 1}-{last + 1})"
+                )
+            rendered.extend(run)
+
+        # map() menjaga urutan halaman walau OCR selesai tidak berurutan
+        with ThreadPoolExecutor(max_workers=max(1, PDF_OCR_THREADS)) as pool:
+            texts = list(pool.map(_ocr_rendered_page, [path for _, path in rendered]))
+
+    for (page, _), ocr_text in zip(rendered, texts):
+        ocr_cache.put(_page_cache_key(file_hash, page), ocr_text)
+        results[page] = ocr_text
+    return results
+
+
+def _extract_pdf(file_path: str) -> str:
+    reader = PdfReader(file_path)
+    page_texts = []
+    ocr_pages = []
+    for i, page in enumerate(reader.pages):
+        page_text = "" if PDF_OCR_MODE == "always" else (page.extract_text() or "")
+        page_texts.append(page_text)
+
+        # OCR fallback jika kosong / terlalu pendek
+        if PDF_OCR_MODE != "never" and len(page_text.strip()) < PDF_MIN_TEXT_CHARS:
+            ocr_pages.append(i)
+
+    logger.debug("PDF pages: %d, pages needing OCR: %d", len(page_texts), len(ocr_pages))
+
+    if ocr_pages:
+        for page, ocr_text in _ocr_pdf_pages(file_path, ocr_pages).items():
+            page_texts[page] += ocr_text
+
+    return "".join(page_texts)
+
+
+# Label metric kyc_extract_seconds; ekstensi lain dibaca sebagai plain text
+_EXTRACT_FORMATS = {".pdf", ".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".webp",
+                    ".docx", ".xlsx", ".xls", ".csv", ".json", ".zip"}
+
+
+def _format_label(ext: str) -> str:
+    return ext.lstrip(".") if ext in _EXTRACT_FORMATS else "text"
+
+
+def extract_text_sync(file_path: str) -> str:
     """
     Extract text from various file types: PDF, images, DOCX, XLSX, CSV, JSON, TXT, ZIP.
     - PDF: try native text, fallback to OCR if needed
     - Image: OCR
-    - DOCX: python-docx
-    - XLSX: openpyxl
-    - CSV: csv.reader
-    - JSON: json.dumps pretty
-    - ZIP: list filenames + contents (if text-based)
-    - TXT: read as plain text
+    - DOCX / XLSX / XLS / CSV / JSON / TXT: streamed by app.utils.text_extractors
+    - ZIP: members checked and extracted by app.utils.bundle_extractor
+    Output is capped at EXTRACT_MAX_CHARS (and EXTRACT_MAX_ROWS for streamed formats).
     """
     ext = os.path.splitext(file_path)[1].lower()
-    text = ""
-    print(f"[DEBUG] Extracting text from: {file_path} (ext: {ext})")
+    start = time.perf_counter()
+    logger.debug("Extracting text from: %s (ext: %s)", file_path, ext)
 
     # --------------- PDF ---------------
     if ext == ".pdf":
-        reader = PdfReader(file_path)
-        for i, page in enumerate(reader.pages):
-            page_text = page.extract_text() or ""
-            print(f"[DEBUG] PDF page {i} text length: {len(page_text)}")
-
-            # OCR fallback jika kosong / terlalu pendek
-            if not page_text.strip() or len(page_text.strip()) < 20:
-                print(f"[DEBUG] Page {i} empty, applying OCR fallback")
-                images = convert_from_path(file_path, first_page=i+1, last_page=i+1)
-                for img in images:
-                    img = img.convert("L")
-                    img = ImageOps.invert(img)
-                    ocr_text = pytesseract.image_to_string(img)
-                    print(f"[DEBUG] OCR page {i} text length: {len(ocr_text)}")
-                    page_text += ocr_text
-
-            text += page_text
+        text = text_extractors.cap_text(_extract_pdf(file_path), "pdf")
 
     # --------------- Images ---------------
     elif ext in [".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".webp"]:
-        img = Image.open(file_path).convert("L")
-        img = ImageOps.invert(img)
-        text = pytesseract.image_to_string(img)
-        print(f"[DEBUG] Image OCR text length: {len(text)}")
+        text = text_extractors.cap_text(_ocr_image_file(file_path), ext.lstrip("."))
+        logger.debug("Image OCR text length: %d", len(text))
 
-    # --------------- DOCX ---------------
-    elif ext == ".docx":
-        try:
-            doc = Document(file_path)
-            paragraphs = [para.text for para in doc.paragraphs]
-            text = "\n".join(paragraphs)
-            print(f"[DEBUG] DOCX paragraphs extracted: {len(paragraphs)}")
-        except Exception as e:
-            print(f"[ERROR] Failed to parse DOCX: {e}")
-
-    # --------------- XLSX ---------------
-    elif ext in [".xlsx", ".xls"]:
-        try:
-            import openpyxl
-            from xlrd import open_workbook
-
-            if ext == ".xlsx":
-                wb = openpyxl.load_workbook(file_path, data_only=True)
-                for sheet in wb.sheetnames:
-                    ws = wb[sheet]
-                    for row in ws.iter_rows(values_only=True):
-                        text += " ".join([str(cell) for cell in row if cell is not None]) + "\n"
-
-            elif ext == ".xls":
-                book = open_workbook(file_path)
-                for sheet in book.sheets():
-                    for row_idx in range(sheet.nrows):
-                        row = sheet.row_values(row_idx)
-                        text += " ".join([str(cell) for cell in row if cell]) + "\n"
-
-            print(f"[DEBUG] Excel text length: {len(text)}")
-
-        except Exception as e:
-            print(f"[ERROR] Failed to parse Excel file: {e}")
-
-    # --------------- CSV ---------------
-    elif ext == ".csv":
-        try:
-            with open(file_path, newline='', encoding='utf-8', errors='ignore') as csvfile:
-                reader = csv.reader(csvfile)
-                for row in reader:
-                    text += "\t".join(row) + "\n"
-            print(f"[DEBUG] CSV text length: {len(text)}")
-        except Exception as e:
-            print(f"[ERROR] Failed to parse CSV: {e}")
-
-    # --------------- JSON ---------------
-    elif ext == ".json":
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            text = json.dumps(data, indent=2, ensure_ascii=False)
-            print(f"[DEBUG] JSON text length: {len(text)}")
-        except Exception as e:
-            print(f"[ERROR] Failed to parse JSON: {e}")
-
-    # --------------- ZIP (Optional: ekstrak semua text file di dalamnya) ---------------
+    # --------------- ZIP bundle (member berurutan; extract_text memprosesnya paralel) ---------------
     elif ext == ".zip":
-        try:
-            with ZipFile(file_path, 'r') as zip_ref:
-                file_list = zip_ref.namelist()
-                text += f"--- ZIP Contents ---\n" + "\n".join(file_list) + "\n"
-                for name in file_list:
-                    if name.endswith((".txt", ".csv", ".json")):
-                        with zip_ref.open(name) as f:
-                            try:
-                                content = f.read().decode("utf-8", errors="ignore")
-                                text += f"\n--- File: {name} ---\n{content}\n"
-                            except Exception as e:
-                                print(f"[WARN] Failed to read {name} from zip: {e}")
-            print(f"[DEBUG] ZIP text length: {len(text)}")
-        except Exception as e:
-            print(f"[ERROR] Failed to parse ZIP: {e}")
-
-    # --------------- Plain Text ---------------
+        text = bundle_extractor.render(bundle_extractor.extract_bundle_sync(file_path))
+
+    # --------------- DOCX, Excel, CSV, JSON, plain text (streaming) ---------------
     else:
-        try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                text = f.read()
-            print(f"[DEBUG] Plain text length: {len(text)}")
-            print(f"[DEBUG] Plain text preview: {text[:200]}")
-        except Exception as e:
-            print(f"[ERROR] Failed to read as plain text: {e}")
+        text = text_extractors.extract(file_path, ext)
 
+    metrics.observe("extract", time.perf_counter() - start, _format_label(ext))
     return text
@@ -0,0 +1,28 @@
+import asyncio
+from typing import Optional
+
+from google.cloud import firestore
+
+_db: Optional[firestore.AsyncClient] = None
+
+
+def get_db() -> firestore.AsyncClient:
+    """
+    AsyncClient bersama, dibuat saat pertama dipakai: import modul tidak perlu
+    resolve credential / project dulu, jadi startup dan restart worker cepat.
+    """
+    global _db
+    if _db is None:
+        _db = firestore.AsyncClient()
+    return _db
+
+
+async def check_connection(timeout: float) -> dict:
+    """Satu read kecil untuk readiness probe; tidak raise."""
+    try:
+        await asyncio.wait_for(get_db().collection("documents").document("_ready").get(), timeout=timeout)
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": f"timeout after {timeout:.0f}s"}
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    return {"ok": True}
@@ -0,0 +1,183 @@
+"""
+Preprocessing foto KTP sebelum tesseract.
+
+Foto dari HP biasanya 12 MP dengan kartu kecil di tengah background. Langkah:
+
+- draft     : decode JPEG langsung di skala kecil (DCT scaling) + batasi sisi terpanjang
+- exif      : putar sesuai tag EXIF orientation
+- crop      : potong ke area kartu (batas profil kepadatan edge)
+- deskew    : luruskan kemiringan (sudut dengan variance profil baris terbesar)
+- threshold : adaptive threshold (mean lokal) → teks hitam di atas putih
+- invert    : perilaku lama (grayscale lalu invert), untuk perbandingan
+
+Langkah yang aktif diatur lewat OCR_PREPROCESS_STEPS dan selalu dijalankan
+dengan urutan di atas. Tiap langkah diukur waktunya.
+"""
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps, ImageStat
+
+# -------------------- Konfigurasi --------------------
+OCR_PREPROCESS_STEPS = os.getenv("OCR_PREPROCESS_STEPS", "draft,exif,crop,deskew,threshold")
+# Sisi terpanjang gambar setelah langkah draft (px); cukup untuk teks KTP
+OCR_MAX_EDGE = int(os.getenv("OCR_MAX_EDGE", "2000"))
+OCR_DESKEW_MAX_ANGLE = float(os.getenv("OCR_DESKEW_MAX_ANGLE", "10"))
+# Piksel dianggap teks kalau lebih gelap dari mean lokal minus offset ini
+OCR_THRESHOLD_OFFSET = int(os.getenv("OCR_THRESHOLD_OFFSET", "10"))
+
+STEP_ORDER = ("draft", "exif", "crop", "deskew", "threshold", "invert")
+
+# Ukuran kerja untuk analisis (crop / deskew) supaya tidak memproses resolusi penuh
+_ANALYSIS_EDGE = 400
+# Area kartu minimal relatif terhadap frame; lebih kecil dari ini dianggap deteksi salah
+_MIN_CROP_AREA = 0.05
+_CROP_MARGIN = 0.02
+_EDGE_LEVEL = 64
+
+
+def parse_steps(spec: Optional[str] = None) -> List[str]:
+    names = [s.strip().lower() for s in (OCR_PREPROCESS_STEPS if spec is None else spec).split(",") if s.strip()]
+    unknown = set(names) - set(STEP_ORDER)
+    if unknown:
+        raise ValueError(f"Unknown OCR preprocessing step(s): {', '.join(sorted(unknown))}")
+    return [s for s in STEP_ORDER if s in names]
+
+
+def describe(steps: List[str]) -> str:
+    """Deskripsi pipeline + parameter, dipakai sebagai bagian key cache OCR."""
+    params = []
+    if "draft" in steps:
+        params.append(f"max_edge={OCR_MAX_EDGE}")
+    if "deskew" in steps:
+        params.append(f"max_angle={OCR_DESKEW_MAX_ANGLE:g}")
+    if "threshold" in steps:
+        params.append(f"offset={OCR_THRESHOLD_OFFSET}")
+    return "+".join(steps) + (f"({','.join(params)})" if params else "")
+
+
+# -------------------- Langkah --------------------
+def _downscale(img: Image.Image) -> Image.Image:
+    img.thumbnail((OCR_MAX_EDGE, OCR_MAX_EDGE), Image.LANCZOS)
+    return img
+
+
+def _analysis_copy(img: Image.Image) -> Tuple[Image.Image, float]:
+    scale = min(1.0, _ANALYSIS_EDGE / max(img.size))
+    small = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.BILINEAR)
+    return small, scale
+
+
+def _profile(img: Image.Image, axis: int) -> List[int]:
+    """Rata-rata intensitas per baris (axis=0) atau per kolom (axis=1) lewat resize BOX."""
+    size = (1, img.height) if axis == 0 else (img.width, 1)
+    return list(img.resize(size, Image.BOX).getdata())
+
+
+def _edge_bounds(profile: List[int]) -> Tuple[int, int]:
+    """
+    Index pertama dan terakhir yang jelas di atas noise floor (median profil).
+    Tepi kartu dan baris teks menonjol; tekstur background tersebar rata.
+    """
+    floor = sorted(profile)[len(profile) // 2]
+    limit = floor + (max(profile) - floor) * 0.5
+    hits = [i for i, v in enumerate(profile) if v > limit]
+    return (hits[0], hits[-1] + 1) if hits else (0, len(profile))
+
+
+def _crop_card(img: Image.Image) -> Image.Image:
+    small, scale = _analysis_copy(img)
+    # Blur dulu supaya tekstur halus background tidak ikut terhitung sebagai edge.
+    # FIND_EDGES selalu menandai tepi frame, jadi border 2 px dibuang.
+    edges = small.filter(ImageFilter.GaussianBlur(1.5)).filter(ImageFilter.FIND_EDGES)
+    edges = ImageOps.expand(ImageOps.crop(edges, 2), 2, fill=0)
+    edges = ImageOps.autocontrast(edges, cutoff=1)
+    edges = edges.point([255 if v > _EDGE_LEVEL else 0 for v in range(256)])
+    top, bottom = _edge_bounds(_profile(edges, 0))
+    left, right = _edge_bounds(_profile(edges, 1))
+    if (bottom - top) * (right - left) < _MIN_CROP_AREA * small.width * small.height:
+        return img
+
+    margin_x, margin_y = img.width * _CROP_MARGIN, img.height * _CROP_MARGIN
+    box = (
+        max(0, int(left / scale - margin_x)),
+        max(0, int(top / scale - margin_y)),
+        min(img.width, int(right / scale + margin_x)),
+        min(img.height, int(bottom / scale + margin_y)),
+    )
+    return img.crop(box)
+
+
+def _row_variance(img: Image.Image) -> float:
+    rows = _profile(img, 0)
+    mean = sum(rows) / len(rows)
+    return sum((r - mean) ** 2 for r in rows) / len(rows)
+
+
+def _deskew(img: Image.Image) -> Image.Image:
+    small, _ = _analysis_copy(img)
+    small = ImageOps.invert(ImageOps.autocontrast(small))  # teks terang → profil baris tajam
+
+    def score(angle: float) -> float:
+        return _row_variance(small.rotate(angle, resample=Image.BILINEAR, fillcolor=0))
+
+    # Pencarian kasar per 1°, lalu halus per 0.25° di sekitar sudut terbaik
+    limit = int(OCR_DESKEW_MAX_ANGLE)
+    best = max(range(-limit, limit + 1), key=score)
+    best = max((best + d / 4 for d in range(-3, 4)), key=score)
+
+    if abs(best) < 0.5:
+        return img
+    # Sudut diisi warna rata-rata supaya threshold tidak melihat tepi buatan
+    fill = int(ImageStat.Stat(img).mean[0])
+    return img.rotate(best, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+
+def _adaptive_threshold(img: Image.Image) -> Image.Image:
+    radius = max(8, min(img.size) // 40)
+    local_mean = img.filter(ImageFilter.BoxBlur(radius))
+    darkness = ImageChops.subtract(local_mean, img)  # > 0 kalau piksel lebih gelap dari sekitarnya
+    return darkness.point([0 if v > OCR_THRESHOLD_OFFSET else 255 for v in range(256)])
+
+
+# -------------------- Pipeline --------------------
+def preprocess_image(file_path: str, steps: Optional[List[str]] = None) -> Tuple[Image.Image, Dict[str, float]]:
+    """
+    Buka dan preprocess gambar untuk OCR. Return (image mode L, {langkah: detik}).
+    """
+    steps = parse_steps() if steps is None else steps
+    timings: Dict[str, float] = {}
+
+    def timed(name, fn, image):
+        start = time.perf_counter()
+        out = fn(image)
+        timings[name] = time.perf_counter() - start
+        return out
+
+    start = time.perf_counter()
+    img = Image.open(file_path)
+    if "draft" in steps and max(img.size) > OCR_MAX_EDGE:
+        # JPEG: decoder langsung menghasilkan grayscale di skala 1/2, 1/4 atau 1/8
+        # (skala terkecil yang masih >= ukuran yang diminta)
+        factor = OCR_MAX_EDGE / max(img.size)
+        img.draft("L", (int(img.width * factor), int(img.height * factor)))
+    img.load()
+    timings["decode"] = time.perf_counter() - start
+
+    if "draft" in steps and max(img.size) > OCR_MAX_EDGE:
+        img = timed("draft", _downscale, img)
+    if "exif" in steps:
+        img = timed("exif", ImageOps.exif_transpose, img)
+    img = img.convert("L")
+
+    for name, fn in (
+        ("crop", _crop_card),
+        ("deskew", _deskew),
+        ("threshold", _adaptive_threshold),
+        ("invert", ImageOps.invert),
+    ):
+        if name in steps:
+            img = timed(name, fn, img)
+
+    return img, timings
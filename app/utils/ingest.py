@@ -0,0 +1,105 @@
+import os
+import uuid
+import hashlib
+import time
+from typing import NamedTuple
+import aiofiles
+
+from app.utils.crypto_utils import new_encryptor
+from app.utils.stage_timer import add as add_stage
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+
+class UploadTooLarge(Exception):
+    """File upload melebihi MAX_UPLOAD_BYTES."""
+
+
+class IngestResult(NamedTuple):
+    file_hash: str
+    file_name: str
+    file_path: str        # plaintext spool, dipakai untuk ekstraksi lalu dihapus
+    encrypted_path: str
+    encryption_key: bytes
+    size: int
+
+
+def _remove_quietly(*paths: str):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+async def ingest_upload(file, dest_dir: str, max_bytes: int = MAX_UPLOAD_BYTES) -> IngestResult:
+    """
+    Baca UploadFile per chunk besar dan dalam satu pass:
+    update SHA-256, enkripsi AES, dan spool plaintext + ciphertext ke disk.
+    Memory per upload konstan (satu chunk), plaintext cukup ditulis sekali.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    key, iv, encryptor = new_encryptor()
+    sha256 = hashlib.sha256()
+    size = 0
+
+    # Nama final bergantung pada hash, jadi tulis ke nama sementara dulu
+    tmp_name = uuid.uuid4().hex
+    plain_tmp = os.path.join(dest_dir, f"{tmp_name}.part")
+    enc_tmp = os.path.join(dest_dir, f"{tmp_name}.enc.part")
+
+    # Durasi kumulatif per langkah (stage read / hash / encrypt / spool_write)
+    timings = dict.fromkeys(("read", "hash", "encrypt", "spool_write"), 0.0)
+    clock = time.perf_counter
+
+    try:
+        async with aiofiles.open(plain_tmp, "wb") as plain, aiofiles.open(enc_tmp, "wb") as enc:
+            await enc.write(iv)  # simpan IV di awal file
+            while True:
+                t0 = clock()
+                chunk = await file.read(INGEST_CHUNK_SIZE)
+                t1 = clock()
+                timings["read"] += t1 - t0
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds {max_bytes} bytes")
+                sha256.update(chunk)
+                t2 = clock()
+                encrypted = encryptor.update(chunk)
+                t3 = clock()
+                await plain.write(chunk)
+                await enc.write(encrypted)
+                timings["hash"] += t2 - t1
+                timings["encrypt"] += t3 - t2
+                timings["spool_write"] += clock() - t3
+            await enc.write(encryptor.finalize())
+    except BaseException:
+        _remove_quietly(plain_tmp, enc_tmp)
+        raise
+
+    for name, seconds in timings.items():
+        add_stage(name, seconds)
+
+    return IngestResult(sha256.hexdigest(), file.filename, plain_tmp, enc_tmp, key, size)
+
+
+def commit_ingest(result: IngestResult) -> IngestResult:
+    """
+    Pindahkan spool sementara ke nama final "{hash}_{filename}" (+ ".enc").
+    Dipanggil setelah dedup, supaya upload duplikat tidak menimpa file yang sudah ada.
+    """
+    dest_dir = os.path.dirname(result.file_path)
+    safe_name = os.path.basename(result.file_name or "upload")
+    file_path = os.path.join(dest_dir, f"{result.file_hash}_{safe_name}")
+    encrypted_path = f"{file_path}.enc"
+    os.replace(result.file_path, file_path)
+    os.replace(result.encrypted_path, encrypted_path)
+    return result._replace(file_path=file_path, encrypted_path=encrypted_path)
+
+
+def discard_ingest(result: IngestResult):
+    """Hapus file hasil ingest (mis. upload duplikat)."""
+    _remove_quietly(result.file_path, result.encrypted_path)
@@ -1,93 +1,175 @@
-from typing import Dict
+from typing import Dict, Iterable, List, Optional
 import re
 
+# -------------------- Pola (dikompilasi sekali per proses) --------------------
+# Label di awal baris, mis. "Nama : BUDI" / "Tempat/Tgl Lahir: BANDUNG, 01-05-1990".
+# Nama grup = field tujuan; dipakai lewat match.lastgroup.
+_LABEL_RE = re.compile(
+    r"(?:"
+    r"(?P<NIK>NIK)"
+    r"|(?P<Nama>Nama)"
+    r"|(?P<TempatTgl>Tempat\s*/?\s*Tgl\.?\s*Lahir)"
+    r"|(?P<JenisKelamin>Jenis\s*Kelamin)"
+    r"|(?P<Alamat>Alamat)"
+    r"|(?P<RTRW>RT\s*/\s*RW)"
+    r"|(?P<KelDesa>Kel\s*/\s*Desa)"
+    r"|(?P<Kecamatan>Kecamatan)"
+    r"|(?P<Agama>Agama)"
+    r"|(?P<StatusPerkawinan>Status\s*Perkawinan)"
+    r"|(?P<Pekerjaan>Pekerjaan)"
+    r"|(?P<Kewarganegaraan>Kewarganegaraan)"
+    r"|(?P<BerlakuHingga>Berlaku\s*Hingga)"
+    r")\b[\s:]*",
+    re.IGNORECASE,
+)
+_LABEL_FIELDS = {"RTRW": "RT/RW", "KelDesa": "Kel/Desa"}
+
+_GOL_DARAH_RE = re.compile(r"Gol\.?\s*Darah[\s:]*(AB|A|B|O)?(?![A-Z])", re.IGNORECASE)
+_NIK_RE = re.compile(r"\b\d{16}\b")
+_DATE_RE = re.compile(r"\b\d{2}-\d{2}-\d{4}\b")
+_GENDER_RE = re.compile(r"\b(PEREMPUAN|LAKI-?LAKI)\b", re.IGNORECASE)
+_CITIZEN_RE = re.compile(r"\b(WNI|WNA)\b", re.IGNORECASE)
+_MARITAL_RE = re.compile(r"\b(BELUM KAWIN|CERAI HIDUP|CERAI MATI|KAWIN)\b", re.IGNORECASE)
+_RELIGION_RE = re.compile(r"\b(ISLAM|KRISTEN|KATOLIK|HINDU|BUDDHA|KONGHUCU)\b", re.IGNORECASE)
+_BERLAKU_RE = re.compile(r"BERLAKU HINGGA[:\s]*(\d{2}-\d{2}-\d{4})", re.IGNORECASE)
+
+# Fallback untuk OCR tanpa label: huruf/spasi tepat sebelum ", <tanggal>" dan
+# nama di antara NIK dan tempat lahir. Dijalankan hanya pada potongan teks pendek
+# sehingga tidak ada backtracking kuadratik pada input panjang.
+_TEMPAT_TAIL_RE = re.compile(r"([A-Z][A-Z\s]*),\s*$", re.IGNORECASE)
+_NAME_RE = re.compile(r"[A-Z][A-Z\s]*", re.IGNORECASE)
+_TAIL_WINDOW = 64
+
+FIELD_NAMES = (
+    "NIK", "Nama", "Tempat", "TanggalLahir", "JenisKelamin", "Alamat", "RT/RW",
+    "Kel/Desa", "Kecamatan", "Agama", "StatusPerkawinan", "Pekerjaan",
+    "Kewarganegaraan", "GolDarah", "BerlakuHingga",
+)
+
+
+def _tokenize(lines: List[str]):
+    """
+    Satu pass atas baris OCR: ambil nilai field berlabel, golongan darah
+    (biasanya satu baris dengan jenis kelamin) dan index baris jenis kelamin.
+    """
+    labelled: Dict[str, str] = {}
+    gol_darah = ""
+    idx_jk: Optional[int] = None
+
+    for i, line in enumerate(lines):
+        gol = _GOL_DARAH_RE.search(line)
+        if gol:
+            gol_darah = gol_darah or (gol.group(1) or "").upper()
+            line = line[:gol.start()].rstrip()
+
+        if idx_jk is None and _GENDER_RE.search(line):
+            idx_jk = i
+
+        m = _LABEL_RE.match(line)
+        if m:
+            field = _LABEL_FIELDS.get(m.lastgroup, m.lastgroup)
+            value = line[m.end():].strip()
+            if value and field not in labelled:
+                labelled[field] = value
+
+    return labelled, gol_darah, idx_jk
+
+
 def parse_ktp(ocr_text: str) -> Dict[str, str]:
-    fields = {
-        "NIK": "",
-        "Nama": "",
-        "Tempat": "",
-        "TanggalLahir": "",
-        "JenisKelamin": "",
-        "Alamat": "",
-        "RT/RW": "",
-        "Kel/Desa": "",
-        "Kecamatan": "",
-        "Agama": "",
-        "StatusPerkawinan": "",
-        "Pekerjaan": "",
-        "Kewarganegaraan": "",
-        "GolDarah": "",
-        "BerlakuHingga": ""
-    }
-
-    text = " ".join(ocr_text.splitlines())
-
-    # --- Basic fields ---
-    nik = re.search(r"\b\d{16}\b", text)
-    if nik: fields["NIK"] = nik.group(0)
+    fields = dict.fromkeys(FIELD_NAMES, "")
 
-    tgl_lahir = re.search(r"\b\d{2}-\d{2}-\d{4}\b", text)
-    if tgl_lahir: fields["TanggalLahir"] = tgl_lahir.group(0)
+    lines = [l.strip() for l in ocr_text.splitlines() if l.strip()]
+    text = " ".join(lines)
+    labelled, gol_darah, idx_jk = _tokenize(lines)
+    fields["GolDarah"] = gol_darah
 
-    jk = re.search(r"\b(PEREMPUAN|LAKI-?LAKI)\b", text, re.IGNORECASE)
-    if jk: fields["JenisKelamin"] = jk.group(0).capitalize()
+    # --- Field berlabel (nilai diambil dari barisnya sendiri) ---
+    nik = _NIK_RE.search(labelled.get("NIK", "")) or _NIK_RE.search(text)
+    if nik: fields["NIK"] = nik.group(0)
 
-    gol = re.search(r"Gol\.\s*Darah[:\s]*([A-ZABO]+)", text, re.IGNORECASE)
-    if gol: fields["GolDarah"] = gol.group(1).upper()
+    if "Nama" in labelled:
+        fields["Nama"] = labelled["Nama"].title()
 
-    berlaku = re.search(r"BERLAKU HINGGA[:\s]*(\d{2}-\d{2}-\d{4})", text, re.IGNORECASE)
-    if berlaku: 
-        fields["BerlakuHingga"] = berlaku.group(1)
+    tempat_tgl = labelled.get("TempatTgl", "")
+    tgl = _DATE_RE.search(tempat_tgl)
+    if tgl:
+        fields["TanggalLahir"] = tgl.group(0)
+        fields["Tempat"] = tempat_tgl[:tgl.start()].strip(" ,:").title()
     else:
-        # fallback ambil tanggal kedua
-        dates = re.findall(r"\b\d{2}-\d{2}-\d{4}\b", text)
-        if dates and len(dates) >= 2:
-            fields["BerlakuHingga"] = dates[-2]
+        tgl = _DATE_RE.search(text)
+        if tgl:
+            fields["TanggalLahir"] = tgl.group(0)
+            m = _TEMPAT_TAIL_RE.search(text[max(0, tgl.start() - _TAIL_WINDOW):tgl.start()])
+            if m: fields["Tempat"] = m.group(1).strip().title()
 
-    kewarganegaraan = re.search(r"\b(WNI|WNA)\b", text, re.IGNORECASE)
-    if kewarganegaraan: fields["Kewarganegaraan"] = kewarganegaraan.group(0).upper()
+    jk = _GENDER_RE.search(labelled.get("JenisKelamin", "")) or _GENDER_RE.search(text)
+    if jk: fields["JenisKelamin"] = jk.group(0).capitalize()
 
-    status = re.search(r"\b(KAWIN|BELUM KAWIN|CERAI HIDUP|CERAI MATI)\b", text, re.IGNORECASE)
-    if status: fields["StatusPerkawinan"] = status.group(0).title()
+    for field in ("Alamat", "RT/RW", "Kel/Desa", "Kecamatan"):
+        if field in labelled:
+            fields[field] = labelled[field].replace(":", "").strip()
 
-    agama = re.search(r"\b(ISLAM|KRISTEN|KATOLIK|HINDU|BUDDHA|KONGHUCU)\b", text, re.IGNORECASE)
+    agama = _RELIGION_RE.search(labelled.get("Agama", "")) or _RELIGION_RE.search(text)
     if agama: fields["Agama"] = agama.group(0).title()
 
-    # --- Tempat lahir ---
-    if fields["TanggalLahir"]:
-        m = re.search(r"([A-Z][A-Z\s]+?),\s*" + re.escape(fields["TanggalLahir"]), text, re.IGNORECASE)
-        if m: fields["Tempat"] = m.group(1).title()
+    status = _MARITAL_RE.search(labelled.get("StatusPerkawinan", "")) or _MARITAL_RE.search(text)
+    if status: fields["StatusPerkawinan"] = status.group(0).title()
 
-    # --- Nama ---
-    if fields["NIK"] and fields["Tempat"]:
-        pattern = rf"{fields['NIK']}[:\s]*([A-Z][A-Z\s]+?)[:\s]*{fields['Tempat']}"
-        m = re.search(pattern, text, re.IGNORECASE)
-        if m: fields["Nama"] = m.group(1).title()
+    if "Pekerjaan" in labelled:
+        fields["Pekerjaan"] = labelled["Pekerjaan"].replace(":", "").strip().title()
 
-    # --- Alamat, RT/RW, Kel/Desa, Kecamatan ---
-    lines = [l.strip() for l in ocr_text.splitlines() if l.strip()]
+    wn = _CITIZEN_RE.search(labelled.get("Kewarganegaraan", "")) or _CITIZEN_RE.search(text)
+    if wn: fields["Kewarganegaraan"] = wn.group(0).upper()
 
-    # cari index Jenis Kelamin
-    try:
-        idx_jk = next(i for i, l in enumerate(lines) if fields["JenisKelamin"].upper() in l.upper())
-        # alamat biasanya baris berikutnya
-        fields["Alamat"] = lines[idx_jk + 1].replace(":", "").strip()
-        fields["RT/RW"] = lines[idx_jk + 2].replace(":", "").strip()
-        fields["Kel/Desa"] = lines[idx_jk + 3].replace(":", "").strip()
-        fields["Kecamatan"] = lines[idx_jk + 4].replace(":", "").strip()
-    except Exception:
-        pass
-
-    # --- Pekerjaan ---
-    if fields["Kewarganegaraan"] and fields["Agama"]:
-        pattern = rf"{fields['Agama']}[:\s]*(.*?)\s+{fields['Kewarganegaraan']}"
-        m = re.search(pattern, text, re.IGNORECASE)
-        if m:
-            pekerjaan = m.group(1).replace(":", "").strip()
-            fields["Pekerjaan"] = pekerjaan.title()
+    berlaku_value = labelled.get("BerlakuHingga", "")
+    berlaku = _DATE_RE.search(berlaku_value) or _BERLAKU_RE.search(text)
+    if berlaku:
+        fields["BerlakuHingga"] = berlaku.group(berlaku.lastindex or 0)
+    elif berlaku_value:
+        # mis. "SEUMUR HIDUP"
+        fields["BerlakuHingga"] = berlaku_value.title()
+    else:
+        # fallback ambil tanggal kedua dari belakang
+        dates = _DATE_RE.findall(text)
+        if len(dates) >= 2:
+            fields["BerlakuHingga"] = dates[-2]
+
+    # --- Fallback posisi untuk OCR tanpa label ---
+    # Nama: teks di antara NIK dan tempat lahir
+    nik_pos = _NIK_RE.search(text)
+    if not fields["Nama"] and nik_pos and fields["Tempat"]:
+        end = text.upper().find(fields["Tempat"].upper(), nik_pos.end())
+        if end != -1:
+            nama = text[nik_pos.end():end].strip(": \t")
+            if _NAME_RE.fullmatch(nama): fields["Nama"] = nama.title()
+
+    # Alamat, RT/RW, Kel/Desa, Kecamatan: baris-baris setelah jenis kelamin
+    if idx_jk is not None:
+        for offset, field in enumerate(("Alamat", "RT/RW", "Kel/Desa", "Kecamatan"), start=1):
+            if not fields[field] and idx_jk + offset < len(lines):
+                fields[field] = lines[idx_jk + offset].replace(":", "").strip()
+
+    # Pekerjaan: teks di antara agama dan kewarganegaraan
+    if not fields["Pekerjaan"] and agama and wn and "Agama" not in labelled and "Kewarganegaraan" not in labelled:
+        if agama.end() <= wn.start():
+            fields["Pekerjaan"] = text[agama.end():wn.start()].replace(":", "").strip().title()
 
     # --- Cleanup ---
     for k in fields:
         fields[k] = fields[k].strip()
 
     return fields
+
+
+def parse_ktp_batch(texts: Iterable[str], processes: int = 1, chunksize: int = 64) -> List[Dict[str, str]]:
+    """
+    Parse banyak teks OCR sekaligus (mis. reprocessing teks yang sudah tersimpan).
+    Urutan hasil sama dengan input. processes > 1 membagi kerja ke multiprocessing.Pool.
+    """
+    if processes <= 1:
+        return [parse_ktp(t) for t in texts]
+
+    import multiprocessing
+
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        return pool.map(parse_ktp, texts, chunksize=chunksize)
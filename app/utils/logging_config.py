@@ -0,0 +1,48 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+# -------------------- Konfigurasi --------------------
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# text = satu baris mudah dibaca, json = satu objek JSON per baris (untuk log collector)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# Atribut bawaan LogRecord; sisanya berasal dari extra={...}
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RESERVED})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+_configured = False
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """
+    Pasang handler stderr di root logger (sekali per proses).
+    Dipanggil dari app.main dan sebagai initializer worker ekstraksi.
+    """
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler()
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    _configured = True
@@ -0,0 +1,127 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# -------------------- Histogram --------------------
+_SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+_CHAIN_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300)
+
+HISTOGRAMS = {
+    "stage": Histogram(
+        "kyc_stage_seconds", "Durasi tahap pipeline upload (lihat app.utils.stage_timer)", ["stage"]),
+    "extract": Histogram(
+        "kyc_extract_seconds", "Durasi ekstraksi teks per format file", ["format"], buckets=_SLOW_BUCKETS),
+    "ocr_page": Histogram(
+        "kyc_ocr_page_seconds", "Durasi tesseract per gambar / halaman PDF", ["source"], buckets=_SLOW_BUCKETS),
+    "firestore": Histogram(
+        "kyc_firestore_op_seconds", "Durasi operasi Firestore", ["op"]),
+    "chain": Histogram(
+        "kyc_chain_tx_seconds", "submit = build+sign+kirim tx, confirm = kirim sampai receipt, replace = kirim sampai fee di-bump", ["op"],
+        buckets=_CHAIN_BUCKETS),
+    "tradechain": Histogram(
+        "kyc_tradechain_request_seconds", "Request ke TradeChain termasuk retry", ["endpoint", "outcome"]),
+}
+
+# -------------------- Counter --------------------
+COUNTERS = {
+    "outbox": Counter(
+        "kyc_outbox_events_total",
+        "Baris outbox TradeChain: enqueued, delivered, coalesced (superseded), retried, failed; batches = batch terkirim",
+        ["event"]),
+    # Cache OCR; dihitung di worker ekstraksi, masuk lewat ocr_cache.merge_counters.
+    # Hit rate = hits / (hits + misses)
+    "ocr_cache_hits": Counter("kyc_ocr_cache_hits_total", "Lookup cache OCR yang hit"),
+    "ocr_cache_misses": Counter("kyc_ocr_cache_misses_total", "Lookup cache OCR yang miss (termasuk entry kedaluwarsa)"),
+    "ocr_cache_writes": Counter("kyc_ocr_cache_writes_total", "Entry cache OCR yang ditulis"),
+    "ocr_cache_evictions": Counter("kyc_ocr_cache_evictions_total", "Entry cache OCR yang dibuang karena batas ukuran"),
+    "ocr_cache_expired": Counter("kyc_ocr_cache_expired_total", "Entry cache OCR yang dihapus karena TTL"),
+}
+
+# -------------------- Gauge --------------------
+GAUGES = {
+    "chain_read_batch_mode": Gauge(
+        "kyc_chain_read_batch_mode", "Mode batch read kontrak yang aktif (1) : multicall / rpc / off", ["mode"]),
+}
+
+
+def set_state(metric: str, current: str, states: Tuple[str, ...]):
+    """Gauge enum: label current = 1, state lain = 0."""
+    for state in states:
+        GAUGES[metric].labels(state).set(1 if state == current else 0)
+
+
+# -------------------- Cache in-process (app.utils.cache.LRUCache) --------------------
+_caches: Dict[str, object] = {}
+
+
+def register_cache(name: str, cache):
+    """Ekspor hit / miss / jumlah entry cache sebagai kyc_cache_*{cache=name}, dibaca saat scrape."""
+    _caches[name] = cache
+
+
+class _CacheCollector:
+    def collect(self):
+        hits = CounterMetricFamily("kyc_cache_hits", "Lookup cache in-process yang hit", labels=["cache"])
+        misses = CounterMetricFamily("kyc_cache_misses", "Lookup cache in-process yang miss / kedaluwarsa", labels=["cache"])
+        entries = GaugeMetricFamily("kyc_cache_entries", "Jumlah entry cache in-process", labels=["cache"])
+        for name, cache in _caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            entries.add_metric([name], stats["size"])
+        return [hits, misses, entries]
+
+
+REGISTRY.register(_CacheCollector())
+
+# Di worker process ekstraksi sampel ditampung lalu dikirim balik ke proses utama
+# (registry worker tidak pernah di-scrape), lihat collect_samples / merge_samples.
+_worker_samples: Optional[List[tuple]] = None
+
+
+def observe(metric: str, seconds: float, *labels: str):
+    if _worker_samples is not None:
+        _worker_samples.append((metric, labels, seconds))
+    else:
+        HISTOGRAMS[metric].labels(*labels).observe(seconds)
+
+
+def inc(metric: str, amount: float = 1, *labels: str):
+    if amount:
+        counter = COUNTERS[metric]
+        (counter.labels(*labels) if labels else counter).inc(amount)
+
+
+@contextmanager
+def timed(metric: str, *labels: str) -> Iterator[None]:
+    """Ukur durasi blok ke histogram metric (juga kalau blok raise)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(metric, time.perf_counter() - start, *labels)
+
+
+@contextmanager
+def collect_samples() -> Iterator[List[tuple]]:
+    """Dipakai di worker: tampung semua observe() di dalam blok, bukan ke registry lokal."""
+    global _worker_samples
+    _worker_samples = samples = []
+    try:
+        yield samples
+    finally:
+        _worker_samples = None
+
+
+def merge_samples(samples: List[tuple]):
+    """Masukkan sampel dari worker ke histogram proses ini."""
+    for metric, labels, seconds in samples:
+        HISTOGRAMS[metric].labels(*labels).observe(seconds)
+
+
+def render() -> Tuple[bytes, str]:
+    """Body + content type untuk endpoint /metrics."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,332 @@
+"""
+Cache hasil OCR, content-addressed.
+
+Key = sha256 dari (hash konten halaman/gambar + setting OCR: engine, bahasa,
+config tesseract, preprocessing, dpi ...). Selama piksel dan setting sama,
+hasil tesseract dipakai ulang; upload ulang, job reprocessing dan retry tidak
+meng-OCR ulang.
+
+Teks OCR dokumen KYC berisi PII (NIK, nama, alamat), jadi:
+- Dengan OCR_CACHE_KEY (hex 32 byte) entry disimpan di disk terenkripsi
+  AES-256-GCM (nama file ikut diautentikasi). Tanpa key, cache hanya di
+  memori proses worker (OCR_CACHE_MEMORY_BYTES) dan tidak pernah ke disk.
+- Entry kedaluwarsa setelah OCR_CACHE_TTL_SECONDS sejak ditulis, juga kalau
+  sering dipakai. mtime file = waktu tulis, atime = terakhir dipakai (LRU).
+
+Trim (hapus entry kedaluwarsa, lalu LRU saat total melewati OCR_CACHE_MAX_BYTES)
+dijalankan lazy: paling sering sekali per OCR_CACHE_TRIM_INTERVAL untuk semua
+proses (marker file di OCR_CACHE_DIR), atau setelah proses ini menulis cukup
+banyak. Worker yang baru di-recycle tidak men-scan direktori cache.
+
+Dipakai dari proses worker ekstraksi; hit/miss dihitung per proses lalu
+dikirim balik ke proses utama lewat take_counters() / merge_counters() dan
+diekspor di /metrics (kyc_ocr_cache_*_total).
+
+    python -m app.utils.ocr_cache stats
+    python -m app.utils.ocr_cache clear
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from app.utils import metrics
+from app.utils.crypto_utils import decrypt_bytes, encrypt_bytes
+
+logger = logging.getLogger(__name__)
+
+# -------------------- Konfigurasi --------------------
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "data/ocr_cache")
+OCR_CACHE_KEY = os.getenv("OCR_CACHE_KEY")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+OCR_CACHE_TTL_SECONDS = float(os.getenv("OCR_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+OCR_CACHE_TRIM_INTERVAL = float(os.getenv("OCR_CACHE_TRIM_INTERVAL", "3600"))
+# Batas cache memori per proses (dipakai kalau OCR_CACHE_KEY tidak diset)
+OCR_CACHE_MEMORY_BYTES = int(os.getenv("OCR_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+# Setelah eviction, ukuran cache diturunkan sampai fraksi ini dari batas
+OCR_CACHE_EVICT_TO = 0.9
+
+_HASH_CHUNK = 1024 * 1024
+_ENTRY_EXT = ".enc"
+_LEGACY_EXT = ".txt"  # entry plaintext versi lama, dihapus saat trim
+_TRIM_MARKER = ".last_trim"
+
+counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expired": 0}
+_lock = threading.Lock()
+# Bytes yang ditulis proses ini sejak trim terakhir
+_written_since_trim = 0
+_memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (ditulis pada, teks)
+_memory_bytes = 0
+_cipher_key: Optional[bytes] = None
+_cipher_checked = False
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(content_hash: str, **settings) -> str:
+    payload = json.dumps({"content": content_hash, **settings}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, key[:2], f"{key}{_ENTRY_EXT}")
+
+
+def _count(name: str, n: int = 1):
+    with _lock:
+        counters[name] += n
+
+
+def _disk_key() -> Optional[bytes]:
+    """Key AES dari OCR_CACHE_KEY; None = cache disk mati (hanya memori)."""
+    global _cipher_key, _cipher_checked
+    if not _cipher_checked:
+        _cipher_checked = True
+        if OCR_CACHE_KEY:
+            try:
+                _cipher_key = bytes.fromhex(OCR_CACHE_KEY)
+                if len(_cipher_key) != 32:
+                    raise ValueError("expected 32 bytes")
+            except ValueError as e:
+                _cipher_key = None
+                logger.error("Invalid OCR_CACHE_KEY (%s); OCR cache kept in memory only", e)
+    return _cipher_key
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# -------------------- Get / Put --------------------
+def get(key: str) -> Optional[str]:
+    if not OCR_CACHE_ENABLED:
+        return None
+    cipher_key = _disk_key()
+    text = _disk_get(key, cipher_key) if cipher_key else _memory_get(key)
+    _count("hits" if text is not None else "misses")
+    return text
+
+
+def put(key: str, text: str):
+    if not OCR_CACHE_ENABLED:
+        return
+    cipher_key = _disk_key()
+    if cipher_key:
+        _disk_put(key, text, cipher_key)
+    else:
+        _memory_put(key, text)
+
+
+def _disk_get(key: str, cipher_key: bytes) -> Optional[str]:
+    path = _path(key)
+    try:
+        with open(path, "rb") as f:
+            written_at = os.fstat(f.fileno()).st_mtime
+            blob = f.read()
+    except OSError:
+        # tidak ada, atau dihapus proses lain di tengah jalan
+        return None
+
+    if time.time() - written_at > OCR_CACHE_TTL_SECONDS:
+        _remove_quietly(path)
+        _count("expired")
+        return None
+    try:
+        text = decrypt_bytes(cipher_key, blob, key.encode()).decode("utf-8")
+    except Exception as e:
+        # Rusak atau ditulis dengan OCR_CACHE_KEY lain
+        logger.warning("Dropping unreadable OCR cache entry %s: %s", key, type(e).__name__)
+        _remove_quietly(path)
+        return None
+    try:
+        os.utime(path, (time.time(), written_at))  # atime = terakhir dipakai (LRU), mtime tetap
+    except OSError:
+        pass
+    return text
+
+
+def _disk_put(key: str, text: str, cipher_key: bytes):
+    global _written_since_trim
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    data = encrypt_bytes(cipher_key, text.encode("utf-8"), key.encode())
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # atomic: pembaca tidak pernah melihat file setengah jadi
+    except OSError as e:
+        logger.warning("OCR cache write failed: %s", e)
+        _remove_quietly(tmp)
+        return
+    _count("writes")
+
+    with _lock:
+        _written_since_trim += len(data)
+        # Proses lain ikut menulis, jadi trim sebelum selisih batas dan target trim habis
+        due = _written_since_trim > OCR_CACHE_MAX_BYTES * (1 - OCR_CACHE_EVICT_TO)
+    if due or _trim_due():
+        trim()
+
+
+def _memory_get(key: str) -> Optional[str]:
+    global _memory_bytes
+    with _lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        written_at, text = entry
+        if time.time() - written_at > OCR_CACHE_TTL_SECONDS:
+            del _memory[key]
+            _memory_bytes -= len(text)
+            counters["expired"] += 1
+            return None
+        _memory.move_to_end(key)
+        return text
+
+
+def _memory_put(key: str, text: str):
+    global _memory_bytes
+    with _lock:
+        old = _memory.pop(key, None)
+        if old is not None:
+            _memory_bytes -= len(old[1])
+        _memory[key] = (time.time(), text)
+        _memory_bytes += len(text)
+        counters["writes"] += 1
+        while _memory_bytes > OCR_CACHE_MEMORY_BYTES and _memory:
+            _, (_, evicted) = _memory.popitem(last=False)
+            _memory_bytes -= len(evicted)
+            counters["evictions"] += 1
+
+
+# -------------------- Trim --------------------
+def _trim_due() -> bool:
+    try:
+        return time.time() - os.stat(os.path.join(OCR_CACHE_DIR, _TRIM_MARKER)).st_mtime > OCR_CACHE_TRIM_INTERVAL
+    except FileNotFoundError:
+        return True
+
+
+def _scan() -> list:
+    """(atime, mtime, size, path) untuk semua entry, termasuk entry plaintext lama."""
+    entries = []
+    for root, _, files in os.walk(OCR_CACHE_DIR):
+        for name in files:
+            if not name.endswith((_ENTRY_EXT, _LEGACY_EXT)):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_atime, st.st_mtime, st.st_size, path))
+    return entries
+
+
+def trim():
+    """
+    Hapus entry kedaluwarsa dan entry plaintext lama, lalu yang paling lama
+    tidak dipakai sampai di bawah OCR_CACHE_EVICT_TO * batas.
+    """
+    global _written_since_trim
+    # Marker disentuh dulu supaya proses lain tidak ikut men-scan bersamaan
+    os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(OCR_CACHE_DIR, _TRIM_MARKER), "a"):
+        pass
+    os.utime(os.path.join(OCR_CACHE_DIR, _TRIM_MARKER))
+    with _lock:
+        _written_since_trim = 0
+
+    expire_before = time.time() - OCR_CACHE_TTL_SECONDS
+    live = []
+    expired = 0
+    for atime, mtime, size, path in _scan():
+        if path.endswith(_LEGACY_EXT) or mtime < expire_before:
+            _remove_quietly(path)
+            expired += 1
+        else:
+            live.append((atime, size, path))
+
+    live.sort()
+    total = sum(size for _, size, _ in live)
+    removed = 0
+    if total > OCR_CACHE_MAX_BYTES:
+        target = OCR_CACHE_MAX_BYTES * OCR_CACHE_EVICT_TO
+        for _, size, path in live:
+            if total <= target:
+                break
+            _remove_quietly(path)
+            removed += 1
+            total -= size
+    if expired:
+        _count("expired", expired)
+    if removed:
+        _count("evictions", removed)
+
+
+# -------------------- Metrics --------------------
+def take_counters() -> dict:
+    """Ambil dan reset counter proses ini (dipanggil di worker setelah satu job)."""
+    with _lock:
+        snapshot = dict(counters)
+        for k in counters:
+            counters[k] = 0
+    return snapshot
+
+
+def merge_counters(delta: dict):
+    """Masukkan counter dari proses worker ke counter Prometheus proses utama."""
+    for k, v in (delta or {}).items():
+        if f"ocr_cache_{k}" in metrics.COUNTERS:
+            metrics.inc(f"ocr_cache_{k}", v)
+
+
+def disk_usage() -> tuple:
+    """(jumlah entry, total bytes) di OCR_CACHE_DIR."""
+    entries = _scan()
+    return len(entries), sum(size for _, _, size, _ in entries)
+
+
+def clear():
+    global _memory_bytes
+    for _, _, _, path in _scan():
+        _remove_quietly(path)
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "clear":
+        clear()
+        print("OCR cache cleared")
+    else:
+        if command == "trim":
+            trim()
+        entries, size = disk_usage()
+        print(json.dumps({
+            "dir": OCR_CACHE_DIR,
+            "encrypted": _disk_key() is not None,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": OCR_CACHE_MAX_BYTES,
+            "ttl_seconds": OCR_CACHE_TTL_SECONDS,
+        }, indent=2))
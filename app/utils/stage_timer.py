@@ -0,0 +1,41 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from app.utils import metrics
+
+# Dict timing milik request/dokumen yang sedang diukur; None = tidak ada yang mengukur
+_current: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+
+def add(name: str, seconds: float):
+    """Catat durasi stage ke histogram kyc_stage_seconds dan ke recorder aktif (kalau ada)."""
+    metrics.observe("stage", seconds, name)
+    timings = _current.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Ukur durasi satu tahap pipeline (lihat add). Bisa membungkus await;
+    contextvar ikut ke task anak dan asyncio.to_thread.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - start)
+
+
+@contextmanager
+def record_stages() -> Iterator[Dict[str, float]]:
+    """Kumpulkan timing semua stage() di dalam blok ini: {nama_stage: detik}."""
+    timings: Dict[str, float] = {}
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
@@ -0,0 +1,178 @@
+"""
+Extractor teks streaming untuk format non-OCR (DOCX, XLSX/XLS, CSV, JSON, plain text).
+Bundle ZIP ditangani app.utils.bundle_extractor.
+
+Tiap extractor adalah generator yang menghasilkan potongan teks (satu baris
+sheet / paragraf / baris CSV, lengkap dengan "\\n"), jadi file besar tidak
+pernah dimuat utuh ke memori dan output tidak dibangun dengan `text += ...`.
+collect() menggabungkan potongan sekali di akhir dan berhenti begitu batas
+EXTRACT_MAX_CHARS / EXTRACT_MAX_ROWS tercapai; generator ditutup sehingga
+file ikut ditutup dan sisa sheet tidak dibaca.
+"""
+import csv
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterator, Optional
+from zipfile import ZipFile
+
+logger = logging.getLogger(__name__)
+
+# -------------------- Konfigurasi --------------------
+# ocrText disimpan di satu dokumen Firestore (maks. 1 MiB), jadi teks dibatasi
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "500000"))
+# Baris sheet / CSV / paragraf yang dibaca per file
+EXTRACT_MAX_ROWS = int(os.getenv("EXTRACT_MAX_ROWS", "50000"))
+
+_TEXT_CHUNK = 64 * 1024
+
+# Namespace WordprocessingML di word/document.xml
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def collect(
+    chunks: Iterator[str],
+    label: str,
+    max_chars: Optional[int] = None,
+    max_rows: Optional[int] = None,
+) -> str:
+    """
+    Gabungkan potongan dari extractor dengan batas karakter / baris.
+    Error di tengah file dicatat dan teks yang sudah terbaca tetap dikembalikan.
+    """
+    max_chars = EXTRACT_MAX_CHARS if max_chars is None else max_chars
+    max_rows = EXTRACT_MAX_ROWS if max_rows is None else max_rows
+    parts = []
+    chars = rows = 0
+    truncated = False
+    try:
+        for chunk in chunks:
+            if rows >= max_rows:
+                truncated = True
+                break
+            if chars + len(chunk) > max_chars:
+                parts.append(chunk[:max_chars - chars])
+                truncated = True
+                break
+            parts.append(chunk)
+            chars += len(chunk)
+            rows += 1
+    except Exception as e:
+        logger.error("Failed to parse %s: %s", label, e)
+    finally:
+        chunks.close()
+
+    text = "".join(parts)
+    if truncated:
+        logger.warning("%s extraction truncated at %d chars / %d rows", label, len(text), rows)
+    return text
+
+
+def cap_text(text: str, label: str, max_chars: Optional[int] = None) -> str:
+    """Batas karakter yang sama untuk format yang tidak di-stream (PDF, OCR gambar)."""
+    max_chars = EXTRACT_MAX_CHARS if max_chars is None else max_chars
+    if len(text) <= max_chars:
+        return text
+    logger.warning("%s extraction truncated at %d chars", label, max_chars)
+    return text[:max_chars]
+
+
+# ---------------- DOCX ----------------
+def iter_docx(file_path: str) -> Iterator[str]:
+    """
+    Paragraf dari word/document.xml dibaca dengan iterparse (termasuk paragraf
+    di dalam tabel); elemen yang sudah diproses dibuang supaya memori tetap kecil.
+    """
+    with ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        for _, elem in ET.iterparse(xml, events=("end",)):
+            if elem.tag != f"{_W}p":
+                continue
+            # Paragraf bersarang (text box) sudah di-yield dan di-clear lebih dulu
+            pieces = []
+            for node in elem.iter():
+                if node.tag == f"{_W}t":
+                    pieces.append(node.text or "")
+                elif node.tag == f"{_W}tab":
+                    pieces.append("\t")
+                elif node.tag in (f"{_W}br", f"{_W}cr"):
+                    pieces.append("\n")
+            elem.clear()
+            yield "".join(pieces) + "\n"
+
+
+# ---------------- Excel ----------------
+def iter_xlsx(file_path: str) -> Iterator[str]:
+    # read_only: baris di-stream dari XML sheet, bukan seluruh model workbook
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            for row in ws.iter_rows(values_only=True):
+                yield " ".join(str(cell) for cell in row if cell is not None) + "\n"
+    finally:
+        wb.close()
+
+
+def iter_xls(file_path: str) -> Iterator[str]:
+    # Format biner lama: xlrd memuat per sheet (on_demand), sheet dilepas setelah dibaca
+    from xlrd import open_workbook
+
+    book = open_workbook(file_path, on_demand=True)
+    try:
+        for index in range(book.nsheets):
+            sheet = book.sheet_by_index(index)
+            for row_idx in range(sheet.nrows):
+                yield " ".join(str(cell) for cell in sheet.row_values(row_idx) if cell) + "\n"
+            book.unload_sheet(index)
+    finally:
+        book.release_resources()
+
+
+# ---------------- CSV / JSON / plain text ----------------
+def _iter_csv_rows(stream) -> Iterator[str]:
+    for row in csv.reader(stream):
+        yield "\t".join(row) + "\n"
+
+
+def iter_csv(file_path: str) -> Iterator[str]:
+    with open(file_path, newline="", encoding="utf-8", errors="ignore") as f:
+        yield from _iter_csv_rows(f)
+
+
+def iter_json(file_path: str) -> Iterator[str]:
+    # json tidak punya parser streaming di stdlib; ukuran file sudah dibatasi saat upload
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    for line in json.dumps(data, indent=2, ensure_ascii=False).splitlines(keepends=True):
+        yield line
+
+
+def _iter_plain(stream) -> Iterator[str]:
+    # Dibaca per blok (bukan per baris) supaya file satu baris raksasa tetap dibatasi
+    while True:
+        chunk = stream.read(_TEXT_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_plain(file_path: str) -> Iterator[str]:
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        yield from _iter_plain(f)
+
+
+EXTRACTORS: Dict[str, Callable[[str], Iterator[str]]] = {
+    ".docx": iter_docx,
+    ".xlsx": iter_xlsx,
+    ".xls": iter_xls,
+    ".csv": iter_csv,
+    ".json": iter_json,
+}
+
+
+def extract(file_path: str, ext: str) -> str:
+    """Teks dari format non-OCR; ekstensi yang tidak dikenal dibaca sebagai plain text."""
+    extractor = EXTRACTORS.get(ext, iter_plain)
+    return collect(extractor(file_path), ext.lstrip(".") or "text")
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Optional, Tuple
+
+import aiohttp
+
+from app.utils import metrics
+
+TRADECHAIN_BACKEND_URL = os.getenv("TRADECHAIN_BACKEND_URL")
+INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
+
+# -------------------- Konfigurasi koneksi --------------------
+TRADECHAIN_TIMEOUT = float(os.getenv("TRADECHAIN_TIMEOUT", "10"))
+TRADECHAIN_CONNECT_TIMEOUT = float(os.getenv("TRADECHAIN_CONNECT_TIMEOUT", "3"))
+TRADECHAIN_MAX_CONNECTIONS = int(os.getenv("TRADECHAIN_MAX_CONNECTIONS", "20"))
+TRADECHAIN_MAX_CONCURRENCY = int(os.getenv("TRADECHAIN_MAX_CONCURRENCY", "10"))
+TRADECHAIN_RETRIES = int(os.getenv("TRADECHAIN_RETRIES", "3"))
+TRADECHAIN_BACKOFF = float(os.getenv("TRADECHAIN_BACKOFF", "0.5"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Request non-idempotent (POST) mungkin sudah diproses kalau server membalas 5xx
+# atau koneksi putus di tengah; hanya status yang pasti "belum diproses" yang di-retry
+UNSAFE_RETRY_STATUSES = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class TradeChainClient:
+    """
+    Client HTTP async bersama untuk endpoint internal TradeChain.
+
+    - Satu aiohttp.ClientSession dengan connection pool keep-alive
+      (tidak buka TCP/TLS baru per request).
+    - Concurrency dibatasi semaphore, timeout bisa dikonfigurasi.
+    - Retry dengan exponential backoff + jitter untuk error koneksi,
+      timeout, 429 dan 5xx. Request non-idempotent hanya di-retry kalau
+      koneksi gagal dibuka atau server membalas 429/503.
+
+    base_url bisa diarahkan ke server lokal (mis. aiohttp test server) untuk testing.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        timeout: float = TRADECHAIN_TIMEOUT,
+        connect_timeout: float = TRADECHAIN_CONNECT_TIMEOUT,
+        max_connections: int = TRADECHAIN_MAX_CONNECTIONS,
+        max_concurrency: int = TRADECHAIN_MAX_CONCURRENCY,
+        retries: int = TRADECHAIN_RETRIES,
+        backoff: float = TRADECHAIN_BACKOFF,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Session harus dibuat di dalam event loop yang berjalan
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30),
+                timeout=self.timeout,
+                headers={
+                    "x-internal-key": self.api_key,
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._session
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json: Any = None,
+        endpoint: Optional[str] = None,
+        idempotent: Optional[bool] = None,
+    ) -> Tuple[int, str]:
+        """
+        Kirim request; return (status_code, body).
+        Exception terakhir di-raise kalau semua percobaan gagal karena error koneksi/timeout.
+        endpoint: label metric kyc_tradechain_request_seconds (default path; path yang
+        mengandung id sebaiknya diberi nama tetap).
+        idempotent: default dari method (POST / PATCH tidak); isi True untuk endpoint
+        yang aman diulang supaya ikut retry penuh.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            status, body = await self._request(method, path, json, idempotent)
+            outcome = str(status)
+            return status, body
+        finally:
+            metrics.observe("tradechain", time.perf_counter() - start, endpoint or path, outcome)
+
+    async def _request(self, method: str, path: str, json: Any, idempotent: bool) -> Tuple[int, str]:
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        retry_statuses = RETRY_STATUSES if idempotent else UNSAFE_RETRY_STATUSES
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self._semaphore:
+                    async with self._get_session().request(method, url, json=json) as resp:
+                        body = await resp.text()
+                if resp.status not in retry_statuses or attempt > self.retries:
+                    return resp.status, body
+            except aiohttp.ClientConnectorError:
+                # Koneksi tidak pernah terbuka: request belum terkirim, aman diulang
+                if attempt > self.retries:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if not idempotent or attempt > self.retries:
+                    raise
+
+            delay = self.backoff * (2 ** (attempt - 1))
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_client: Optional[TradeChainClient] = None
+
+
+def get_tradechain_client() -> Optional[TradeChainClient]:
+    """Client bersama dari env; None kalau TRADECHAIN_BACKEND_URL / INTERNAL_API_KEY belum diset."""
+    global _client
+    if _client is None and TRADECHAIN_BACKEND_URL and INTERNAL_API_KEY:
+        _client = TradeChainClient(TRADECHAIN_BACKEND_URL, INTERNAL_API_KEY)
+    return _client
+
+
+async def close_tradechain_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+    _client = None
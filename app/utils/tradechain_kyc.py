@@ -1,12 +1,12 @@
+import logging
 from typing import Optional, Dict
-import requests
-import os
 
-TRADECHAIN_BACKEND_URL = os.getenv("TRADECHAIN_BACKEND_URL")
-INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
+from app.utils.tradechain_client import get_tradechain_client
 
+logger = logging.getLogger(__name__)
 
-def update_kyc_internal(
+
+async def update_kyc_internal(
     token_id: str,
     status: Optional[str] = None,
     signature: Optional[str] = None,
@@ -18,11 +18,11 @@ def update_kyc_internal(
     Kirim update internal KYC ke TradeChain backend.
     Tidak perlu model lokal karena data KYC ada di Firestore TradeChain.
     """
-    if not TRADECHAIN_BACKEND_URL or not INTERNAL_API_KEY:
-        print("❌ Missing TRADECHAIN_BACKEND_URL or INTERNAL_API_KEY")
+    client = get_tradechain_client()
+    if client is None:
+        logger.error("Missing TRADECHAIN_BACKEND_URL or INTERNAL_API_KEY")
         return False
 
-    url = f"{TRADECHAIN_BACKEND_URL.rstrip('/')}/kyc/internal/{token_id}/status"
     payload: Dict = {}
     if status:
         payload["status"] = status
@@ -36,21 +36,16 @@ def update_kyc_internal(
         payload["remarks"] = remarks
 
     try:
-        resp = requests.patch(
-            url,
-            json=payload,
-            headers={
-                "x-internal-key": INTERNAL_API_KEY,
-                "Content-Type": "application/json",
-            },
-            timeout=10
+        status_code, body = await client.request(
+            "PATCH", f"/kyc/internal/{token_id}/status", json=payload, endpoint="kyc_status",
+            idempotent=True,  # set status absolut, aman diulang
         )
-        if resp.status_code in (200, 201):
-            print(f"✅ KYC {token_id} updated internally")
+        if status_code in (200, 201):
+            logger.info("KYC %s updated internally", token_id)
             return True
         else:
-            print(f"⚠️ Failed to update KYC: {resp.status_code} {resp.text}")
+            logger.warning("Failed to update KYC %s: %s %s", token_id, status_code, body)
             return False
     except Exception as e:
-        print(f"❌ Error updating KYC: {e}")
+        logger.error("Error updating KYC %s: %s", token_id, e)
         return False
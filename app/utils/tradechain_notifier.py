@@ -1,19 +1,19 @@
-import os
-import requests
+import logging
 
-TRADECHAIN_BACKEND_URL = os.getenv("TRADECHAIN_BACKEND_URL")
-INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
+from app.utils.tradechain_client import get_tradechain_client
 
-def send_tradechain_notification(user_id: str, executor_id: str, notif_type: str, title: str, message: str, extra_data: dict = None):
+logger = logging.getLogger(__name__)
+
+
+async def send_tradechain_notification(user_id: str, executor_id: str, notif_type: str, title: str, message: str, extra_data: dict = None):
     """
     Kirim notifikasi ke backend TradeChain (via endpoint internal)
     """
-    if not TRADECHAIN_BACKEND_URL or not INTERNAL_API_KEY:
-        print("❌ Missing TRADECHAIN_BACKEND_URL or INTERNAL_API_KEY")
+    client = get_tradechain_client()
+    if client is None:
+        logger.error("Missing TRADECHAIN_BACKEND_URL or INTERNAL_API_KEY")
         return False
 
-    url = f"{TRADECHAIN_BACKEND_URL.rstrip('/')}/notification/internal"
-
     payload = {
         "userId": user_id,
         "executorId": executor_id,
@@ -24,16 +24,13 @@ def send_tradechain_notification(user_id: str, executor_id: str, notif_type: str
     }
 
     try:
-        resp = requests.post(url, json=payload, headers={
-            "x-internal-key": INTERNAL_API_KEY,
-            "Content-Type": "application/json",
-        })
-        if resp.status_code == 201:
-            print(f"✅ Notification sent to TradeChain backend for user {user_id}")
+        status_code, body = await client.request("POST", "/notification/internal", json=payload, endpoint="notification")
+        if status_code == 201:
+            logger.info("Notification sent to TradeChain backend for user %s", user_id)
             return True
         else:
-            print(f"⚠️ Notification failed: {resp.status_code} {resp.text}")
+            logger.warning("Notification failed: %s %s", status_code, body)
             return False
     except Exception as e:
-        print(f"❌ Error sending notification: {e}")
+        logger.error("Error sending notification: %s", e)
         return False
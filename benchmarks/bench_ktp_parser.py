@@ -0,0 +1,99 @@
+"""
+Microbenchmark parser KTP: throughput pada teks OCR biasa dan waktu terburuk
+pada input adversarial (baris panjang, tanpa label, banyak tanggal).
+
+    python benchmarks/bench_ktp_parser.py [--iterations 2000] [--processes 1]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.ktp_parser import parse_ktp, parse_ktp_batch  # noqa: E402
+
+LABELLED = """PROVINSI DKI JAKARTA
+JAKARTA BARAT
+NIK : 3171234567890123
+Nama : MIRA SETIAWAN
+Tempat/Tgl Lahir : JAKARTA, 18-02-1986
+Jenis Kelamin : PEREMPUAN Gol. Darah : B
+Alamat : JL. PASTI CEPAT A7/66
+RT/RW : 007/008
+Kel/Desa : PEGADUNGAN
+Kecamatan : KALIDERES
+Agama : ISLAM
+Status Perkawinan : KAWIN
+Pekerjaan : PEGAWAI SWASTA
+Kewarganegaraan : WNI
+Berlaku Hingga : 22-02-2017
+JAKARTA BARAT
+02-12-2012
+"""
+
+# Kolom nilai saja (label ter-OCR sebagai blok terpisah)
+VALUES_ONLY = """PROVINSI JAWA BARAT
+KABUPATEN BANDUNG
+3204123456789012
+BUDI SANTOSO
+BANDUNG, 01-05-1990
+LAKI-LAKI
+JL. MERDEKA NO 10
+003/004
+SUKAMAJU
+CIBIRU
+ISLAM
+BELUM KAWIN
+KARYAWAN SWASTA
+WNI
+SEUMUR HIDUP
+BANDUNG
+10-10-2015
+"""
+
+ADVERSARIAL = {
+    # huruf panjang tanpa koma sebelum tanggal -> backtracking pada pola tempat lahir lama
+    "long_letter_run": "3204123456789012 " + "A " * 20000 + "01-05-1990 WNI",
+    # NIK diikuti teks panjang tanpa tempat lahir yang cocok
+    "nik_without_place": "3204123456789012 : " + "NAMA " * 20000 + "X, 01-05-1990",
+    # agama jauh dari kewarganegaraan
+    "religion_far_from_citizen": "ISLAM " + ": " * 30000 + "WNI",
+    "many_dates": " ".join("01-01-2000" for _ in range(20000)),
+    "many_lines": "\n".join("Nama : " + "B" * 40 for _ in range(20000)),
+}
+
+
+def _throughput(texts, processes: int) -> float:
+    start = time.perf_counter()
+    parse_ktp_batch(texts, processes=processes)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def _worst_case(text: str, repeat: int = 3) -> float:
+    worst = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_ktp(text)
+        worst = max(worst, time.perf_counter() - start)
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'case':<28}{'docs/s':>12}")
+    for name, text in (("labelled", LABELLED), ("values_only", VALUES_ONLY)):
+        rate = _throughput([text] * args.iterations, args.processes)
+        print(f"{name:<28}{rate:>12.0f}")
+
+    print(f"\n{'adversarial case':<28}{'chars':>10}{'worst ms':>12}")
+    for name, text in ADVERSARIAL.items():
+        print(f"{name:<28}{len(text):>10}{_worst_case(text) * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
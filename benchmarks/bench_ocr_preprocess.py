@@ -0,0 +1,67 @@
+"""
+Bandingkan pipeline preprocessing OCR pada kumpulan foto KTP: waktu
+preprocessing + tesseract per gambar dan hit-rate field parse_ktp.
+
+    python benchmarks/bench_ocr_preprocess.py <folder_gambar> \
+        [--pipelines invert draft,exif,crop,deskew,threshold]
+
+"invert" = perilaku lama (resolusi penuh, grayscale + invert).
+Butuh tesseract terpasang. Cache OCR tidak dipakai di sini.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils import image_preprocess  # noqa: E402
+from app.utils.file_utils import _tesseract  # noqa: E402
+from app.utils.ktp_parser import FIELD_NAMES, parse_ktp  # noqa: E402
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".webp")
+
+
+def _run(paths, steps):
+    prep_total = ocr_total = 0.0
+    field_hits = dict.fromkeys(FIELD_NAMES, 0)
+    for path in paths:
+        img, timings = image_preprocess.preprocess_image(path, steps)
+        prep_total += sum(timings.values())
+        start = time.perf_counter()
+        text = _tesseract(img, "image")
+        ocr_total += time.perf_counter() - start
+        for field, value in parse_ktp(text).items():
+            field_hits[field] += bool(value)
+    return prep_total, ocr_total, field_hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder")
+    parser.add_argument("--pipelines", nargs="+", default=["invert", image_preprocess.OCR_PREPROCESS_STEPS])
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.folder, name)
+        for name in os.listdir(args.folder)
+        if name.lower().endswith(IMAGE_EXTS)
+    )
+    if not paths:
+        sys.exit(f"No images in {args.folder}")
+
+    results = {}
+    for spec in args.pipelines:
+        steps = image_preprocess.parse_steps(spec)
+        prep, ocr, hits = _run(paths, steps)
+        results[spec] = hits
+        print(f"{image_preprocess.describe(steps)}")
+        print(f"  preprocess {prep / len(paths) * 1000:8.0f} ms/img   ocr {ocr / len(paths) * 1000:8.0f} ms/img")
+
+    print(f"\n{'field hit-rate':<20}" + "".join(f"{spec[:24]:>26}" for spec in results))
+    for field in FIELD_NAMES:
+        print(f"{field:<20}" + "".join(f"{hits[field] / len(paths):>26.0%}" for hits in results.values()))
+
+
+if __name__ == "__main__":
+    main()
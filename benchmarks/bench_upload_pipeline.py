@@ -0,0 +1,382 @@
+"""
+Benchmark end-to-end pipeline upload: kyc_service asli (ingest, dedup, Draft,
+ekstraksi di process pool, log OCR, mint lewat TransactionManager) dengan
+stand-in lokal untuk Firestore, node Ethereum dan TradeChain.
+
+    python benchmarks/bench_upload_pipeline.py --concurrency 1 4 16 --docs 40
+    python benchmarks/bench_upload_pipeline.py --scenario batch --batch-size 10
+    python benchmarks/bench_upload_pipeline.py --review           # + review_document & outbox
+    python benchmarks/bench_upload_pipeline.py --compare benchmarks/results/upload-<ts>.json
+
+Firestore: --firestore memory (default, double in-memory dengan latency RPC
+simulasi) atau --firestore emulator (pakai FIRESTORE_EMULATOR_HOST; database
+emulator dikosongkan tiap level). Butuh dependency requirements.txt plus
+tesseract & poppler untuk jalur OCR.
+
+Output: p50/p95/p99 latency per dokumen dan per stage (lihat app.utils.stage_timer)
+untuk tiap level concurrency, disimpan sebagai JSON untuk dibandingkan antar run.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+WALLET = "0x" + "be" * 20
+
+
+class BenchUpload:
+    """Pengganti UploadFile: filename + async read(size)."""
+
+    def __init__(self, path: str):
+        self.filename = os.path.basename(path)
+        self._file = open(path, "rb")
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def close(self):
+        self._file.close()
+
+
+# -------------------- Statistik --------------------
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(values: List[float]) -> Optional[dict]:
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": max(values) * 1000,
+    }
+
+
+def summarize_stages(records: List[Dict[str, float]]) -> dict:
+    names = sorted({name for record in records for name in record})
+    return {name: summarize([r[name] for r in records if name in r]) for name in names}
+
+
+# -------------------- Lingkungan --------------------
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+async def _clear_emulator():
+    import aiohttp
+
+    host = os.environ["FIRESTORE_EMULATOR_HOST"]
+    project = os.getenv("GOOGLE_CLOUD_PROJECT", "demo-kyc")
+    url = f"http://{host}/emulator/v1/projects/{project}/databases/(default)/documents"
+    async with aiohttp.ClientSession() as session:
+        async with session.delete(url) as resp:
+            resp.raise_for_status()
+
+
+async def _reset_state(args, fakes, chain, kyc_service):
+    """Tiap level mulai dari Firestore, chain dan cache kosong (corpus yang sama dipakai ulang)."""
+    if args.firestore == "memory":
+        fakes.MemoryFirestore.reset()
+    else:
+        await _clear_emulator()
+    chain.reset()
+    kyc_service._hash_index.clear()
+    kyc_service._document_cache.clear()
+
+
+# -------------------- Skenario --------------------
+async def _run_save(kyc_service, parse_ktp, record_stages, paths, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+    latencies, stages, errors, documents = [], [], [], []
+
+    async def one(path):
+        async with slots:
+            upload = BenchUpload(path)
+            start = time.perf_counter()
+            try:
+                with record_stages() as timings:
+                    document = await kyc_service.save_document(WALLET, upload, parser_hook=parse_ktp)
+            except Exception as e:
+                errors.append(f"{os.path.basename(path)}: {type(e).__name__}: {e}")
+                return
+            finally:
+                upload.close()
+            latencies.append(time.perf_counter() - start)
+            stages.append(timings)
+            documents.append(document)
+
+    await asyncio.gather(*(one(p) for p in paths))
+    return latencies, stages, errors, documents
+
+
+async def _run_batch(kyc_service, parse_ktp, record_stages, paths, concurrency, batch_size):
+    """Per request batch; latency per file dihitung dari awal request sampai barisnya keluar."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies, stages, errors, documents = [], [], [], []
+
+    async def one(chunk):
+        async with slots:
+            uploads = [BenchUpload(p) for p in chunk]
+            start = time.perf_counter()
+            try:
+                with record_stages() as timings:
+                    results = await kyc_service.save_documents_batch(WALLET, uploads, parser_hook=parse_ktp)
+                    async for item in results:
+                        if item.status == "error":
+                            errors.append(f"{item.file_name}: {item.error}")
+                            continue
+                        latencies.append(time.perf_counter() - start)
+                        documents.append(item.document)
+            except Exception as e:
+                errors.append(f"batch: {type(e).__name__}: {e}")
+                return
+            finally:
+                for upload in uploads:
+                    upload.close()
+            stages.append(timings)  # stage dijumlah per request batch
+
+    chunks = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    await asyncio.gather(*(one(c) for c in chunks))
+    return latencies, stages, errors, documents
+
+
+async def _run_review(kyc_service, record_stages, documents, concurrency, stub, drain_timeout):
+    slots = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+    enqueued_at = {}
+
+    async def one(document):
+        async with slots:
+            start = time.perf_counter()
+            try:
+                ok = await kyc_service.review_document(document.id)
+            except Exception as e:
+                errors.append(f"{document.id}: {type(e).__name__}: {e}")
+                return
+            if not ok:
+                errors.append(f"{document.id}: review rejected")
+                return
+            latencies.append(time.perf_counter() - start)
+            enqueued_at[str(document.token_id)] = time.monotonic()
+
+    await asyncio.gather(*(one(d) for d in documents if d.token_id))
+
+    # Tunggu dispatcher outbox mengirim semua update ke stub
+    deadline = time.monotonic() + drain_timeout
+    while time.monotonic() < deadline and not all(t in stub.received_at for t in enqueued_at):
+        await asyncio.sleep(0.02)
+    delivery = [stub.received_at[t] - enqueued_at[t] for t in enqueued_at if t in stub.received_at]
+    undelivered = len(enqueued_at) - len(delivery)
+    if undelivered:
+        errors.append(f"{undelivered} status update(s) not delivered within {drain_timeout:.0f}s")
+    return latencies, delivery, errors
+
+
+# -------------------- Main --------------------
+def _print_level(level: dict):
+    lat = level["latency"] or {}
+    print(f"\nconcurrency {level['concurrency']}: {level['completed']}/{level['docs']} docs in "
+          f"{level['wall_s']:.2f}s ({level['throughput_docs_s']:.2f} docs/s), errors {len(level['errors'])}")
+    if lat:
+        print(f"  {'total':<14}{lat['p50_ms']:>10.0f}{lat['p95_ms']:>10.0f}{lat['p99_ms']:>10.0f}   ms p50/p95/p99")
+    for name, s in level["stages"].items():
+        if s:
+            print(f"  {name:<14}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+    for key in ("review_latency", "outbox_delivery"):
+        s = level.get(key)
+        if s:
+            print(f"  {key:<14}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+    for error in level["errors"][:5]:
+        print(f"  ! {error}")
+
+
+def _compare(previous_path: str, current: dict):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    before = {lvl["concurrency"]: lvl for lvl in previous.get("levels", [])}
+    print(f"\nvs {previous_path} ({previous.get('meta', {}).get('git_revision')})")
+    for level in current["levels"]:
+        old = before.get(level["concurrency"])
+        if not old or not old.get("latency") or not level.get("latency"):
+            continue
+
+        def delta(new, prev):
+            return f"{(new - prev) / prev * 100:+.1f}%" if prev else "n/a"
+
+        print(f"  concurrency {level['concurrency']}: "
+              f"throughput {delta(level['throughput_docs_s'], old['throughput_docs_s'])}, "
+              f"p50 {delta(level['latency']['p50_ms'], old['latency']['p50_ms'])}, "
+              f"p95 {delta(level['latency']['p95_ms'], old['latency']['p95_ms'])}, "
+              f"p99 {delta(level['latency']['p99_ms'], old['latency']['p99_ms'])}")
+
+
+async def main(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="kyc_bench_")
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ["OCR_CACHE_ENABLED"] = "true" if args.ocr_cache else "false"
+    os.environ["OCR_CACHE_DIR"] = os.path.join(workdir, "ocr_cache")
+    os.environ.setdefault("OCR_CACHE_KEY", os.urandom(32).hex())  # cache disk terenkripsi
+    os.environ["BLOB_STORE_DIR"] = os.path.join(workdir, "blobs")
+    os.environ.setdefault("BLOB_STORE_KEY", os.urandom(32).hex())
+    os.environ["OUTBOX_DB_PATH"] = os.path.join(workdir, "outbox.sqlite3")
+    os.environ["OUTBOX_POLL_INTERVAL"] = "0.05"
+
+    from benchmarks import fakes
+    from benchmarks.corpus import KINDS, generate_corpus, load_corpus
+    from benchmarks.tradechain_stub import TradeChainStub
+
+    stub = TradeChainStub(latency=args.tradechain_latency_ms / 1000)
+    os.environ["TRADECHAIN_BACKEND_URL"] = await stub.start()
+    os.environ["INTERNAL_API_KEY"] = "bench"
+
+    if args.corpus:
+        paths = load_corpus(args.corpus)[:args.docs]
+    else:
+        start = time.perf_counter()
+        kinds = tuple(args.kinds or KINDS)
+        paths = await asyncio.to_thread(generate_corpus, os.path.join(workdir, "corpus"), args.docs, kinds)
+        print(f"Generated {len(paths)} fixture documents ({', '.join(kinds)}) in {time.perf_counter() - start:.1f}s")
+
+    if args.firestore == "memory":
+        fakes.install_memory_firestore(rpc_latency=args.firestore_latency_ms / 1000)
+    elif not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("--firestore emulator needs FIRESTORE_EMULATOR_HOST")
+    chain = fakes.FakeChain(block_time=args.block_time, rpc_latency=args.rpc_latency_ms / 1000)
+    fakes.install_fake_chain(chain)
+
+    # TEMP_FOLDER / data relatif terhadap cwd
+    os.chdir(workdir)
+    from app.services import kyc_service, tradechain_outbox
+    from app.utils.extraction_pool import shutdown_extraction_pool
+    from app.utils.ktp_parser import parse_ktp
+    from app.utils.stage_timer import record_stages
+    from app.utils.tradechain_client import close_tradechain_client
+
+    if args.review:
+        tradechain_outbox.start_dispatcher()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "corpus": [os.path.basename(p) for p in paths],
+        },
+        "levels": [],
+    }
+
+    try:
+        # Pemanasan: spawn process pool ekstraksi + import di worker tidak ikut diukur
+        await _reset_state(args, fakes, chain, kyc_service)
+        await _run_save(kyc_service, parse_ktp, record_stages, paths[:1], 1)
+
+        for concurrency in args.concurrency:
+            await _reset_state(args, fakes, chain, kyc_service)
+            start = time.perf_counter()
+            if args.scenario == "batch":
+                latencies, stages, errors, documents = await _run_batch(
+                    kyc_service, parse_ktp, record_stages, paths, concurrency, args.batch_size)
+            else:
+                latencies, stages, errors, documents = await _run_save(
+                    kyc_service, parse_ktp, record_stages, paths, concurrency)
+            wall = time.perf_counter() - start
+
+            level = {
+                "concurrency": concurrency,
+                "scenario": args.scenario,
+                "docs": len(paths),
+                "completed": len(latencies),
+                "wall_s": wall,
+                "throughput_docs_s": len(latencies) / wall if wall else 0.0,
+                "latency": summarize(latencies),
+                "stages": summarize_stages(stages),
+                "errors": errors,
+            }
+            if args.review:
+                review, delivery, review_errors = await _run_review(
+                    kyc_service, record_stages, documents, concurrency, stub, args.drain_timeout)
+                level["review_latency"] = summarize(review)
+                level["outbox_delivery"] = summarize(delivery)
+                level["errors"] += review_errors
+            if args.firestore == "memory":
+                level["firestore_rpc_calls"] = fakes.MemoryFirestore.rpc_calls
+                level["firestore_commits"] = fakes.MemoryFirestore.commits
+            level["chain_rpc_calls"] = chain.rpc_calls
+
+            report["levels"].append(level)
+            _print_level(level)
+    finally:
+        if args.review:
+            await tradechain_outbox.stop_dispatcher()
+        await close_tradechain_client()
+        shutdown_extraction_pool()
+        await stub.stop()
+        os.chdir(REPO_ROOT)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--docs", type=int, default=40, help="dokumen per level concurrency")
+    parser.add_argument("--scenario", choices=("save", "batch"), default="save",
+                        help="save = save_document per file, batch = save_documents_batch")
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--review", action="store_true", help="review semua dokumen + tunggu outbox terkirim")
+    parser.add_argument("--corpus", help="folder dokumen sendiri (default: fixture sintetis)")
+    parser.add_argument("--kinds", nargs="+", help="jenis fixture sintetis, mis. jpg text.pdf docx")
+    parser.add_argument("--firestore", choices=("memory", "emulator"), default="memory")
+    parser.add_argument("--firestore-latency-ms", type=float, default=5)
+    parser.add_argument("--rpc-latency-ms", type=float, default=5, help="latency per panggilan node Ethereum")
+    parser.add_argument("--block-time", type=float, default=0.5, help="detik per block FakeChain")
+    parser.add_argument("--tradechain-latency-ms", type=float, default=20)
+    parser.add_argument("--drain-timeout", type=float, default=30)
+    parser.add_argument("--ocr-cache", action="store_true", help="aktifkan cache OCR (default mati)")
+    parser.add_argument("--output", help="file JSON hasil (default benchmarks/results/upload-<timestamp>.json)")
+    parser.add_argument("--compare", help="JSON run sebelumnya untuk dibandingkan")
+    parser.add_argument("--keep-workdir", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results",
+        f"upload-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json",
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        _compare(args.compare, report)
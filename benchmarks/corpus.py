@@ -0,0 +1,119 @@
+"""
+Fixture corpus untuk benchmark: dokumen KYC sintetis yang dibuat saat runtime
+(tidak ada file binary di repo). Tiap file punya NIK unik sehingga hash-nya
+berbeda dan tidak kena dedup.
+
+Jenis: jpg (foto KTP di atas background), scan.pdf (PDF gambar → OCR),
+text.pdf (PDF dengan text layer), docx, xlsx.
+"""
+import os
+from typing import List
+
+KINDS = ("jpg", "scan.pdf", "text.pdf", "docx", "xlsx")
+
+
+def _ktp_lines(i: int) -> List[str]:
+    return [
+        "PROVINSI DKI JAKARTA",
+        "JAKARTA BARAT",
+        f"NIK : 3171{i:012d}",
+        f"Nama : PEMOHON NOMOR {i}",
+        "Tempat/Tgl Lahir : JAKARTA, 18-02-1986",
+        "Jenis Kelamin : PEREMPUAN Gol. Darah : B",
+        "Alamat : JL. PASTI CEPAT A7/66",
+        "RT/RW : 007/008",
+        "Kel/Desa : PEGADUNGAN",
+        "Kecamatan : KALIDERES",
+        "Agama : ISLAM",
+        "Status Perkawinan : KAWIN",
+        "Pekerjaan : PEGAWAI SWASTA",
+        "Kewarganegaraan : WNI",
+        "Berlaku Hingga : SEUMUR HIDUP",
+    ]
+
+
+def _card_image(i: int, photo_size=(3000, 2250)):
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+    card = Image.new("RGB", (1700, 1080), (200, 220, 240))
+    draw = ImageDraw.Draw(card)
+    font = ImageFont.load_default(size=38)
+    for row, line in enumerate(_ktp_lines(i)):
+        draw.text((60, 40 + row * 66), line, fill=(20, 20, 20), font=font)
+    card = card.rotate(-3, expand=True, fillcolor=(90, 90, 90))
+
+    photo = Image.effect_noise(photo_size, 20).convert("RGB").filter(ImageFilter.GaussianBlur(3))
+    photo.paste(card, ((photo_size[0] - card.width) // 2, (photo_size[1] - card.height) // 2))
+    return photo
+
+
+def _text_pdf(path: str, lines: List[str]):
+    """PDF satu halaman dengan text layer (Helvetica), ditulis manual tanpa dependency."""
+    content = "BT /F1 12 Tf 50 780 Td 16 TL\n" + "".join(
+        "({}) '\n".format(line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")) for line in lines
+    ) + "ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        "/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for n, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{n} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_document(directory: str, kind: str, i: int) -> str:
+    """Buat satu dokumen fixture; return path-nya."""
+    path = os.path.join(directory, f"doc{i:05d}.{kind}")
+    lines = _ktp_lines(i)
+
+    if kind == "jpg":
+        _card_image(i).save(path, quality=90)
+    elif kind == "scan.pdf":
+        _card_image(i, photo_size=(1754, 1240)).convert("L").save(path, "PDF", resolution=150)
+    elif kind == "text.pdf":
+        _text_pdf(path, lines)
+    elif kind == "docx":
+        from docx import Document
+
+        doc = Document()
+        for line in lines:
+            doc.add_paragraph(line)
+        doc.save(path)
+    elif kind == "xlsx":
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        ws = wb.active
+        for line in lines:
+            label, _, value = line.partition(" : ")
+            ws.append([label, value])
+        wb.save(path)
+    else:
+        raise ValueError(f"Unknown fixture kind: {kind}")
+    return path
+
+
+def generate_corpus(directory: str, count: int, kinds=KINDS, start: int = 0) -> List[str]:
+    """count dokumen unik, jenisnya bergiliran sesuai kinds."""
+    os.makedirs(directory, exist_ok=True)
+    return [make_document(directory, kinds[i % len(kinds)], i) for i in range(start, start + count)]
+
+
+def load_corpus(directory: str) -> List[str]:
+    """Pakai file yang sudah ada (mis. sampel KTP asli yang sudah dianonimkan)."""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, name))
+    )
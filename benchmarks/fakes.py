@@ -0,0 +1,442 @@
+"""
+Stand-in lokal untuk benchmark pipeline upload tanpa layanan eksternal:
+
+- MemoryFirestore : double in-memory untuk subset google.cloud.firestore.AsyncClient
+                    yang dipakai kyc_service / job_queue, dengan latency RPC opsional
+- FakeChain       : "node" Ethereum in-process (nonce, mempool, block time, receipt)
+                    yang dipakai TransactionManager asli lewat objek mirip w3
+- install_*       : pasang fake sebelum modul app di-import
+"""
+import asyncio
+import copy
+import hashlib
+import itertools
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+# ==================== Firestore ====================
+def _apply_update(current: dict, fields: dict) -> dict:
+    data = dict(current)
+    for key, value in fields.items():
+        if type(value).__name__ == "ArrayUnion":
+            existing = list(data.get(key) or [])
+            data[key] = existing + [v for v in value.values if v not in existing]
+        else:
+            data[key] = copy.deepcopy(value)
+    return data
+
+
+class MemorySnapshot:
+    def __init__(self, reference: "MemoryDocument", data: Optional[dict]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+
+class MemoryDocument:
+    def __init__(self, store: "MemoryFirestore", collection: str, doc_id: str):
+        self._store = store
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def _key(self):
+        return self._collection, self.id
+
+    async def get(self, transaction=None) -> MemorySnapshot:
+        await self._store.rpc()
+        return MemorySnapshot(self, self._store.docs.get(self._key))
+
+    async def set(self, data: dict):
+        await self._store.rpc()
+        self._store.docs[self._key] = copy.deepcopy(data)
+
+    async def update(self, fields: dict):
+        await self._store.rpc()
+        self._store.apply_update(self._key, fields)
+
+
+class MemoryQuery:
+    def __init__(self, store: "MemoryFirestore", collection: str):
+        self._store = store
+        self._collection = collection
+        self._filters: List[tuple] = []
+        self._order: Optional[tuple] = None
+        self._limit: Optional[int] = None
+        self._fields: Optional[List[str]] = None
+        self._start_after: Optional[str] = None
+
+    def _copy(self) -> "MemoryQuery":
+        q = copy.copy(self)
+        q._filters = list(self._filters)
+        return q
+
+    def where(self, field: str, op: str, value: Any) -> "MemoryQuery":
+        if op != "==":
+            raise NotImplementedError(f"MemoryFirestore only supports '==' filters, got {op!r}")
+        q = self._copy()
+        q._filters.append((field, value))
+        return q
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "MemoryQuery":
+        q = self._copy()
+        q._order = (field, direction == "DESCENDING")
+        return q
+
+    def limit(self, count: int) -> "MemoryQuery":
+        q = self._copy()
+        q._limit = count
+        return q
+
+    def select(self, fields: List[str]) -> "MemoryQuery":
+        q = self._copy()
+        q._fields = list(fields)
+        return q
+
+    def start_after(self, snapshot: MemorySnapshot) -> "MemoryQuery":
+        q = self._copy()
+        q._start_after = snapshot.id
+        return q
+
+    def _run(self) -> List[MemorySnapshot]:
+        rows = [
+            (doc_id, data) for (col, doc_id), data in self._store.docs.items()
+            if col == self._collection and all(data.get(f) == v for f, v in self._filters)
+        ]
+        if self._order:
+            field, descending = self._order
+            rows.sort(key=lambda row: row[1].get(field), reverse=descending)
+        if self._start_after is not None:
+            ids = [doc_id for doc_id, _ in rows]
+            rows = rows[ids.index(self._start_after) + 1:] if self._start_after in ids else []
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        result = []
+        for doc_id, data in rows:
+            if self._fields is not None:
+                data = {f: data[f] for f in self._fields if f in data}
+            result.append(MemorySnapshot(MemoryDocument(self._store, self._collection, doc_id), data))
+        return result
+
+    async def get(self) -> List[MemorySnapshot]:
+        await self._store.rpc()
+        return self._run()
+
+    async def stream(self):
+        await self._store.rpc()
+        for snapshot in self._run():
+            yield snapshot
+
+
+class MemoryCollection(MemoryQuery):
+    def document(self, doc_id: Optional[str] = None) -> MemoryDocument:
+        return MemoryDocument(self._store, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+
+class MemoryBatch:
+    def __init__(self, store: "MemoryFirestore"):
+        self._store = store
+        self._ops: List[tuple] = []
+
+    def set(self, ref: MemoryDocument, data: dict):
+        self._ops.append(("set", ref, copy.deepcopy(data)))
+
+    def update(self, ref: MemoryDocument, fields: dict):
+        self._ops.append(("update", ref, fields))
+
+    async def commit(self):
+        await self._store.rpc()
+        # Atomik: validasi semua update dulu, baru terapkan
+        missing = [ref.id for op, ref, _ in self._ops if op == "update" and ref._key not in self._store.docs
+                   and not any(o == "set" and r._key == ref._key for o, r, _ in self._ops)]
+        if missing:
+            raise KeyError(f"No document to update: {missing[0]}")
+        for op, ref, data in self._ops:
+            if op == "set":
+                self._store.docs[ref._key] = data
+            else:
+                self._store.apply_update(ref._key, data)
+        type(self._store).commits += 1
+
+
+class MemoryTransaction(MemoryBatch):
+    pass
+
+
+class MemoryFirestore:
+    """
+    Pengganti firestore.AsyncClient. Semua instance berbagi satu store (seperti
+    satu project Firestore). rpc_latency disimulasikan per panggilan jaringan.
+    """
+
+    docs: Dict[tuple, dict] = {}
+    rpc_latency: float = 0.0
+    rpc_calls: int = 0
+    commits: int = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def rpc(self):
+        type(self).rpc_calls += 1
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+
+    def apply_update(self, key: tuple, fields: dict):
+        if key not in self.docs:
+            raise KeyError(f"No document to update: {key[1]}")
+        self.docs[key] = _apply_update(self.docs[key], fields)
+
+    def collection(self, name: str) -> MemoryCollection:
+        return MemoryCollection(self, name)
+
+    def batch(self) -> MemoryBatch:
+        return MemoryBatch(self)
+
+    def transaction(self) -> MemoryTransaction:
+        return MemoryTransaction(self)
+
+    @classmethod
+    def reset(cls):
+        cls.docs = {}
+        cls.rpc_calls = 0
+        cls.commits = 0
+
+
+def _memory_async_transactional(fn):
+    async def run(transaction: MemoryTransaction, *args, **kwargs):
+        result = await fn(transaction, *args, **kwargs)
+        await transaction.commit()
+        return result
+    return run
+
+
+def install_memory_firestore(rpc_latency: float = 0.0):
+    """Ganti firestore.AsyncClient (dan async_transactional) sebelum modul app di-import."""
+    from google.cloud import firestore
+
+    MemoryFirestore.reset()
+    MemoryFirestore.rpc_latency = rpc_latency
+    firestore.AsyncClient = MemoryFirestore
+    firestore.async_transactional = _memory_async_transactional
+    return MemoryFirestore
+
+
+# ==================== Chain ====================
+class FakeChain:
+    """
+    Node in-process: block baru tiap block_time detik, tx di mempool mined di
+    block berikutnya. rpc_latency disimulasikan per panggilan (sinkron, seperti
+    HTTPProvider). Menyediakan subset w3 yang dipakai TransactionManager.
+    Tx dengan fee di bawah base_fee tertahan di mempool (simulasi chain padat)
+    sampai di-replace dengan nonce sama dan fee lebih tinggi.
+    """
+
+    def __init__(self, block_time: float = 0.5, rpc_latency: float = 0.0, chain_id: int = 1337):
+        self.block_time = block_time
+        self.rpc_latency = rpc_latency
+        self.chain_id = chain_id
+        self.started = time.monotonic()
+        self.eth = self  # w3.eth.* → method di objek ini
+        self._lock = threading.Lock()
+        self._nonces: Dict[str, int] = {}
+        self._mempool: Dict[str, tuple] = {}     # tx_hash -> (block diterima, txn)
+        self._mined_nonces: Dict[str, int] = {}
+        self.base_fee = self.to_wei(1, "gwei")
+        self.replaced = 0
+        self._receipts: Dict[str, dict] = {}
+        self._token_ids = itertools.count(1)
+        self.hash_to_token: Dict[str, int] = {}
+        self.token_status: Dict[int, int] = {}   # 0 Draft, 1 Reviewed, 2 Signed
+        self.minters = set()
+        self.rpc_calls = 0
+
+    def reset(self):
+        """Lupakan token yang sudah di-mint (nonce & mempool tetap, TransactionManager masih memegangnya)."""
+        with self._lock:
+            self.hash_to_token.clear()
+            self.token_status.clear()
+            self.rpc_calls = 0
+
+    # --- util w3 ---
+    @staticmethod
+    def to_wei(value, unit: str) -> int:
+        return int(value * {"wei": 1, "gwei": 10 ** 9, "ether": 10 ** 18}[unit])
+
+    @staticmethod
+    def to_hex(value) -> str:
+        return value if isinstance(value, str) else "0x" + bytes(value).hex()
+
+    def _rpc(self):
+        self.rpc_calls += 1
+        if self.rpc_latency:
+            time.sleep(self.rpc_latency)
+
+    # --- block / mining ---
+    def _current_block(self) -> int:
+        return int((time.monotonic() - self.started) / self.block_time)
+
+    def _mine(self):
+        block = self._current_block()
+        # Seperti node asli: per pengirim urut nonce, tx murah menahan nonce di belakangnya
+        for tx_hash, (received, txn) in sorted(self._mempool.items(), key=lambda item: item[1][1]["nonce"]):
+            sender = txn["from"]
+            if txn["nonce"] != self._mined_nonces.get(sender, 0):
+                continue
+            if received < block and self._fee_cap(txn) >= self.base_fee:
+                del self._mempool[tx_hash]
+                self._mined_nonces[sender] = txn["nonce"] + 1
+                status = self._execute(txn["call"])
+                self._receipts[tx_hash] = {"transactionHash": tx_hash, "blockNumber": received + 1, "status": status}
+
+    def _execute(self, call: tuple) -> int:
+        name, args = call
+        if name == "verifyAndMint":
+            _, file_hash, _ = args
+            if file_hash in self.hash_to_token:
+                return 0
+            token_id = next(self._token_ids)
+            self.hash_to_token[file_hash] = token_id
+            self.token_status[token_id] = 0
+        elif name == "reviewDocument":
+            self.token_status[args[0]] = 1
+        elif name == "signDocument":
+            self.token_status[args[0]] = 2
+        elif name == "addMinter":
+            self.minters.add(args[0])
+        return 1
+
+    def is_connected(self) -> bool:
+        return True
+
+    @property
+    def block_number(self) -> int:
+        self._rpc()
+        with self._lock:
+            self._mine()
+            return self._current_block()
+
+    def get_block(self, block_identifier="latest") -> dict:
+        self._rpc()
+        with self._lock:
+            return {"number": self._current_block(), "baseFeePerGas": self.base_fee}
+
+    @property
+    def max_priority_fee(self) -> int:
+        self._rpc()
+        return self.to_wei(1, "gwei")
+
+    @staticmethod
+    def _fee_cap(txn: dict) -> int:
+        return txn.get("maxFeePerGas", txn.get("gasPrice", 0))
+
+    def get_transaction_count(self, address: str, block_identifier: str = "latest") -> int:
+        self._rpc()
+        with self._lock:
+            return self._nonces.get(address, 0)
+
+    def send_raw_transaction(self, raw: dict) -> bytes:
+        self._rpc()
+        with self._lock:
+            queued = [(h, txn) for h, (_, txn) in self._mempool.items()
+                      if txn["from"] == raw["from"] and txn["nonce"] == raw["nonce"]]
+            if queued:
+                # Replacement: nonce sama, fee minimal +10%
+                old_hash, old = queued[0]
+                if self._fee_cap(raw) * 10 < self._fee_cap(old) * 11:
+                    raise ValueError("replacement transaction underpriced")
+                del self._mempool[old_hash]
+                self.replaced += 1
+            else:
+                expected = self._nonces.get(raw["from"], 0)
+                if raw["nonce"] != expected:
+                    raise ValueError(f"nonce too {'low' if raw['nonce'] < expected else 'high'}: {raw['nonce']} != {expected}")
+                self._nonces[raw["from"]] = expected + 1
+            tx_hash = hashlib.sha256(f"{raw['from']}:{raw['nonce']}:{raw['call']}:{self._fee_cap(raw)}".encode()).digest()
+            self._mempool[self.to_hex(tx_hash)] = (self._current_block(), raw)
+            return tx_hash
+
+    def get_transaction_receipt(self, tx_hash: str) -> dict:
+        from web3.exceptions import TransactionNotFound
+
+        self._rpc()
+        with self._lock:
+            self._mine()
+            receipt = self._receipts.get(tx_hash)
+        if receipt is None:
+            raise TransactionNotFound(f"Transaction {tx_hash} not found")
+        return receipt
+
+    def call(self, name: str, *args):
+        self._rpc()
+        with self._lock:
+            self._mine()
+            if name == "getTokenIdByHash":
+                return self.hash_to_token.get(args[0], 0)
+            if name == "getStatus":
+                return self.token_status.get(args[0], 0)
+            if name == "isMinter":
+                return args[0] in self.minters
+        raise NotImplementedError(name)
+
+
+class FakeContractCall:
+    def __init__(self, chain: FakeChain, name: str, args: tuple):
+        self._chain = chain
+        self.name = name
+        self.fn_name = name
+        self.args = args
+
+    def build_transaction(self, params: dict) -> dict:
+        return {**params, "chainId": self._chain.chain_id, "call": (self.name, self.args)}
+
+    def call(self):
+        return self._chain.call(self.name, *self.args)
+
+    def estimate_gas(self, params: Optional[dict] = None, block_identifier=None) -> int:
+        return 100_000
+
+
+class FakeContract:
+    def __init__(self, chain: FakeChain):
+        self.functions = SimpleNamespace(**{
+            name: (lambda n: lambda *args: FakeContractCall(chain, n, args))(name)
+            for name in ("verifyAndMint", "reviewDocument", "signDocument", "addMinter",
+                         "getTokenIdByHash", "getStatus", "isMinter")
+        })
+
+
+class FakeAccount:
+    address = "0x" + "ad" * 20
+
+    def sign_transaction(self, txn: dict):
+        return SimpleNamespace(raw_transaction=txn)
+
+    def sign_message(self, message):
+        digest = hashlib.sha256(repr(message).encode()).digest()
+        return SimpleNamespace(signature=digest + digest + b"\x1b")
+
+
+def install_fake_chain(chain: FakeChain, poll_interval: float = 0.05):
+    """
+    Arahkan app.services.blockchain_service (client-nya lazy) ke FakeChain:
+    w3, kontrak, akun admin dan TransactionManager asli di atas chain palsu.
+    """
+    from app.services import blockchain_service
+    from app.services.tx_manager import TransactionManager
+
+    account = FakeAccount()
+    with blockchain_service._init_lock:
+        blockchain_service._w3 = chain
+        blockchain_service._contract = FakeContract(chain)
+        blockchain_service._admin_account = account
+        blockchain_service._tx_manager = TransactionManager(chain, account, poll_interval=poll_interval)
+    return blockchain_service
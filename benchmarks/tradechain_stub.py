@@ -0,0 +1,80 @@
+"""
+Stub server TradeChain (aiohttp) untuk benchmark: endpoint internal yang dipanggil
+tradechain_kyc / tradechain_notifier, dengan latency dan rasio error opsional.
+
+    python benchmarks/tradechain_stub.py --port 8099 --latency-ms 20
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Optional
+
+from aiohttp import web
+
+
+class TradeChainStub:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.status_updates: dict = {}  # token_id -> payload terakhir
+        self.received_at: dict = {}     # token_id -> waktu diterima (monotonic)
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    async def _respond(self, ok_status: int) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return web.json_response({"error": "stub failure"}, status=503)
+        return web.json_response({"ok": True}, status=ok_status)
+
+    async def update_status(self, request: web.Request) -> web.Response:
+        response = await self._respond(200)
+        if response.status == 200:
+            token_id = request.match_info["token_id"]
+            self.status_updates[token_id] = await request.json()
+            self.received_at[token_id] = time.monotonic()
+        return response
+
+    async def notification(self, request: web.Request) -> web.Response:
+        return await self._respond(201)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_patch("/kyc/internal/{token_id}/status", self.update_status)
+        app.router.add_post("/notification/internal", self.notification)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def _serve(port: int, latency: float, error_rate: float):
+    stub = TradeChainStub(latency, error_rate)
+    print(f"TradeChain stub listening on {await stub.start(port=port)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.port, args.latency_ms / 1000, args.error_rate))